@@ -1,13 +1,2153 @@
 #!/usr/bin/env python3
 import sys
 import os
+import re
+import shutil
 import subprocess
 import json
+import time
+import fnmatch
+import bisect
+import hashlib
+import heapq
+import itertools
+import random
+import select
+import mmap
+import zipfile
+import struct
+import inspect
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+
+try:
+    import fcntl
+except ImportError:  # Windows: repo locks only cover this process
+    fcntl = None
+
+def _remaining(deadline):
+    """Seconds left until a monotonic deadline (None means no limit)"""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+def _remote_host(url):
+    """Host part of an https:// or scp-style (git@host:path) remote URL"""
+    if not url:
+        return None
+    if "://" in url:
+        return urlparse(url).hostname
+    if ":" in url:
+        return url.split(":", 1)[0].split("@")[-1]
+    return "local"
+
+def _git_dir(repo_path):
+    """Resolve the git directory, following `gitdir:` files used by worktrees/submodules"""
+    dot_git = os.path.join(repo_path, ".git")
+    if os.path.isfile(dot_git):
+        with open(dot_git) as f:
+            content = f.read().strip()
+        if content.startswith("gitdir:"):
+            return os.path.normpath(os.path.join(repo_path, content[len("gitdir:"):].strip()))
+    return dot_git
+
+def _last_fetch_time(repo_path):
+    """When the repo last fetched, from FETCH_HEAD's mtime (None if never)"""
+    try:
+        return os.path.getmtime(os.path.join(_git_dir(repo_path), "FETCH_HEAD"))
+    except OSError:
+        return None
+
+# `git hash-object -t tree /dev/null`: lets us diff an unborn branch against "nothing"
+EMPTY_TREE_SHA = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+def _iter_nul_records(stream, chunk_size=65536):
+    """Yield NUL-terminated records from a binary stream as they arrive"""
+    pending = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk
+        *records, pending = pending.split(b"\0")
+        for record in records:
+            yield record.decode("utf-8", "surrogateescape")
+    if pending:
+        yield pending.decode("utf-8", "surrogateescape")
+
+def _change_kind(xy):
+    """Collapse a porcelain XY pair into the single letter the UI shows"""
+    if "R" in xy:
+        return "R"  # Renamed
+    if "C" in xy:
+        return "C"  # Copied
+    if xy[0] == "A":
+        return "A"  # Added
+    if "D" in xy:
+        return "D"  # Deleted
+    return "M"  # Modified / type change
+
+def parse_porcelain_v2(records):
+    """Parse `git status --porcelain=v2 --branch -z` records.
+
+    Returns (branch, entries): branch carries oid/head/upstream/ahead/behind
+    from the `# branch.*` headers; each entry has the collapsed `status` letter
+    plus the raw index/worktree states.
+    """
+    branch = {"oid": None, "head": None, "upstream": None, "ahead": 0, "behind": 0}
+    entries = []
+    records = iter(records)
+    for record in records:
+        if not record:
+            continue
+        kind = record[0]
+        if kind == "#":
+            key, _, value = record[2:].partition(" ")
+            if key == "branch.oid":
+                branch["oid"] = None if value == "(initial)" else value
+            elif key == "branch.head":
+                branch["head"] = value
+            elif key == "branch.upstream":
+                branch["upstream"] = value
+            elif key == "branch.ab":
+                ahead, behind = value.split()
+                branch["ahead"], branch["behind"] = int(ahead), abs(int(behind))
+            continue
+
+        orig_path = None
+        if kind == "1":
+            fields = record.split(" ", 8)
+            xy, path, status = fields[1], fields[8], _change_kind(fields[1])
+        elif kind == "2":
+            fields = record.split(" ", 9)
+            xy, path, status = fields[1], fields[9], _change_kind(fields[1])
+            # With -z the rename/copy source follows as its own record
+            orig_path = next(records, None)
+        elif kind == "u":
+            fields = record.split(" ", 10)
+            xy, path, status = fields[1], fields[10], "U"  # Unmerged
+        elif kind == "?":
+            xy, path, status = "??", record[2:], "?"  # Untracked
+        else:
+            continue  # Ignored ("!") entries aren't changes
+        entries.append(_status_entry(kind, xy, path, status, orig_path))
+    return branch, entries
+
+def _status_entry(kind, xy, path, status, orig_path=None):
+    """One change entry as the UI expects it, from a porcelain v2 record kind and XY pair"""
+    entry = {
+        "file": path,
+        "status": status,
+        "index_status": xy[0],
+        "worktree_status": xy[1],
+        "staged": kind in "12" and xy[0] != ".",
+        "unstaged": kind == "?" or (kind in "12" and xy[1] != "."),
+    }
+    if orig_path is not None:
+        entry["orig_file"] = orig_path
+    return entry
+
+def parse_numstat_z(records):
+    """Parse `git diff --numstat -z` into {path: (additions, deletions, binary)}"""
+    stats = {}
+    records = iter(records)
+    for record in records:
+        if not record:
+            continue
+        added, deleted, path = record.split("\t", 2)
+        if path == "":
+            # Renames: empty path field, then source and destination records
+            next(records, None)
+            path = next(records, "")
+        binary = added == "-"
+        stats[path] = (0 if binary else int(added), 0 if binary else int(deleted), binary)
+    return stats
+
+def _free_lane(lanes):
+    if None in lanes:
+        return lanes.index(None)
+    lanes.append(None)
+    return len(lanes) - 1
+
+def assign_lanes(commits, lanes):
+    """Lay out commits (children before parents) on graph lanes.
+
+    `lanes` holds the SHA each lane is waiting for (None = free) and is
+    updated in place, so the next page continues the same layout. Each row
+    gets its `lane`, one edge per parent, the other lanes that end in this
+    commit (`merged`) and the number of lanes in use (`width`).
+    """
+    rows = []
+    for commit in commits:
+        sha, parents = commit["sha"], commit["parents"]
+        waiting = [i for i, want in enumerate(lanes) if want == sha]
+        lane = waiting[0] if waiting else _free_lane(lanes)
+        for i in waiting[1:]:
+            lanes[i] = None
+        lanes[lane] = parents[0] if parents else None
+
+        edges = [{"parent": parents[0], "lane": lane}] if parents else []
+        for parent in parents[1:]:
+            if parent in lanes:
+                target = lanes.index(parent)
+            else:
+                target = _free_lane(lanes)
+                lanes[target] = parent
+            edges.append({"parent": parent, "lane": target})
+
+        width = len(lanes)
+        while lanes and lanes[-1] is None:
+            lanes.pop()
+        rows.append({
+            "id": sha,
+            "parents": parents,
+            "author": commit["author"],
+            "message": commit["subject"],
+            "timestamp": str(commit["timestamp"]),
+            "lane": lane,
+            "edges": edges,
+            "merged": waiting[1:],
+            "width": width,
+        })
+    return rows
+
+def _commit_subject(message):
+    """First paragraph of a commit message folded onto one line, like `%s`"""
+    lines = []
+    for line in message.lstrip("\n").split("\n"):
+        line = line.rstrip()
+        if not line:
+            break
+        lines.append(line)
+    return " ".join(lines)
+
+def _short_ref(name):
+    for prefix in ("refs/heads/", "refs/remotes/"):
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return name
+
+LOG_FORMAT = "%H%x1f%P%x1f%an%x1f%ae%x1f%at%x1f%s"
+
+class SubprocessBackend:
+    """Read-only repo queries answered by forking `git` (always available)"""
+    name = "subprocess"
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def read_status(self, repo_path, timeout=None):
+        """(branch, entries) as parse_porcelain_v2 returns them, or (None, []) on failure"""
+        args = ["--no-optional-locks", "status", "--porcelain=v2", "--branch", "-z"]
+        with self.engine.popen_git(repo_path, args, timeout=timeout) as proc:
+            branch, entries = parse_porcelain_v2(_iter_nul_records(proc.stdout))
+        if proc.returncode != 0:
+            return None, []
+        return branch, entries
+
+    def ahead_behind(self, repo_path, local, upstream, timeout=None):
+        """(ahead, behind) of `local` against `upstream`, or None if either doesn't resolve"""
+        res = self.engine.run_git(repo_path, ["rev-list", "--left-right", "--count", f"{local}...{upstream}"], timeout=timeout)
+        if res and res.returncode == 0:
+            parts = res.stdout.strip().split()
+            if len(parts) == 2:
+                return int(parts[0]), int(parts[1])
+        return None
+
+    def numstat(self, repo_path, base):
+        """{path: (additions, deletions, binary)} for the working tree (index included) against `base`"""
+        with self.engine.popen_git(repo_path, ["diff", "--numstat", "-z", base]) as proc:
+            return parse_numstat_z(_iter_nul_records(proc.stdout))
+
+    def resolve(self, repo_path, revs):
+        """Commit SHAs for `revs`, or [] if any of them doesn't resolve (e.g. an unborn HEAD)"""
+        res = self.engine.run_git(repo_path, ["rev-parse"] + [f"{rev}^{{commit}}" for rev in revs])
+        if not res or res.returncode != 0:
+            return []
+        return res.stdout.split()
+
+    def log(self, repo_path, limit, revs=("HEAD",), skip=0, topo=False):
+        """Up to `limit` commits reachable from `revs`, newest first, after skipping `skip`.
+
+        topo=True never shows a parent before all of its children (--date-order),
+        which the graph layout relies on.
+        """
+        args = ["log", f"-{limit}", "-z", f"--format={LOG_FORMAT}"]
+        if topo:
+            args.append("--date-order")
+        if skip:
+            args.append(f"--skip={skip}")
+        res = self.engine.run_git(repo_path, args + list(revs) + ["--"])
+        commits = []
+        if res and res.returncode == 0:
+            for record in res.stdout.split("\0"):
+                parts = record.split("\x1f")
+                if len(parts) == 6:
+                    commits.append({
+                        "sha": parts[0],
+                        "parents": parts[1].split(),
+                        "author": parts[2],
+                        "email": parts[3],
+                        "timestamp": int(parts[4]),
+                        "subject": parts[5],
+                    })
+        return commits
+
+class Pygit2Backend(SubprocessBackend):
+    """The same queries in-process through libgit2, with no fork per call.
+
+    Anything libgit2 can't answer (repository extensions it doesn't know,
+    an unborn HEAD for numstat, corrupt state) falls back to the subprocess
+    implementation for that call. Timeouts don't apply in-process.
+    """
+    name = "pygit2"
+
+    # (ancestor, ours, theirs) present -> porcelain XY for an unmerged path
+    CONFLICT_XY = {
+        (True, True, True): "UU", (False, True, True): "AA",
+        (True, True, False): "UD", (True, False, True): "DU",
+        (False, True, False): "AU", (False, False, True): "UA",
+        (True, False, False): "DD",
+    }
+
+    def __init__(self, engine):
+        import pygit2  # ImportError when it isn't installed; callers fall back
+        super().__init__(engine)
+        self.pygit2 = pygit2
+        self.index_states = [
+            (pygit2.GIT_STATUS_INDEX_NEW, "A"), (pygit2.GIT_STATUS_INDEX_MODIFIED, "M"),
+            (pygit2.GIT_STATUS_INDEX_DELETED, "D"), (pygit2.GIT_STATUS_INDEX_RENAMED, "R"),
+            (pygit2.GIT_STATUS_INDEX_TYPECHANGE, "T"),
+        ]
+        self.worktree_states = [
+            (pygit2.GIT_STATUS_WT_MODIFIED, "M"), (pygit2.GIT_STATUS_WT_DELETED, "D"),
+            (pygit2.GIT_STATUS_WT_TYPECHANGE, "T"),
+        ]
+
+    def _open(self, repo_path):
+        return self.pygit2.Repository(repo_path)
+
+    @staticmethod
+    def _state(flags, states):
+        return next((letter for flag, letter in states if flags & flag), ".")
+
+    def _worktree_diff(self, repo, tree):
+        """`git diff <tree>`: tree -> index merged with index -> working tree"""
+        diff = tree.diff_to_index(repo.index)
+        diff.merge(repo.index.diff_to_workdir())
+        return diff
+
+    def read_status(self, repo_path, timeout=None):
+        try:
+            return self._read_status(self._open(repo_path))
+        except Exception:
+            return super().read_status(repo_path, timeout)
+
+    def _read_status(self, repo):
+        git = self.pygit2
+        branch = {"oid": None, "head": None, "upstream": None, "ahead": 0, "behind": 0}
+        if repo.head_is_unborn:
+            branch["head"] = _short_ref(repo.references["HEAD"].target)
+        elif repo.head_is_detached:
+            branch["oid"], branch["head"] = str(repo.head.target), "(detached)"
+        else:
+            head = repo.head
+            branch["oid"], branch["head"] = str(head.target), head.shorthand
+            local = repo.branches.local[head.shorthand]
+            try:
+                upstream_name = local.upstream_name
+            except (KeyError, git.GitError):
+                upstream_name = None
+            if upstream_name:
+                branch["upstream"] = _short_ref(upstream_name)
+                upstream = repo.references.get(upstream_name)
+                if upstream is not None:
+                    branch["ahead"], branch["behind"] = repo.ahead_behind(head.target, upstream.resolve().target)
+
+        status = repo.status(untracked_files="normal", ignored=False)
+        conflicts = {}
+        if any(flags & git.GIT_STATUS_CONFLICTED for flags in status.values()):
+            for ancestor, ours, theirs in repo.index.conflicts or ():
+                path = (ours or theirs or ancestor).path
+                conflicts[path] = self.CONFLICT_XY[(ancestor is not None, ours is not None, theirs is not None)]
+
+        # libgit2 status reports a staged rename as delete + add; pair them like git does
+        renames = {}
+        states = list(status.values())
+        if not repo.head_is_unborn and any(f & git.GIT_STATUS_INDEX_NEW for f in states) \
+                and any(f & git.GIT_STATUS_INDEX_DELETED for f in states):
+            diff = repo.index.diff_to_tree(repo.head.peel(git.Tree))
+            diff.find_similar(flags=git.GIT_DIFF_FIND_RENAMES)
+            for delta in diff.deltas:
+                if delta.status == git.GIT_DELTA_RENAMED:
+                    renames[delta.new_file.path] = delta.old_file.path
+        rename_sources = set(renames.values())
+
+        tracked, untracked = [], []
+        for path, flags in status.items():
+            if flags & git.GIT_STATUS_CONFLICTED:
+                tracked.append(_status_entry("u", conflicts.get(path, "UU"), path, "U"))
+                continue
+            if flags & git.GIT_STATUS_WT_NEW:
+                untracked.append(_status_entry("?", "??", path, "?"))
+            if path in rename_sources:
+                continue
+            xy = self._state(flags, self.index_states) + self._state(flags, self.worktree_states)
+            if path in renames:
+                xy = "R" + xy[1]
+                tracked.append(_status_entry("2", xy, path, "R", renames[path]))
+            elif xy != "..":
+                tracked.append(_status_entry("1", xy, path, _change_kind(xy)))
+        tracked.sort(key=lambda entry: entry["file"])
+        untracked.sort(key=lambda entry: entry["file"])
+        return branch, tracked + untracked
+
+    def ahead_behind(self, repo_path, local, upstream, timeout=None):
+        try:
+            repo = self._open(repo_path)
+            local_ref, upstream_ref = repo.revparse_single(local), repo.revparse_single(upstream)
+        except KeyError:
+            return None
+        except Exception:
+            return super().ahead_behind(repo_path, local, upstream, timeout)
+        return repo.ahead_behind(local_ref.peel(self.pygit2.Commit).id, upstream_ref.peel(self.pygit2.Commit).id)
+
+    def numstat(self, repo_path, base):
+        if base == EMPTY_TREE_SHA:
+            return super().numstat(repo_path, base)
+        try:
+            repo = self._open(repo_path)
+            diff = self._worktree_diff(repo, repo.revparse_single(base).peel(self.pygit2.Tree))
+            diff.find_similar(flags=self.pygit2.GIT_DIFF_FIND_RENAMES)
+            stats = {}
+            for patch in diff:
+                path = patch.delta.new_file.path
+                if patch.delta.is_binary:
+                    stats[path] = (0, 0, True)
+                else:
+                    _, additions, deletions = patch.line_stats
+                    stats[path] = (additions, deletions, False)
+            return stats
+        except Exception:
+            return super().numstat(repo_path, base)
+
+    def resolve(self, repo_path, revs):
+        try:
+            repo = self._open(repo_path)
+        except Exception:
+            return super().resolve(repo_path, revs)
+        try:
+            return [str(repo.revparse_single(rev).peel(self.pygit2.Commit).id) for rev in revs]
+        except (KeyError, self.pygit2.GitError):
+            return []
+
+    def _walk(self, repo, starts):
+        """git log's own walk: newest committer date first, ties in discovery order"""
+        queue, seen = [], set()
+        for start in starts:
+            if start.id not in seen:
+                seen.add(start.id)
+                queue.append((-start.commit_time, len(seen), start))
+        heapq.heapify(queue)
+        counter = len(seen)
+        while queue:
+            commit = heapq.heappop(queue)[2]
+            for parent in commit.parents:
+                if parent.id not in seen:
+                    seen.add(parent.id)
+                    counter += 1
+                    heapq.heappush(queue, (-parent.commit_time, counter, parent))
+            yield commit
+
+    def log(self, repo_path, limit, revs=("HEAD",), skip=0, topo=False):
+        try:
+            repo = self._open(repo_path)
+            if list(revs) == ["HEAD"] and repo.head_is_unborn:
+                return []
+            starts = [repo.revparse_single(rev).peel(self.pygit2.Commit) for rev in revs]
+            if topo:
+                # Children-before-parents needs the whole history; libgit2 sorts it natively
+                walker = repo.walk(None, self.pygit2.GIT_SORT_TOPOLOGICAL | self.pygit2.GIT_SORT_TIME)
+                for start in starts:
+                    walker.push(start.id)
+            else:
+                walker = self._walk(repo, starts)
+            return [{
+                "sha": str(commit.id),
+                "parents": [str(parent) for parent in commit.parent_ids],
+                "author": commit.author.name,
+                "email": commit.author.email,
+                "timestamp": commit.author.time,
+                "subject": _commit_subject(commit.message),
+            } for commit in itertools.islice(walker, skip, skip + limit)]
+        except Exception:
+            return super().log(repo_path, limit, revs, skip, topo)
+
+GIT_BACKENDS = {"subprocess": SubprocessBackend, "pygit2": Pygit2Backend}
+
+def make_git_backend(engine, name=None):
+    """The read backend: pygit2 when importable (name "auto"), else the subprocess one.
+
+    `name` defaults to $SYNCSTACK_GIT_BACKEND, then "auto".
+    """
+    name = name or os.environ.get("SYNCSTACK_GIT_BACKEND") or "auto"
+    if name == "auto":
+        try:
+            return Pygit2Backend(engine)
+        except ImportError:
+            return SubprocessBackend(engine)
+    if name not in GIT_BACKENDS:
+        raise ValueError(f"Unknown git backend: {name}")
+    return GIT_BACKENDS[name](engine)
+
+class FetchScheduler:
+    """Refreshes remotes off the status path on a per-repo TTL.
+
+    Status calls register repos; `run_due` (or the background thread started
+    with `start`) fetches those whose TTL has expired. Intervals get +/- jitter
+    so a large workspace doesn't fetch in lockstep, and failures back off
+    exponentially up to `max_backoff`. Freshness is seeded from FETCH_HEAD, so
+    one-shot CLI processes share it too.
+    """
+
+    def __init__(self, engine, ttl=300, jitter=0.2, retry_delay=30, max_backoff=3600):
+        self.engine = engine
+        self.ttl = ttl
+        self.jitter = jitter
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self._repos = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _jittered(self, delay):
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def register(self, repo_path, ttl=None):
+        with self._lock:
+            state = self._repos.get(repo_path)
+            if state is None:
+                last = _last_fetch_time(repo_path)
+                state = {"ttl": ttl or self.ttl, "failures": 0, "fetched_at": last, "last_error": None}
+                # Never fetched (or stale on disk) means due right away
+                state["next_due"] = (last + self._jittered(state["ttl"])) if last else 0
+                self._repos[repo_path] = state
+                self._wake.set()
+            elif ttl:
+                state["next_due"] += ttl - state["ttl"]
+                state["ttl"] = ttl
+                self._wake.set()
+            return dict(state)
+
+    def is_due(self, repo_path):
+        state = self.register(repo_path)
+        return time.time() >= state["next_due"]
+
+    def fetch(self, repo_path, force=False, timeout=None):
+        """Fetch if the TTL has expired, or unconditionally with force=True"""
+        state = self.register(repo_path)
+        if not force and time.time() < state["next_due"]:
+            return {"success": True, "fetched": False, "fetched_at": state["fetched_at"]}
+
+        ok = self.engine.fetch_remote(repo_path, timeout=timeout)
+        now = time.time()
+        with self._lock:
+            state = self._repos[repo_path]
+            if ok:
+                state["failures"] = 0
+                state["last_error"] = None
+                state["fetched_at"] = _last_fetch_time(repo_path) or now
+                state["next_due"] = now + self._jittered(state["ttl"])
+            else:
+                state["failures"] += 1
+                state["last_error"] = "fetch failed"
+                backoff = min(self.max_backoff, self.retry_delay * (2 ** (state["failures"] - 1)))
+                state["next_due"] = now + self._jittered(backoff)
+            result = {"success": ok, "fetched": ok, "fetched_at": state["fetched_at"], "failures": state["failures"]}
+        if not ok:
+            result["message"] = "Fetch failed"
+        return result
+
+    def run_due(self):
+        """Fetch every registered repo whose TTL has expired"""
+        now = time.time()
+        with self._lock:
+            due = [path for path, state in self._repos.items() if now >= state["next_due"]]
+        self.engine._run_parallel(due, lambda path: self.fetch(path, force=True))
+        return due
+
+    def _seconds_until_next(self):
+        with self._lock:
+            if not self._repos:
+                return None
+            return max(0.0, min(state["next_due"] for state in self._repos.values()) - time.time())
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_due()
+            self._wake.clear()
+            self._wake.wait(self._seconds_until_next())
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="fetch-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+class MaintenanceScheduler:
+    """Keeps managed repos fast to read: index features, packs, commit-graph, refs.
+
+    Every repo under `workspace_root` gets the untracked cache, split index
+    and commit-graph reads switched on once (plus the builtin fsmonitor where
+    git has it), then each task in TASKS runs when its interval has passed.
+    The background thread (daemon only) works one repo at a time and only
+    after the engine has had no requests for `idle_after` seconds; repos
+    whose lock is held by a sync are skipped until the next round. Last runs
+    (failed ones too, with their error) and the latest report per repo are
+    kept in `<workspace_root>/maintenance.json`.
+    """
+
+    # Seconds between runs. Order matters: loose objects are packed before the
+    # multi-pack-index covers them, and the commit-graph goes last to see every commit
+    TASKS = {
+        "loose-objects": 86400,
+        "incremental-repack": 86400,
+        "commit-graph": 3600,
+        "pack-refs": 7 * 86400,
+    }
+
+    def __init__(self, engine, idle_after=120, check_interval=300, loose_threshold=100, max_batch_size=2 * 1024 ** 3):
+        self.engine = engine
+        self.idle_after = idle_after
+        self.check_interval = check_interval
+        self.loose_threshold = loose_threshold
+        self.max_batch_size = max_batch_size
+        self.state_path = os.path.join(engine.workspace_root, "maintenance.json")
+        self._in_flight = 0
+        self._last_request = time.monotonic()
+        self._git_version = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def begin_request(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def end_request(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._last_request = time.monotonic()
+
+    def idle_for(self):
+        with self._lock:
+            return 0.0 if self._in_flight else time.monotonic() - self._last_request
+
+    def git_version(self):
+        if self._git_version is None:
+            res = self.engine.run_git(self.engine.workspace_root, ["version"])
+            match = re.search(r"(\d+)\.(\d+)", res.stdout) if res and res.returncode == 0 else None
+            self._git_version = (int(match.group(1)), int(match.group(2))) if match else (0, 0)
+        return self._git_version
+
+    def load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _update(self, repo_path, repo_state):
+        with self._lock:
+            state = self.load_state()
+            state[repo_path] = repo_state
+            _atomic_write(self.state_path, json.dumps(state, indent=2))
+
+    def repos(self):
+        """Managed repos: workspace_root/<owner>/<name>, as laid out by batch_sync"""
+        repo_paths, _ = self.engine.repo_index.scan(self.engine.workspace_root, depth=3)
+        return repo_paths
+
+    def _git(self, repo_path, args):
+        res = self.engine.run_git(repo_path, args)
+        if not res:
+            return False, "git did not run"
+        if res.returncode != 0:
+            return False, res.stderr.strip()[-500:]
+        return True, None
+
+    def configure(self, repo_path):
+        """Switch on the index/read features; returns the settings applied"""
+        settings = {"core.untrackedCache": "true", "core.splitIndex": "true", "core.commitGraph": "true"}
+        # The builtin fsmonitor daemon exists on macOS and Windows from git 2.37
+        if sys.platform in ("darwin", "win32") and self.git_version() >= (2, 37):
+            settings["core.fsmonitor"] = "true"
+        for key, value in settings.items():
+            self.engine.run_git(repo_path, ["config", key, value])
+        # Rewrite the index now so the next status already benefits
+        self.engine.run_git(repo_path, ["update-index", "--untracked-cache", "--split-index"])
+        return settings
+
+    def _loose_objects(self, repo_path):
+        res = self.engine.run_git(repo_path, ["count-objects", "-v"])
+        counts = dict(line.split(": ", 1) for line in res.stdout.splitlines() if ": " in line) if res else {}
+        if int(counts.get("count", 0)) < self.loose_threshold:
+            return True, "skipped: few loose objects"
+        # Without -a this only packs what's loose, then drops the loose copies
+        return self._git(repo_path, ["repack", "-d", "-q"])
+
+    def _pack_sizes(self, repo_path):
+        try:
+            with os.scandir(os.path.join(_git_dir(repo_path), "objects", "pack")) as entries:
+                return [entry.stat().st_size for entry in entries if entry.name.endswith(".pack")]
+        except OSError:
+            return []
+
+    def _incremental_repack(self, repo_path):
+        # `multi-pack-index write` fails outright on a repo with no packs yet
+        if not self._pack_sizes(repo_path):
+            return True, "skipped: no packs"
+        ok, message = self._git(repo_path, ["multi-pack-index", "write"])
+        if not ok:
+            return ok, message
+        ok, message = self._git(repo_path, ["multi-pack-index", "expire"])
+        if not ok:
+            return ok, message
+        sizes = self._pack_sizes(repo_path)
+        if len(sizes) < 2:
+            return True, None
+        # Like `git maintenance`: batch everything but the largest pack, so small packs merge
+        batch_size = min(self.max_batch_size, sum(sizes) - max(sizes) + 1)
+        return self._git(repo_path, ["multi-pack-index", "repack", f"--batch-size={batch_size}"])
+
+    def _commit_graph(self, repo_path):
+        args = ["commit-graph", "write", "--reachable", "--split"]
+        if self.git_version() >= (2, 27):
+            args.append("--changed-paths")  # Bloom filters for path-limited log
+        return self._git(repo_path, args)
+
+    def _pack_refs(self, repo_path):
+        return self._git(repo_path, ["pack-refs", "--all"])
+
+    def probe(self, repo_path):
+        """Time the reads maintenance is meant to speed up: status, and a graph page of log"""
+        timings = {}
+        for name, args in (("status_ms", ["status", "--porcelain=v2", "--branch", "-z"]),
+                           ("log_ms", ["log", "--date-order", f"--format={LOG_FORMAT}", "-n", str(GHEngine.GRAPH_CHUNK)])):
+            started = time.perf_counter()
+            res = self.engine.run_git(repo_path, args)
+            timings[name] = round((time.perf_counter() - started) * 1000, 2) if res and res.returncode == 0 else None
+        return timings
+
+    def run(self, repo_path, tasks=None, force=False, probe=True, blocking=False):
+        """Maintain one repo: due tasks, or exactly `tasks`, or everything with force"""
+        runners = {
+            "loose-objects": self._loose_objects,
+            "incremental-repack": self._incremental_repack,
+            "commit-graph": self._commit_graph,
+            "pack-refs": self._pack_refs,
+        }
+        with self.engine.repo_lock(repo_path, blocking=blocking) as locked:
+            if not locked:
+                return {"success": False, "repo": repo_path, "busy": True, "message": "Repository is busy syncing"}
+            with self._lock:
+                repo_state = self.load_state().get(repo_path, {})
+            last_run = repo_state.setdefault("last_run", {})
+            last_error = repo_state.setdefault("last_error", {})
+            report = {"repo": repo_path, "started_at": time.time(), "steps": []}
+            if force or not repo_state.get("configured"):
+                report["configured"] = repo_state["configured"] = self.configure(repo_path)
+            if probe:
+                report["before"] = self.probe(repo_path)
+
+            for task, interval in self.TASKS.items():
+                if tasks is not None:
+                    if task not in tasks:
+                        continue
+                elif not force and time.time() - last_run.get(task, 0) < interval:
+                    continue
+                started = time.perf_counter()
+                ok, message = runners[task](repo_path)
+                step = {"task": task, "ok": ok, "ms": round((time.perf_counter() - started) * 1000, 2)}
+                if message:
+                    step["message"] = message
+                if probe:
+                    step["after"] = self.probe(repo_path)
+                # A failed task also waits out its interval rather than retrying every round
+                last_run[task] = time.time()
+                if ok:
+                    last_error.pop(task, None)
+                else:
+                    last_error[task] = message or "failed"
+                report["steps"].append(step)
+
+            if probe:
+                report["after"] = report["steps"][-1]["after"] if report["steps"] else report["before"]
+            report["success"] = all(step["ok"] for step in report["steps"])
+            repo_state["report"] = report
+            self._update(repo_path, repo_state)
+        return report
+
+    def is_due(self, repo_path, state=None):
+        last_run = (state if state is not None else self.load_state()).get(repo_path, {}).get("last_run", {})
+        now = time.time()
+        return any(now - last_run.get(task, 0) >= interval for task, interval in self.TASKS.items())
+
+    def run_due(self):
+        """Maintain due repos one at a time, stopping as soon as a request comes in"""
+        state = self.load_state()
+        done = []
+        for repo_path in self.repos():
+            if self._stop.is_set() or self.idle_for() < self.idle_after:
+                break
+            if self.is_due(repo_path, state):
+                done.append(self.run(repo_path))
+        return done
+
+    def _loop(self):
+        while not self._stop.wait(self.check_interval):
+            if self.idle_for() >= self.idle_after:
+                try:
+                    self.run_due()
+                except Exception as e:
+                    print(f"maintenance failed: {e}", file=sys.stderr)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="maintenance", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+class _Inotify:
+    """Minimal ctypes binding to Linux inotify (raises OSError elsewhere)"""
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    CHANGE_MASK = IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self._ctypes = ctypes
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask | self.IN_ONLYDIR)
+        if wd < 0:
+            errno = self._ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def rm_watch(self, wd):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self):
+        """Drain pending events as (wd, mask, name) tuples"""
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+        events, offset = [], 0
+        while offset + 16 <= len(data):
+            wd, mask, _cookie, length = struct.unpack_from("iIII", data, offset)
+            name = data[offset + 16:offset + 16 + length].rstrip(b"\0")
+            events.append((wd, mask, os.fsdecode(name)))
+            offset += 16 + length
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class StatusCache:
+    """Last computed status (plain and detailed) per repo, invalidated by filesystem events.
+
+    Watches each repo's working tree (minus git-ignored directories) plus
+    `.git/index`, `.git/HEAD` and `.git/refs`. Bursts of events are debounced
+    per repo (flushed after `debounce` seconds of quiet, or `max_delay` at
+    most) before the entry is dropped and subscribers are pushed a fresh
+    status. Without inotify, or for repos too large to watch, `get` passes
+    straight through and subscribers are refreshed every `poll_interval`.
+    """
+
+    GIT_FILES = ("index", "HEAD", "packed-refs", "MERGE_HEAD", "REBASE_HEAD", "CHERRY_PICK_HEAD")
+
+    def __init__(self, engine, debounce=0.3, max_delay=2.0, max_watches_per_repo=8192, poll_interval=5.0):
+        self.engine = engine
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.max_watches_per_repo = max_watches_per_repo
+        self.poll_interval = poll_interval
+        self._entries = {}
+        self._generation = {}
+        self._watches = {}
+        self._repo_watches = {}
+        self._unwatchable = set()
+        self._pending = {}
+        self._last_polled = {}
+        self._subscribers = {}
+        self._next_token = 1
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._inotify = None
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        try:
+            self._inotify = _Inotify()
+        except (OSError, AttributeError):
+            self._inotify = None
+        self._thread = threading.Thread(target=self._loop, name="status-cache", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get(self, repo_path, compute, kind="status"):
+        """Cached status of `kind` ("status" or "detailed") for repo_path, computing (and watching) on a miss"""
+        if not self.enabled:
+            return compute()
+        with self._lock:
+            cached = self._entries.get(repo_path, {}).get(kind)
+            # Events still being debounced mean the entry is already stale
+            if cached is not None and repo_path not in self._pending:
+                return cached
+        watched = self.watch(repo_path)
+        with self._lock:
+            generation = self._generation.get(repo_path, 0)
+        status = compute()
+        if watched and status.get("exists") and not status.get("timed_out"):
+            with self._lock:
+                # Drop the result if an event raced the computation
+                if self._generation.get(repo_path, 0) == generation:
+                    self._entries.setdefault(repo_path, {})[kind] = status
+        return status
+
+    def invalidate(self, repo_path):
+        with self._lock:
+            self._entries.pop(repo_path, None)
+            self._generation[repo_path] = self._generation.get(repo_path, 0) + 1
+
+    def subscribe(self, callback, repos=None):
+        """callback(repo_path, status) on every change; repos=None means all watched repos"""
+        for repo_path in repos or []:
+            self.watch(repo_path)
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._subscribers[token] = (callback, set(repos) if repos else None)
+        return token
+
+    def unsubscribe(self, token):
+        with self._lock:
+            return self._subscribers.pop(token, None) is not None
+
+    def watch(self, repo_path):
+        """Start watching a repo; False if it can't be (no inotify or too many dirs)"""
+        if self._inotify is None:
+            return False
+        with self._lock:
+            if repo_path in self._repo_watches:
+                return True
+            if repo_path in self._unwatchable:
+                return False
+            self._repo_watches[repo_path] = set()
+
+        git_dir = _git_dir(repo_path)
+        ok = self._add_watch(repo_path, git_dir, "git")
+        for root, dirs, _files in os.walk(os.path.join(git_dir, "refs")):
+            ok = ok and self._add_watch(repo_path, root, "refs")
+        ok = ok and self._watch_tree(repo_path, repo_path, self._ignored_dirs(repo_path))
+        if not ok:
+            self.unwatch(repo_path)
+            with self._lock:
+                self._unwatchable.add(repo_path)
+        return ok
+
+    def unwatch(self, repo_path):
+        with self._lock:
+            wds = self._repo_watches.pop(repo_path, set())
+            for wd in wds:
+                self._watches.pop(wd, None)
+            self._entries.pop(repo_path, None)
+        for wd in wds:
+            self._inotify.rm_watch(wd)
+
+    def _ignored_dirs(self, repo_path):
+        res = self.engine.run_git(repo_path, ["ls-files", "--others", "--ignored", "--exclude-standard", "--directory", "-z"])
+        if not res or res.returncode != 0:
+            return set()
+        return {os.path.join(repo_path, entry.rstrip("/")) for entry in res.stdout.split("\0") if entry.endswith("/")}
+
+    def _watch_tree(self, repo_path, top, ignored):
+        for root, dirs, _files in os.walk(top):
+            # Skip git internals, ignored output (node_modules, build dirs) and nested repos
+            dirs[:] = [d for d in dirs if d != ".git" and os.path.join(root, d) not in ignored
+                       and not os.path.exists(os.path.join(root, d, ".git"))]
+            if not self._add_watch(repo_path, root, "tree"):
+                return False
+        return True
+
+    def _add_watch(self, repo_path, path, kind):
+        with self._lock:
+            wds = self._repo_watches.get(repo_path)
+            if wds is None or len(wds) >= self.max_watches_per_repo:
+                return False
+        try:
+            wd = self._inotify.add_watch(path, _Inotify.CHANGE_MASK)
+        except OSError:
+            # Directory vanished mid-walk is fine; anything else (ENOSPC) isn't
+            return not os.path.isdir(path)
+        with self._lock:
+            self._watches[wd] = (repo_path, path, kind)
+            wds.add(wd)
+        return True
+
+    def _handle_events(self, events):
+        now = time.monotonic()
+        changed = set()
+        for wd, mask, name in events:
+            if mask & _Inotify.IN_Q_OVERFLOW:
+                with self._lock:
+                    changed.update(self._repo_watches)
+                continue
+            with self._lock:
+                watch = self._watches.get(wd)
+                if watch and mask & _Inotify.IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    self._repo_watches.get(watch[0], set()).discard(wd)
+            if not watch or mask & _Inotify.IN_IGNORED:
+                continue
+
+            repo_path, path, kind = watch
+            is_new_dir = mask & _Inotify.IN_ISDIR and mask & (_Inotify.IN_CREATE | _Inotify.IN_MOVED_TO)
+            if kind == "git":
+                if name not in self.GIT_FILES:
+                    continue  # objects/, logs/, *.lock and friends
+            elif kind == "refs":
+                if name.endswith(".lock"):
+                    continue
+                if is_new_dir:
+                    self._add_watch(repo_path, os.path.join(path, name), "refs")
+            else:
+                if name == ".git":
+                    continue
+                if is_new_dir:
+                    new_dir = os.path.join(path, name)
+                    res = self.engine.run_git(repo_path, ["check-ignore", "-q", new_dir])
+                    if not (res and res.returncode == 0) and not self._watch_tree(repo_path, new_dir, set()):
+                        self.unwatch(repo_path)
+                        with self._lock:
+                            self._unwatchable.add(repo_path)
+            changed.add(repo_path)
+
+        with self._lock:
+            for repo_path in changed:
+                first, _last = self._pending.get(repo_path, (now, now))
+                self._pending[repo_path] = (first, now)
+
+    def _flush_due(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [repo for repo, (first, last) in self._pending.items()
+                   if now - last >= self.debounce or now - first >= self.max_delay]
+            for repo_path in due:
+                del self._pending[repo_path]
+        for repo_path in due:
+            self.invalidate(repo_path)
+        self._publish(due)
+
+    def _next_flush_in(self):
+        with self._lock:
+            if not self._pending:
+                return None
+            now = time.monotonic()
+            return max(0.0, min(min(last + self.debounce, first + self.max_delay) - now
+                                for first, last in self._pending.values()))
+
+    def _publish(self, repos):
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        wanted = [repo for repo in repos if any(scope is None or repo in scope for _cb, scope in subscribers)]
+        if not wanted:
+            return
+        statuses = self.engine._run_parallel(wanted, lambda repo: self.get(repo, lambda: self.engine.get_repo_status(repo)))
+        self._notify(dict(zip(wanted, statuses)))
+
+    def _poll(self):
+        """Fallback without inotify: recompute subscribed repos and push the ones that changed"""
+        with self._lock:
+            repos = set()
+            for _callback, scope in self._subscribers.values():
+                repos.update(scope or [])
+        repos = sorted(repos)
+        statuses = self.engine._run_parallel(repos, self.engine.get_repo_status)
+        changed = {}
+        for repo_path, status in zip(repos, statuses):
+            # Only kept to diff successive polls; `get` never serves these
+            if self._last_polled.get(repo_path) != status:
+                self._last_polled[repo_path] = status
+                changed[repo_path] = status
+        self._notify(changed)
+
+    def _notify(self, statuses):
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for repo_path, status in statuses.items():
+            for callback, scope in subscribers:
+                if scope is None or repo_path in scope:
+                    try:
+                        callback(repo_path, status)
+                    except Exception:
+                        pass
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if self._inotify is None:
+                self._stop.wait(self.poll_interval)
+                self._poll()
+                continue
+            timeout = self._next_flush_in()
+            readable, _, _ = select.select([self._inotify.fd], [], [], 1.0 if timeout is None else min(timeout, 1.0))
+            if readable:
+                self._handle_events(self._inotify.read())
+            self._flush_due()
+
+def _atomic_write(path, data):
+    """Write via a temp file + rename so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+# Directory names never worth descending into when looking for repos
+# Dependency and build trees only: generic names like "snap" or ".cache" can
+# hold real checkouts, and callers pass `ignore` to skip anything else
+DEFAULT_SCAN_IGNORE = [
+    "node_modules", "bower_components", ".venv", "venv", "__pycache__", ".tox",
+    ".npm", ".gradle", ".m2", ".cargo", ".rustup",
+]
+
+class RepoIndex:
+    """Persistent per-root index of directories for incremental repo discovery.
+
+    Stored as JSON lines under `<workspace_root>/repo_index/`: a header with the
+    root's depth/ignore settings, then one record per directory with its mtime,
+    subdirectory names and whether it is a repo. A rescan stats every indexed
+    directory but only lists (`os.scandir`) those whose mtime changed, since
+    adding or removing an entry is what bumps a directory's mtime.
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+
+    def _index_path(self, root):
+        return os.path.join(self.index_dir, hashlib.sha1(root.encode()).hexdigest()[:16] + ".jsonl")
+
+    def _load(self, root, depth, ignore):
+        try:
+            with open(self._index_path(root)) as f:
+                header = json.loads(f.readline())
+                if header.get("root") != root or header.get("depth") != depth or header.get("ignore") != ignore:
+                    return {}  # Settings changed: the old index can't be trusted
+                return {record["path"]: record for record in map(json.loads, f)}
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def _save(self, root, depth, ignore, records):
+        lines = [json.dumps({"root": root, "depth": depth, "ignore": ignore, "scanned_at": time.time()})]
+        lines.extend(json.dumps(record) for record in records.values())
+        _atomic_write(self._index_path(root), "\n".join(lines) + "\n")
+
+    def _ignored(self, name, rel_path, ignore):
+        return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(rel_path, pattern) for pattern in ignore)
+
+    def scan(self, root, depth=3, ignore=None, rescan=False):
+        """Return (repo_paths, stats) for repos within `depth` levels of root"""
+        ignore = list(DEFAULT_SCAN_IGNORE if ignore is None else ignore)
+        old = {} if rescan else self._load(root, depth, ignore)
+        new = {}
+        repo_paths = []
+        stats = {"dirs_listed": 0, "dirs_reused": 0}
+
+        stack = [(root, 0)]
+        while stack:
+            path, level = stack.pop()
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+
+            record = old.get(path)
+            if record and record["mtime"] == mtime:
+                stats["dirs_reused"] += 1
+            else:
+                subdirs, is_repo = [], False
+                try:
+                    with os.scandir(path) as entries:
+                        for entry in entries:
+                            if entry.name == ".git":
+                                is_repo = True
+                            elif entry.is_dir(follow_symlinks=False):
+                                rel_path = os.path.relpath(entry.path, root)
+                                if not self._ignored(entry.name, rel_path, ignore):
+                                    subdirs.append(entry.name)
+                except OSError:
+                    continue
+                record = {"path": path, "mtime": mtime, "subdirs": sorted(subdirs), "repo": is_repo}
+                stats["dirs_listed"] += 1
+            new[path] = record
+
+            if record["repo"]:
+                # Don't recurse into subdirectories of a repo
+                repo_paths.append(path)
+                continue
+            if level + 1 < depth:
+                for name in reversed(record["subdirs"]):
+                    stack.append((os.path.join(path, name), level + 1))
+
+        self._save(root, depth, ignore, new)
+        return repo_paths, stats
+
+TRACE_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+def _git_command(args):
+    """The git subcommand in an argument list, skipping `git`, -C/-c pairs and global flags"""
+    args = iter(args)
+    for arg in args:
+        if arg in ("-C", "-c"):
+            next(args, None)
+        elif arg != "git" and not arg.startswith("-"):
+            return arg
+    return "git"
+
+_API_PATH_PARAMS = [
+    (re.compile(r"/repos/[^/]+/[^/]+"), "/repos/:owner/:repo"),
+    (re.compile(r"/users/[^/]+"), "/users/:user"),
+    (re.compile(r"/workflows/[^/]+"), "/workflows/:workflow"),
+    (re.compile(r"/\d+(?=/|$)"), "/:id"),
+]
+
+def _api_endpoint(method, url):
+    """"GET /repos/:owner/:repo/actions/runs" style key for an API URL"""
+    path = urlparse(url).path
+    for pattern, replacement in _API_PATH_PARAMS:
+        path = pattern.sub(replacement, path, count=1)
+    return f"{method} {path}"
+
+class _CountingStream:
+    """Wraps a binary pipe to count the bytes read through it"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self.count += len(data)
+        return data
+
+    def __iter__(self):
+        for line in self._stream:
+            self.count += len(line)
+            yield line
+
+    def close(self):
+        self._stream.close()
+
+class Tracer:
+    """Span timing and per-command histograms for git processes, API calls and RPCs.
+
+    Off by default, when it costs one attribute check per call. Enabled by
+    SYNCSTACK_TRACE=1 or the `trace` command. A slow-call threshold
+    (SYNCSTACK_SLOW_MS or `trace slow_ms=`) also appends slower spans to
+    the slow-call log as JSON lines.
+    """
+
+    def __init__(self, slow_log_path=None, enabled=False, slow_ms=None, keep_recent=200, keep_slow=50):
+        self.slow_log_path = slow_log_path
+        self.slow_ms = slow_ms
+        self.enabled = enabled or slow_ms is not None
+        self._commands = {}
+        self._recent = deque(maxlen=keep_recent)
+        self._slow = deque(maxlen=keep_slow)
+        self._lock = threading.Lock()
+
+    def configure(self, enabled, slow_ms=None):
+        self.slow_ms = slow_ms
+        self.enabled = enabled or slow_ms is not None
+
+    def record(self, kind, name, started, repo=None, code=None, bytes_out=None, failed=False, error=None, wait_ms=None):
+        """Close a span opened at perf_counter() `started`"""
+        duration_ms = (time.perf_counter() - started) * 1000
+        span = {
+            "kind": kind,
+            "name": name,
+            "repo": repo,
+            "duration_ms": round(duration_ms, 2),
+            "code": code,
+            "bytes_out": bytes_out,
+            "at": time.time(),
+        }
+        if wait_ms is not None:
+            span["wait_ms"] = round(wait_ms, 2)
+        if error is not None:
+            span["error"] = str(error)
+        slow = self.slow_ms is not None and duration_ms >= self.slow_ms
+
+        with self._lock:
+            stats = self._commands.get((kind, name))
+            if stats is None:
+                stats = self._commands[(kind, name)] = {
+                    "count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "bytes_out": 0,
+                    "buckets": [0] * (len(TRACE_BUCKETS_MS) + 1),
+                }
+            stats["count"] += 1
+            stats["errors"] += 1 if failed or error is not None else 0
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            stats["bytes_out"] += bytes_out or 0
+            stats["buckets"][bisect.bisect_left(TRACE_BUCKETS_MS, duration_ms)] += 1
+            self._recent.append(span)
+            if slow:
+                self._slow.append(span)
+                if self.slow_log_path:
+                    try:
+                        with open(self.slow_log_path, "a") as f:
+                            f.write(json.dumps(span) + "\n")
+                    except OSError:
+                        pass
+
+    @staticmethod
+    def _percentile(stats, pct):
+        """Upper bound of the bucket holding the pct-th call (max_ms for the open-ended one)"""
+        rank = max(1, int(stats["count"] * pct / 100 + 0.999999))
+        seen = 0
+        for bound, count in zip(TRACE_BUCKETS_MS, stats["buckets"]):
+            seen += count
+            if seen >= rank:
+                return min(bound, stats["max_ms"])
+        return stats["max_ms"]
+
+    def snapshot(self, recent=50):
+        with self._lock:
+            commands = {}
+            for (kind, name), stats in sorted(self._commands.items()):
+                labels = [f"<={bound}ms" for bound in TRACE_BUCKETS_MS] + [f">{TRACE_BUCKETS_MS[-1]}ms"]
+                commands[f"{kind} {name}"] = {
+                    "count": stats["count"],
+                    "errors": stats["errors"],
+                    "total_ms": round(stats["total_ms"], 2),
+                    "mean_ms": round(stats["total_ms"] / stats["count"], 2),
+                    "p50_ms": round(self._percentile(stats, 50), 2),
+                    "p95_ms": round(self._percentile(stats, 95), 2),
+                    "max_ms": round(stats["max_ms"], 2),
+                    "bytes_out": stats["bytes_out"],
+                    "histogram": {label: count for label, count in zip(labels, stats["buckets"]) if count},
+                }
+            return {
+                "enabled": self.enabled,
+                "slow_ms": self.slow_ms,
+                "slow_log": self.slow_log_path if self.slow_ms is not None else None,
+                "commands": commands,
+                "recent": list(self._recent)[-recent:] if recent else [],
+                "slow": list(self._slow),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._commands.clear()
+            self._recent.clear()
+            self._slow.clear()
+
+class RateLimitError(Exception):
+    pass
+
+class SnapshotError(Exception):
+    """A snapshot was needed (there was something to lose) but couldn't be written"""
+
+class ApiError(Exception):
+    """Non-success response while paginating"""
+
+    def __init__(self, response):
+        super().__init__(f"{response.status_code}: {response.text}")
+        self.status_code = response.status_code
+        self.text = response.text
+
+class ApiResponse:
+    """The subset of requests.Response the API wrappers use, so cache hits look like 200s"""
+
+    def __init__(self, status_code, headers, body, from_cache=False):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = body
+        self.from_cache = from_cache
+
+    def json(self):
+        return json.loads(self.text) if self.text else None
+
+class GitHubClient:
+    """Shared GitHub REST client: pooled connections, ETag revalidation, rate-limit pacing.
+
+    GETs are revalidated with If-None-Match; a 304 is answered from the local
+    copy and doesn't count against the quota. X-RateLimit-* headers are
+    tracked per token and resource (core/search/graphql): once `remaining`
+    drops under `reserve`, calls are spaced out over the time left until the
+    reset, and an exhausted bucket waits for the reset (up to `max_wait`,
+    else RateLimitError). Secondary limits (403/429) and 5xx are retried
+    honouring Retry-After, with exponential backoff otherwise.
+    """
+
+    def __init__(self, api_url=None, pool_size=16, reserve=50, max_wait=60, max_retries=3, max_etags=1024, tracer=None):
+        self.api_url = (api_url or os.environ.get("SYNCSTACK_GITHUB_API") or "https://api.github.com").rstrip("/")
+        self.tracer = tracer or Tracer()
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.max_etags = max_etags
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._etags = OrderedDict()
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(token):
+        return hashlib.sha256((token or "").encode()).hexdigest()[:16]
+
+    def _url(self, path):
+        return path if path.startswith("http") else f"{self.api_url}{path}"
+
+    def _resource(self, url):
+        if "/search/" in url:
+            return "search"
+        if url.endswith("/graphql"):
+            return "graphql"
+        return "core"
+
+    def _reserve_for(self, limit):
+        """`reserve` scaled to the bucket: search has 30/min and unauthenticated core 60/h"""
+        return min(self.reserve, limit["limit"] // 10) if limit.get("limit") else self.reserve
+
+    def _throttle(self, key):
+        """Sleep as needed so this token's bucket lasts until its reset"""
+        with self._lock:
+            limit = self._limits.get(key)
+        if not limit:
+            return
+        wait_for_reset = limit["reset"] - time.time()
+        if wait_for_reset <= 0:
+            return
+        if limit["remaining"] <= 0:
+            if wait_for_reset > self.max_wait:
+                raise RateLimitError(f"GitHub rate limit exhausted; resets in {int(wait_for_reset)}s")
+            time.sleep(wait_for_reset)
+        elif limit["remaining"] < self._reserve_for(limit):
+            time.sleep(min(self.max_wait, wait_for_reset / limit["remaining"]))
+
+    def _record_limits(self, key, headers):
+        if "X-RateLimit-Remaining" not in headers:
+            return
+        try:
+            limit = {
+                "limit": int(headers.get("X-RateLimit-Limit", 0)),
+                "remaining": int(headers["X-RateLimit-Remaining"]),
+                "reset": int(headers.get("X-RateLimit-Reset", 0)),
+            }
+        except ValueError:
+            return
+        resource = headers.get("X-RateLimit-Resource")
+        if resource:
+            key = (key[0], resource)
+        with self._lock:
+            self._limits[key] = limit
+
+    def _retry_delay(self, response, attempt):
+        """Seconds to wait before retrying, or None if the response is final"""
+        secondary = response.status_code in (403, 429) and (
+            "Retry-After" in response.headers
+            or response.headers.get("X-RateLimit-Remaining") == "0"
+            or "secondary rate limit" in response.text.lower()
+        )
+        if not secondary and response.status_code < 500:
+            return None
+        if "Retry-After" in response.headers:
+            try:
+                return float(response.headers["Retry-After"])
+            except ValueError:
+                pass
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            return max(0, int(response.headers.get("X-RateLimit-Reset", 0)) - time.time())
+        return 2 ** attempt
+
+    def rate_limits(self, token):
+        fp = self.fingerprint(token)
+        with self._lock:
+            return {resource: dict(limit) for (key, resource), limit in self._limits.items() if key == fp}
+
+    def request(self, method, path, token=None, params=None, json_body=None, headers=None, timeout=10):
+        url = self._url(path)
+        fp = self.fingerprint(token)
+        limit_key = (fp, self._resource(url))
+        request_headers = {'Accept': 'application/vnd.github.v3+json'}
+        if token:
+            request_headers['Authorization'] = f'token {token}'
+        request_headers.update(headers or {})
+
+        cache_key = None
+        cached = None
+        if method == "GET":
+            cache_key = (url, tuple(sorted((params or {}).items())), fp)
+            with self._lock:
+                cached = self._etags.get(cache_key)
+            if cached:
+                request_headers['If-None-Match'] = cached[0]
+
+        for attempt in range(self.max_retries + 1):
+            self._throttle(limit_key)
+            started = time.perf_counter() if self.tracer.enabled else None
+            try:
+                response = self.session.request(method, url, params=params, json=json_body,
+                                                headers=request_headers, timeout=timeout)
+            except Exception as e:
+                if started is not None:
+                    self.tracer.record("http", _api_endpoint(method, url), started, error=e)
+                raise
+            if started is not None:
+                self.tracer.record("http", _api_endpoint(method, url), started, code=response.status_code,
+                                   bytes_out=len(response.content), failed=response.status_code >= 400)
+            self._record_limits(limit_key, response.headers)
+            delay = self._retry_delay(response, attempt)
+            if delay is None or attempt == self.max_retries:
+                break
+            if delay > self.max_wait:
+                raise RateLimitError(f"GitHub asked us to back off for {int(delay)}s")
+            time.sleep(delay)
+
+        if response.status_code == 304 and cached:
+            with self._lock:
+                self._etags.move_to_end(cache_key)
+            return ApiResponse(200, response.headers, cached[1], from_cache=True)
+
+        if cache_key and response.status_code == 200 and response.headers.get("ETag"):
+            with self._lock:
+                self._etags[cache_key] = (response.headers["ETag"], response.text)
+                self._etags.move_to_end(cache_key)
+                while len(self._etags) > self.max_etags:
+                    self._etags.popitem(last=False)
+        return ApiResponse(response.status_code, response.headers, response.text)
+
+    def get(self, path, token=None, params=None, **kwargs):
+        return self.request("GET", path, token, params=params, **kwargs)
+
+    @staticmethod
+    def _links(response):
+        """rel -> URL from a Link header"""
+        links = {}
+        for link in requests.utils.parse_header_links(response.headers.get("Link", "")):
+            if "rel" in link and "url" in link:
+                links[link["rel"]] = link["url"]
+        return links
+
+    def _budget(self, token, resource):
+        """How many requests we can afford right now without dipping into the reserve"""
+        with self._lock:
+            limit = self._limits.get((self.fingerprint(token), resource))
+        if not limit:
+            return None
+        return max(1, limit["remaining"] - self._reserve_for(limit))
+
+    def pages(self, path, token=None, params=None, item_key=None, max_items=None, per_page=100, max_workers=4):
+        """Yield lists of items page by page, in order, until exhausted or max_items.
+
+        Page 1 is fetched alone; when its Link header names rel="last", the
+        remaining pages are fetched concurrently (bounded by max_workers and
+        the token's rate budget) and each is yielded as soon as every page
+        before it has arrived. Without rel="last" we follow rel="next".
+        """
+        if max_items is not None:
+            per_page = max(1, min(per_page, max_items))
+        params = dict(params or {}, per_page=per_page)
+        remaining = max_items
+
+        def items_of(response):
+            data = response.json()
+            return (data.get(item_key, []) if item_key else data) or []
+
+        def take(items):
+            nonlocal remaining
+            if remaining is None:
+                return items
+            items = items[:remaining]
+            remaining -= len(items)
+            return items
+
+        response = self.get(path, token, params=params)
+        if response.status_code != 200:
+            raise ApiError(response)
+        first = items_of(response)
+        yield take(first)
+        if (remaining is not None and remaining <= 0) or len(first) < per_page:
+            return
+
+        links = self._links(response)
+        last_page = None
+        if "last" in links:
+            last_page = int(parse_qs(urlparse(links["last"]).query).get("page", ["1"])[0])
+
+        if last_page is None:
+            # Cursor-style pagination: only "next" is known, so walk it
+            next_url = links.get("next")
+            while next_url and (remaining is None or remaining > 0):
+                response = self.get(next_url, token)
+                if response.status_code != 200:
+                    raise ApiError(response)
+                yield take(items_of(response))
+                next_url = self._links(response).get("next")
+            return
+
+        if remaining is not None:
+            last_page = min(last_page, 1 + -(-remaining // per_page))
+        page_numbers = list(range(2, last_page + 1))
+        budget = self._budget(token, self._resource(self._url(path)))
+        workers = max(1, min(max_workers, len(page_numbers), budget or max_workers))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self.get, path, token, dict(params, page=page)): page for page in page_numbers}
+            arrived = {}
+            next_page = 2
+            for future in as_completed(futures):
+                arrived[futures[future]] = future.result()
+                while next_page in arrived:
+                    response = arrived.pop(next_page)
+                    next_page += 1
+                    if response.status_code != 200:
+                        for pending in futures:
+                            pending.cancel()
+                        raise ApiError(response)
+                    items = take(items_of(response))
+                    if items:
+                        yield items
+
+    @property
+    def graphql_url(self):
+        # github.com serves GraphQL next to REST; GHES serves it at /api/graphql beside /api/v3
+        if self.api_url.endswith("/v3"):
+            return self.api_url[:-len("/v3")] + "/graphql"
+        return f"{self.api_url}/graphql"
+
+    def graphql(self, query, variables=None, token=None, timeout=30):
+        """POST a GraphQL query; returns the decoded {"data", "errors"} body"""
+        response = self.request("POST", self.graphql_url, token, json_body={"query": query, "variables": variables or {}},
+                                timeout=timeout)
+        if response.status_code != 200:
+            raise ApiError(response)
+        return response.json()
+
+    def get_all(self, path, token=None, params=None, item_key=None, max_items=None, on_page=None, **kwargs):
+        """Collect every page into one list; on_page(items) streams each page as it lands"""
+        results = []
+        for items in self.pages(path, token, params, item_key=item_key, max_items=max_items, **kwargs):
+            results.extend(items)
+            if on_page and items:
+                on_page(items)
+        return results
+
+    def post(self, path, token=None, json_body=None, **kwargs):
+        return self.request("POST", path, token, json_body=json_body, **kwargs)
+
+    def download(self, path, dest, token=None, chunk_size=1 << 20, timeout=60):
+        """Stream a (usually redirected) download into `dest`, atomically; returns the byte count.
+
+        The redirect target is a pre-signed URL on another host, which
+        requests doesn't send the Authorization header to.
+        """
+        url = self._url(path)
+        limit_key = (self.fingerprint(token), self._resource(url))
+        headers = {'Accept': 'application/vnd.github.v3+json'}
+        if token:
+            headers['Authorization'] = f'token {token}'
+        self._throttle(limit_key)
+        started = time.perf_counter() if self.tracer.enabled else None
+        written = 0
+        with self.session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+            self._record_limits(limit_key, (response.history[0] if response.history else response).headers)
+            if response.status_code != 200:
+                if started is not None:
+                    self.tracer.record("http", _api_endpoint("GET", url), started, code=response.status_code, failed=True)
+                raise ApiError(response)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            tmp_path = f"{dest}.{os.getpid()}.{threading.get_ident()}.part"
+            try:
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+                        written += len(chunk)
+                os.replace(tmp_path, dest)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        if started is not None:
+            self.tracer.record("http", _api_endpoint("GET", url), started, code=200, bytes_out=written)
+        return written
+
+class ResponseCache:
+    """Persistent LRU cache of API results, shared by every engine process.
+
+    One JSON file per entry under `<workspace_root>/api_cache/`, named by a
+    hash of the command, its arguments and the token fingerprint (tokens are
+    never written). Entries are fresh for `ttl` seconds; after that, while
+    `background` is set (the serve daemon), they're served stale for up to
+    `stale_ttl` more and refreshed on a background thread. Files are replaced
+    atomically, so concurrent processes only ever read whole entries. Reads
+    bump the mtime, and the least recently used files are evicted once the
+    cache passes `max_entries` or `max_bytes`.
+    """
+
+    def __init__(self, cache_dir, max_entries=512, max_bytes=64 * 1024 ** 2):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Serving stale entries needs someone to refresh them, and only the daemon outlives its response
+        self.background = False
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(endpoint, token, args):
+        raw = json.dumps([endpoint, GitHubClient.fingerprint(token), args], default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load(self, key):
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def store(self, key, endpoint, token, value):
+        entry = {"endpoint": endpoint, "token": GitHubClient.fingerprint(token), "stored_at": time.time(), "value": value}
+        _atomic_write(self._path(key), json.dumps(entry))
+        self.prune()
+
+    def prune(self):
+        """Evict least recently used entries past the limits; returns how many went"""
+        now = time.time()
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    if entry.name.endswith(".json"):
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    elif entry.name.endswith(".tmp") and now - stat.st_mtime > 3600:
+                        self._remove(entry.path)  # Left behind by a process killed mid-write
+        except OSError:
+            return 0
+        entries.sort(reverse=True)
+        total = removed = 0
+        for index, (_, size, path) in enumerate(entries):
+            total += size
+            if (index >= self.max_entries or total > self.max_bytes) and self._remove(path):
+                removed += 1
+        return removed
+
+    def invalidate(self, endpoint=None, token=None):
+        """Drop entries for this endpoint and/or token (everything when neither is given)"""
+        fp = GitHubClient.fingerprint(token) if token is not None else None
+        removed = 0
+        try:
+            names = [name for name in os.listdir(self.cache_dir) if name.endswith(".json")]
+        except OSError:
+            return 0
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            if endpoint is not None or fp is not None:
+                entry = self._load(name[:-len(".json")])
+                if entry is None or (endpoint is not None and entry.get("endpoint") != endpoint) \
+                        or (fp is not None and entry.get("token") != fp):
+                    continue
+            removed += self._remove(path)
+        return removed
+
+    def _settle(self, key, endpoint, token, value):
+        """Keep successful results; drop the entry once the API rejects the call outright"""
+        if value.get("success"):
+            self.store(key, endpoint, token, value)
+        elif isinstance(value.get("status"), int) and value["status"] < 500:
+            self._remove(self._path(key))
+
+    def _refresh_later(self, key, endpoint, token, refresher, old, on_refresh):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                value = refresher()
+                self._settle(key, endpoint, token, value)
+                if on_refresh and value.get("success") and value != old:
+                    on_refresh(value)
+            except Exception:
+                pass  # The stale entry stays; the next read tries again
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name="cache-refresh", daemon=True).start()
+
+    def get(self, endpoint, token, args, compute, ttl, stale_ttl=0, refresh=False, refresher=None, on_refresh=None):
+        """(value, meta) for this call, running compute() only when no entry is usable.
+
+        A failed compute without an HTTP status (offline, timeout) falls back
+        to whatever entry exists, however old. on_refresh(value) is called when
+        a background refresh brings back something different.
+        """
+        key = self.key(endpoint, token, args)
+        entry = self._load(key)
+        age = time.time() - entry["stored_at"] if entry else None
+        if entry and not refresh:
+            stale = age >= ttl
+            if not stale or (self.background and age < ttl + stale_ttl):
+                try:
+                    os.utime(self._path(key))
+                except OSError:
+                    pass  # Evicted by another process since; the value we hold is still good
+                if stale:
+                    self._refresh_later(key, endpoint, token, refresher or compute, entry["value"], on_refresh)
+                return entry["value"], {"cached": True, "stale": stale, "age": round(age, 1)}
+
+        value = compute()
+        self._settle(key, endpoint, token, value)
+        if entry and not value.get("success") and "status" not in value:
+            return entry["value"], {"cached": True, "stale": True, "age": round(age, 1), "error": value.get("message")}
+        return value, {"cached": False, "stale": False, "age": 0}
+
+RUN_FIELDS = ("id", "name", "display_title", "run_number", "run_attempt", "event", "status", "conclusion",
+              "head_branch", "head_sha", "html_url", "created_at", "updated_at")
+JOB_FIELDS = ("id", "name", "status", "conclusion", "started_at", "completed_at", "html_url")
+
+def _run_summary(run):
+    return {key: run.get(key) for key in RUN_FIELDS}
+
+def _job_summary(job):
+    summary = {key: job.get(key) for key in JOB_FIELDS}
+    summary["steps"] = [{key: step.get(key) for key in ("number", "name", "status", "conclusion")}
+                        for step in job.get("steps") or []]
+    return summary
+
+class RunWatcher:
+    """Incremental GitHub Actions polling for watched repos.
+
+    Per repo it remembers the runs it has seen. A poll asks only for runs
+    created since the newest one (created>=), plus one conditional GET per
+    run (and its jobs) still queued or in progress; every `sweep_every`
+    polls the latest page is revalidated to catch re-runs of older runs.
+    Unchanged resources come back as 304s, which don't count against the
+    rate limit. Repos with active runs are polled every `active_interval`;
+    idle ones back off from `idle_interval` to `max_idle_interval`.
+    """
+
+    def __init__(self, api, active_interval=5, idle_interval=30, max_idle_interval=300, seed_runs=10, sweep_every=6):
+        self.api = api
+        self.active_interval = active_interval
+        self.idle_interval = idle_interval
+        self.max_idle_interval = max_idle_interval
+        self.seed_runs = seed_runs
+        self.sweep_every = sweep_every
+        self._repos = {}
+        self._watches = {}
+        self._next_watch = 1
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def new_state(self):
+        return {"runs": {}, "jobs": {}, "newest_created": None, "interval": self.active_interval, "polls": 0}
+
+    @staticmethod
+    def runs_of(state):
+        return sorted(state["runs"].values(), key=lambda run: run["created_at"] or "", reverse=True)
+
+    def _get(self, path, token, params=None):
+        response = self.api.get(path, token, params=params)
+        if response.status_code != 200:
+            raise ApiError(response)
+        return response.json()
+
+    def poll(self, token, repo, state):
+        """One incremental poll of `repo`; updates `state` in place and returns change events"""
+        base = f"/repos/{repo}/actions/runs"
+        seeding = state["newest_created"] is None
+        if seeding or state["polls"] % self.sweep_every == 0:
+            fetched = self._get(base, token, {"per_page": self.seed_runs}).get("workflow_runs", [])
+        else:
+            params = {"created": f">={state['newest_created']}", "per_page": 100}
+            fetched = self._get(base, token, params).get("workflow_runs", [])
+        listed = {str(run["id"]) for run in fetched}
+        for run_id, run in list(state["runs"].items()):
+            if run["status"] != "completed" and run_id not in listed:
+                fetched.append(self._get(f"{base}/{run_id}", token))
+
+        events = []
+        finished = []
+        for run in fetched:
+            summary = _run_summary(run)
+            run_id = str(summary["id"])
+            previous = state["runs"].get(run_id)
+            if previous == summary:
+                continue
+            state["runs"][run_id] = summary
+            if summary["created_at"] and (state["newest_created"] is None or summary["created_at"] > state["newest_created"]):
+                state["newest_created"] = summary["created_at"]
+            if previous and previous["status"] != "completed" and summary["status"] == "completed":
+                finished.append(run_id)
+            if not seeding:
+                events.append({
+                    "event": "run_changed", "repo": repo, "run": summary, "new": previous is None,
+                    "previous": {"status": previous["status"], "conclusion": previous["conclusion"]} if previous else None
+                })
+        if seeding:
+            events.append({"event": "runs", "repo": repo, "runs": self.runs_of(state)})
+
+        # Jobs of active runs, plus one last look at runs that just finished
+        active = [run_id for run_id, run in state["runs"].items() if run["status"] != "completed"]
+        for run_id in active + finished:
+            jobs = self._get(f"{base}/{run_id}/jobs", token, {"per_page": 100}).get("jobs", [])
+            known = state["jobs"].setdefault(run_id, {})
+            for job in jobs:
+                summary = _job_summary(job)
+                job_id = str(summary["id"])
+                previous = known.get(job_id)
+                if previous != summary:
+                    known[job_id] = summary
+                    events.append({
+                        "event": "job_changed", "repo": repo, "run_id": int(run_id), "job": summary,
+                        "previous": {"status": previous["status"], "conclusion": previous["conclusion"]} if previous else None
+                    })
+        for run_id in finished:
+            state["jobs"].pop(run_id, None)
+
+        # Only the newest runs (and anything still active) stay tracked
+        keep = {run["id"] for run in self.runs_of(state)[:self.seed_runs]}
+        state["runs"] = {run_id: run for run_id, run in state["runs"].items()
+                         if run["id"] in keep or run["status"] != "completed"}
+
+        if active:
+            state["interval"] = self.active_interval
+        elif events:
+            state["interval"] = self.idle_interval
+        else:
+            state["interval"] = min(self.max_idle_interval, max(self.idle_interval, state["interval"] * 2))
+        state["polls"] += 1
+        return events
+
+    def watch(self, token, repos, callback):
+        """Poll `repos` in the background, sending each change event to callback"""
+        snapshots = []
+        with self._lock:
+            watch_id = self._next_watch
+            self._next_watch += 1
+            keys = []
+            for repo in repos:
+                key = (GitHubClient.fingerprint(token), repo)
+                entry = self._repos.get(key)
+                if entry is None:
+                    entry = self._repos[key] = {"token": token, "repo": repo, "state": self.new_state(),
+                                                "due": 0, "watches": set()}
+                elif entry["state"]["newest_created"] is not None:
+                    snapshots.append({"event": "runs", "repo": repo, "runs": self.runs_of(entry["state"])})
+                entry["watches"].add(watch_id)
+                keys.append(key)
+            self._watches[watch_id] = (keys, callback)
+        for event in snapshots:
+            callback(event)
+        self._wake.set()
+        return watch_id
+
+    def unwatch(self, watch_id):
+        with self._lock:
+            keys, _ = self._watches.pop(watch_id, ([], None))
+            for key in keys:
+                entry = self._repos.get(key)
+                if entry:
+                    entry["watches"].discard(watch_id)
+                    if not entry["watches"]:
+                        del self._repos[key]
+            return bool(keys)
+
+    def _poll_entry(self, entry):
+        try:
+            events = self.poll(entry["token"], entry["repo"], entry["state"])
+        except Exception as e:
+            state = entry["state"]
+            state["interval"] = min(self.max_idle_interval, max(self.idle_interval, state["interval"] * 2))
+            events = [{"event": "watch_error", "repo": entry["repo"], "message": str(e)}]
+        with self._lock:
+            entry["due"] = time.monotonic() + entry["state"]["interval"]
+            callbacks = [self._watches[watch_id][1] for watch_id in entry["watches"] if watch_id in self._watches]
+        for event in events:
+            for callback in callbacks:
+                try:
+                    callback(event)
+                except Exception:
+                    pass
+
+    def _loop(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            with self._lock:
+                due = [entry for entry in self._repos.values() if entry["due"] <= now]
+            for entry in due:
+                self._poll_entry(entry)
+            with self._lock:
+                wait = min((entry["due"] for entry in self._repos.values()), default=None)
+            self._wake.clear()
+            self._wake.wait(None if wait is None else max(0.0, wait - time.monotonic()))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="run-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+def tail_lines(path, count, before=None):
+    """The last `count` lines ending at byte offset `before` (default: end of file), via mmap.
+
+    start_offset can be passed back as `before` to page further up.
+    """
+    size = os.path.getsize(path)
+    end = size if before is None else max(0, min(int(before), size))
+    if end == 0:
+        return {"lines": [], "start_offset": 0, "end_offset": 0, "has_more_before": False}
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = end - 1 if mm[end - 1:end] == b"\n" else end
+        start = 0
+        for _ in range(count):
+            newline = mm.rfind(b"\n", 0, pos)
+            if newline < 0:
+                start = 0
+                break
+            start = pos = newline
+        else:
+            start += 1
+        if count <= 0:
+            start = end
+        lines = mm[start:end].decode("utf-8", "replace").splitlines()
+    return {"lines": lines, "start_offset": start, "end_offset": end, "has_more_before": start > 0}
+
+def search_lines(path, needle, max_matches=200):
+    """Lines containing `needle` (case-sensitive), with 1-based line numbers, via mmap"""
+    matches = []
+    if not needle or os.path.getsize(path) == 0:
+        return {"matches": matches, "truncated": False}
+    pattern = needle.encode()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        line_no, counted_to = 1, 0
+        pos = mm.find(pattern)
+        while pos >= 0:
+            if len(matches) >= max_matches:
+                return {"matches": matches, "truncated": True}
+            line_start = mm.rfind(b"\n", 0, pos) + 1
+            line_end = mm.find(b"\n", pos)
+            line_end = len(mm) if line_end < 0 else line_end
+            line_no += mm[counted_to:line_start].count(b"\n")
+            counted_to = line_start
+            matches.append({"line": line_no, "offset": line_start,
+                            "text": mm[line_start:line_end].decode("utf-8", "replace").rstrip("\r")})
+            pos = mm.find(pattern, line_end)
+    return {"matches": matches, "truncated": False}
+
+def _log_entries(archive):
+    """Jobs and steps in a run's log archive: `<n>_<job>.txt` plus `<job>/<n>_<step>.txt`"""
+    jobs = {}
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        folder, _, filename = info.filename.rpartition("/")
+        match = re.match(r"(\d+)_(.*)\.txt$", filename)
+        if not match:
+            continue
+        job = jobs.setdefault(folder or match.group(2), {"name": folder or match.group(2), "log": None, "size": None, "steps": []})
+        if folder:
+            job["steps"].append({"number": int(match.group(1)), "name": match.group(2),
+                                 "size": info.file_size, "member": info.filename})
+        else:
+            job["log"], job["size"] = info.filename, info.file_size
+    for job in jobs.values():
+        job["steps"].sort(key=lambda step: step["number"])
+    return list(jobs.values())
+
+# Where each `git --progress` phase sits on a 0-100 scale for the whole operation
+PROGRESS_PHASES = {
+    "Enumerating objects": (0, 2),
+    "Counting objects": (2, 5),
+    "Compressing objects": (5, 10),
+    "Receiving objects": (10, 70),
+    "Resolving deltas": (70, 85),
+    "Updating files": (85, 100),
+    "Checking out files": (85, 100),
+}
+PROGRESS_LINE = re.compile(r"^(?:remote: )?([A-Za-z ]+):\s+(\d+)%")
 
 class GHEngine:
-    def __init__(self, workspace_root=None):
+    def __init__(self, workspace_root=None, max_git_procs=None, max_fetches_per_host=4, api_url=None, git_backend=None):
         if workspace_root:
             self.workspace_root = workspace_root
         else:
@@ -18,42 +2158,309 @@ class GHEngine:
         if not os.path.exists(self.snapshots_dir):
             os.makedirs(self.snapshots_dir, exist_ok=True)
 
-    def run_git(self, repo_path, args):
+        # Concurrency limits: total git processes, and network fetches per remote host
+        self.max_git_procs = max_git_procs or min(16, (os.cpu_count() or 4) * 2)
+        self.max_fetches_per_host = max_fetches_per_host
+        self._git_slots = threading.BoundedSemaphore(self.max_git_procs)
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+        self._object_cache_lock = threading.Lock()
+
+        self.fetch_scheduler = FetchScheduler(self)
+        self.locks_dir = os.path.join(self.workspace_root, "locks")
+        self._repo_locks = {}
+        self._repo_locks_lock = threading.Lock()
+        self.maintenance = MaintenanceScheduler(self)
+        self.status_cache = StatusCache(self)
+        self.repo_index = RepoIndex(os.path.join(self.workspace_root, "repo_index"))
+        self.tracer = Tracer(
+            os.path.join(self.workspace_root, "slow_calls.jsonl"),
+            enabled=os.environ.get("SYNCSTACK_TRACE", "").lower() in ("1", "true"),
+            slow_ms=_float_arg(os.environ.get("SYNCSTACK_SLOW_MS"))
+        )
+        self.api = GitHubClient(api_url, tracer=self.tracer)
+        self.run_watcher = RunWatcher(self.api)
+        self.response_cache = ResponseCache(os.path.join(self.workspace_root, "api_cache"))
+        # Read-only status/history/diff queries (see make_git_backend)
+        self.git_backend = make_git_backend(self, git_backend)
+        self._graph_layouts = OrderedDict()
+        self._graph_lock = threading.Lock()
+
+    def run_git(self, repo_path, args, timeout=None, env=None, input=None):
+        queued = time.perf_counter() if self.tracer.enabled else None
+        started = result = error = None
+        try:
+            with self._git_slots:
+                if queued is not None:
+                    started = time.perf_counter()
+                result = subprocess.run(
+                    ["git", "-C", repo_path] + args,
+                    capture_output=True,
+                    text=True,
+                    check=False,
+                    timeout=timeout,
+                    env=dict(os.environ, **env) if env else None,
+                    input=input
+                )
+        except Exception as e:
+            # Callers treat None as "git didn't run"; keep the reason visible
+            error = e
+            print(f"git {_git_command(args)} failed in {repo_path}: {e}", file=sys.stderr)
+        if queued is not None:
+            self.tracer.record(
+                "git", _git_command(args), started or queued, repo=repo_path,
+                code=result.returncode if result else None,
+                bytes_out=len(result.stdout.encode()) if result else None,
+                failed=result is None or result.returncode != 0, error=error,
+                wait_ms=(started - queued) * 1000 if started else None
+            )
+        return result
+
+    @contextmanager
+    def repo_lock(self, repo_path, blocking=True):
+        """Exclusive per-repo lock shared by every engine process; yields False when busy and not blocking"""
+        key = hashlib.sha1(os.path.abspath(repo_path).encode()).hexdigest()[:16]
+        with self._repo_locks_lock:
+            local = self._repo_locks.setdefault(key, threading.Lock())
+        if not local.acquire(blocking):
+            yield False
+            return
         try:
-            result = subprocess.run(
+            if fcntl is None:
+                yield True
+                return
+            os.makedirs(self.locks_dir, exist_ok=True)
+            with open(os.path.join(self.locks_dir, f"{key}.lock"), "a") as handle:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+        finally:
+            local.release()
+
+    @contextmanager
+    def popen_git(self, repo_path, args, timeout=None):
+        """Stream a git command's binary stdout; the process is killed at `timeout`"""
+        queued = time.perf_counter() if self.tracer.enabled else None
+        with self._git_slots:
+            started = time.perf_counter()
+            proc = subprocess.Popen(
                 ["git", "-C", repo_path] + args,
-                capture_output=True,
-                text=True,
-                check=False
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
             )
-            return result
-        except Exception as e:
-            return None
+            if queued is not None:
+                proc.stdout = _CountingStream(proc.stdout)
+            timer = None
+            if timeout is not None:
+                timer = threading.Timer(timeout, proc.kill)
+                timer.start()
+            stopped = False
+            try:
+                yield proc
+            finally:
+                if timer:
+                    timer.cancel()
+                proc.stdout.close()
+                if proc.poll() is None:
+                    # The caller had what it needed; not a git failure
+                    stopped = True
+                    proc.kill()
+                proc.wait()
+                if queued is not None:
+                    self.tracer.record(
+                        "git", _git_command(args), started, repo=repo_path, code=proc.returncode,
+                        bytes_out=proc.stdout.count, failed=not stopped and proc.returncode != 0,
+                        wait_ms=(started - queued) * 1000
+                    )
+
+    def _read_status(self, repo_path, timeout=None):
+        """One status pass: branch, upstream, ahead/behind and entries"""
+        branch, entries = self.git_backend.read_status(repo_path, timeout=timeout)
+        if branch is None:
+            return None, []
+
+        if branch["head"] == "(detached)":
+            branch["head"] = "HEAD"
+        if branch["upstream"] is None and branch["oid"] and branch["head"] != "HEAD":
+            # No tracking branch configured: compare against origin/<branch> if it exists
+            counts = self.git_backend.ahead_behind(repo_path, "HEAD", f"origin/{branch['head']}", timeout=timeout)
+            if counts:
+                branch["ahead"], branch["behind"] = counts
+        return branch, entries
+
+    def run_git_progress(self, cmd, on_progress=None, timeout=None):
+        """Run a `git ... --progress` command, reporting (phase, percent) from stderr as it updates"""
+        tail = []
+        queued = time.perf_counter() if self.tracer.enabled else None
+        with self._git_slots:
+            started = time.perf_counter()
+            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            timer = None
+            if timeout is not None:
+                timer = threading.Timer(timeout, proc.kill)
+                timer.start()
+            try:
+                buffer = b""
+                while True:
+                    chunk = proc.stderr.read1(4096)
+                    if not chunk:
+                        break
+                    # Progress lines are redrawn with \r; everything else ends in \n
+                    *lines, buffer = re.split(rb"[\r\n]", buffer + chunk)
+                    for line in lines:
+                        text = line.decode("utf-8", "replace").strip()
+                        match = PROGRESS_LINE.match(text)
+                        if match:
+                            if on_progress:
+                                on_progress(match.group(1), int(match.group(2)))
+                        elif text:
+                            tail = (tail + [text])[-20:]
+                if buffer.strip():
+                    tail.append(buffer.decode("utf-8", "replace").strip())
+                proc.wait()
+            finally:
+                if timer:
+                    timer.cancel()
+                proc.stderr.close()
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+        if queued is not None:
+            self.tracer.record(
+                "git", _git_command(cmd), started, repo=cmd[cmd.index("-C") + 1] if "-C" in cmd else cmd[-1],
+                code=proc.returncode, failed=proc.returncode != 0, wait_ms=(started - queued) * 1000
+            )
+        return subprocess.CompletedProcess(cmd, proc.returncode, "", "\n".join(tail))
+
+    def _host_slot(self, host):
+        with self._host_slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_fetches_per_host)
+            return self._host_slots[host]
+
+    def fetch_remote(self, repo_path, remote="origin", timeout=None):
+        """Fetch a remote while holding that remote host's fetch slot"""
+        res = self.run_git(repo_path, ["remote", "get-url", remote], timeout=timeout)
+        if not res or res.returncode != 0:
+            return False
+        with self._host_slot(_remote_host(res.stdout.strip())):
+            res = self.run_git(repo_path, ["fetch", "--quiet", remote], timeout=timeout)
+        return bool(res and res.returncode == 0)
+
+    def _run_parallel(self, items, task, on_result=None, cancel_event=None):
+        """Run task(item) on a bounded pool and return results in input order.
+
+        on_result(index, result) is called as each item finishes. Items not yet
+        started when cancel_event is set resolve to {"error": "cancelled"}.
+        """
+        results = [None] * len(items)
+        if not items:
+            return results
+
+        def guarded(item):
+            if cancel_event is not None and cancel_event.is_set():
+                return {"error": "cancelled"}
+            try:
+                return task(item)
+            except Exception as e:
+                return {"error": str(e)}
+
+        with ThreadPoolExecutor(max_workers=min(self.max_git_procs, len(items))) as pool:
+            futures = {pool.submit(guarded, item): index for index, item in enumerate(items)}
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                if on_result:
+                    on_result(index, results[index])
+        return results
+
+    def _refresh_remote(self, repo_path, fetch, timeout=None):
+        """Apply a status call's fetch mode: False (local refs only), "auto" (TTL expired) or "now" (forced)"""
+        self.fetch_scheduler.register(repo_path)
+        if fetch in ("now", True):
+            self.fetch_scheduler.fetch(repo_path, force=True, timeout=timeout)
+        elif fetch == "auto":
+            self.fetch_scheduler.fetch(repo_path, timeout=timeout)
+        return _last_fetch_time(repo_path)
+
+    def fetch_now(self, repo_path):
+        """Force a fetch regardless of the repo's TTL"""
+        if not os.path.exists(os.path.join(repo_path, ".git")):
+            return {"success": False, "message": "Not a git repository"}
+        return self.fetch_scheduler.fetch(repo_path, force=True)
+
+    def schedule_fetch(self, repo_path, ttl):
+        """Set how often the scheduler refreshes a repo's remote"""
+        state = self.fetch_scheduler.register(repo_path, ttl=ttl)
+        return {"success": True, "ttl": state["ttl"], "next_due": state["next_due"], "fetched_at": state["fetched_at"]}
+
+    def maintain_repo(self, repo_path=None, tasks=None, force=False):
+        """Run maintenance now on one repo (or every managed repo), with before/after timings"""
+        unknown = [task for task in tasks or [] if task not in MaintenanceScheduler.TASKS]
+        if unknown:
+            return {"success": False, "message": f"Unknown maintenance tasks: {', '.join(unknown)}"}
+        repo_paths = [repo_path] if repo_path else self.maintenance.repos()
+        reports = [self.maintenance.run(path, tasks, force) for path in repo_paths if os.path.exists(path)]
+        if repo_path and not reports:
+            return {"success": False, "message": "Repository not found"}
+        return {"success": all(report["success"] for report in reports), "repos": reports}
+
+    def get_maintenance_status(self):
+        """Last run per task and the latest report, for every repo maintenance has seen"""
+        state = self.maintenance.load_state()
+        return {
+            "success": True,
+            "repos": [dict(repo_state, repo=path, due=self.maintenance.is_due(path, state)) for path, repo_state in state.items()],
+        }
+
+    def get_cached_status(self, repo_path, timeout=None, fetch=False, detailed=False):
+        """get_repo_status, or get_detailed_status, through the StatusCache (a refetch always recomputes)"""
+        if detailed:
+            compute = lambda: self.get_detailed_status(repo_path, fetch)
+        else:
+            compute = lambda: self.get_repo_status(repo_path, timeout=timeout, fetch=fetch)
+        if fetch:
+            status = compute()
+            self.status_cache.invalidate(repo_path)
+            return status
+        status = self.status_cache.get(repo_path, compute, "detailed" if detailed else "status")
+        # A fetch that brought nothing new touches no watched ref, only FETCH_HEAD
+        return dict(status, fetched_at=_last_fetch_time(repo_path)) if "fetched_at" in status else status
 
-    def get_repo_status(self, repo_path):
+    def subscribe_status(self, repos, on_event):
+        """Push a `status_changed` event whenever one of these repos changes on disk"""
+        if not self.status_cache.enabled:
+            return {"success": False, "message": "Status subscriptions need the serve daemon"}
+        token = self.status_cache.subscribe(
+            lambda path, status: on_event({"event": "status_changed", "path": path, "status": status}),
+            repos=[repo.get('path') if isinstance(repo, dict) else repo for repo in repos]
+        )
+        return {"success": True, "subscription": token}
+
+    def unsubscribe_status(self, subscription):
+        return {"success": self.status_cache.unsubscribe(subscription)}
+
+    def get_repo_status(self, repo_path, timeout=None, fetch=False):
         if not os.path.exists(os.path.join(repo_path, ".git")):
             return {"exists": False}
+        deadline = time.monotonic() + timeout if timeout else None
 
-        # 1. Current Branch
-        res = self.run_git(repo_path, ["rev-parse", "--abbrev-ref", "HEAD"])
-        branch = res.stdout.strip() if res and res.returncode == 0 else "main"
+        # 1. Refresh remote refs only if asked to (see FetchScheduler)
+        fetched_at = self._refresh_remote(repo_path, fetch, timeout=_remaining(deadline))
 
-        # 2. Local Changes (Dirty Status)
-        res = self.run_git(repo_path, ["status", "--porcelain"])
-        changes = res.stdout.strip().split("\n") if res and res.stdout.strip() else []
+        # 2. Branch, Local Changes and Ahead / Behind from a single status call
+        info, changes = self._read_status(repo_path, timeout=_remaining(deadline))
+        info = info or {"head": "main", "ahead": 0, "behind": 0}
+        branch, ahead, behind = info["head"], info["ahead"], info["behind"]
         is_dirty = len(changes) > 0
 
-        # 3. Ahead / Behind Status
-        # Fetch first to get latest remote info
-        self.run_git(repo_path, ["fetch", "--quiet"])
-        res = self.run_git(repo_path, ["rev-list", "--left-right", "--count", f"HEAD...origin/{branch}"])
-        ahead, behind = 0, 0
-        if res and res.returncode == 0:
-            parts = res.stdout.strip().split()
-            if len(parts) == 2:
-                ahead, behind = int(parts[0]), int(parts[1])
-
-        # 4. Conflict Prediction
+        # 3. Conflict Prediction
         risk = "low"
         if is_dirty and behind > 0:
             risk = "high"
@@ -67,7 +2474,7 @@ class GHEngine:
         else:
             reason = "Everything is synchronized."
 
-        return {
+        status = {
             "exists": True,
             "branch": branch,
             "is_dirty": is_dirty,
@@ -76,8 +2483,12 @@ class GHEngine:
             "behind": behind,
             "risk": risk,
             "risk_reason": reason,
-            "human_status": self._humanize_status(is_dirty, ahead, behind)
+            "human_status": self._humanize_status(is_dirty, ahead, behind),
+            "fetched_at": fetched_at
         }
+        if deadline is not None and time.monotonic() >= deadline:
+            status["timed_out"] = True
+        return status
 
     def _humanize_status(self, is_dirty, ahead, behind):
         if is_dirty: return "Uncommitted changes"
@@ -86,67 +2497,32 @@ class GHEngine:
         if behind > 0: return f"{behind} commits behind (Pull needed)"
         return "Up to date"
 
-    def get_detailed_status(self, repo_path):
+    def get_detailed_status(self, repo_path, fetch=False):
         """Get detailed status with file-by-file changes"""
         if not os.path.exists(os.path.join(repo_path, ".git")):
             return {"success": False, "message": "Not a git repository"}
 
         try:
-            # Get basic status
-            res = self.run_git(repo_path, ["rev-parse", "--abbrev-ref", "HEAD"])
-            branch = res.stdout.strip() if res and res.returncode == 0 else "main"
+            fetched_at = self._refresh_remote(repo_path, fetch)
 
-            # Get file changes with status
-            res = self.run_git(repo_path, ["status", "--porcelain"])
-            changes = []
-            if res and res.stdout.strip():
-                for line in res.stdout.strip().split("\n"):
-                    if len(line) < 4:
-                        continue
-                    status_code = line[0:2].strip()
-                    file_path = line[3:]
-                    
-                    # Get additions/deletions for modified files
-                    additions, deletions = 0, 0
-                    if status_code in ['M', 'MM']:
-                        stat_res = self.run_git(repo_path, ["diff", "--numstat", file_path])
-                        if stat_res and stat_res.stdout.strip():
-                            parts = stat_res.stdout.strip().split()
-                            if len(parts) >= 2:
-                                try:
-                                    additions = int(parts[0]) if parts[0] != '-' else 0
-                                    deletions = int(parts[1]) if parts[1] != '-' else 0
-                                except ValueError:
-                                    pass
-                    
-                    # Map git status codes
-                    status = 'M'  # default
-                    if status_code in ['A', 'AM']:
-                        status = 'A'  # Added
-                    elif status_code in ['D']:
-                        status = 'D'  # Deleted
-                    elif status_code in ['??']:
-                        status = '?'  # Untracked
-                    elif status_code in ['M', 'MM']:
-                        status = 'M'  # Modified
-                    
-                    changes.append({
-                        "file": file_path,
-                        "status": status,
-                        "additions": additions,
-                        "deletions": deletions
-                    })
+            # Branch, upstream, ahead/behind and file changes in one pass
+            info, changes = self._read_status(repo_path)
+            if info is None:
+                return {"success": False, "message": "git status failed"}
+            branch, ahead, behind = info["head"], info["ahead"], info["behind"]
 
-            is_dirty = len(changes) > 0
+            # Line counts for the whole tree in one diff (staged + unstaged vs HEAD)
+            if changes:
+                base = info["oid"] or EMPTY_TREE_SHA
+                stats = self.git_backend.numstat(repo_path, base)
+                for change in changes:
+                    additions, deletions, binary = stats.get(change["file"], (0, 0, False))
+                    change["additions"] = additions
+                    change["deletions"] = deletions
+                    if binary:
+                        change["binary"] = True
 
-            # Ahead/Behind
-            self.run_git(repo_path, ["fetch", "--quiet"])
-            res = self.run_git(repo_path, ["rev-list", "--left-right", "--count", f"HEAD...origin/{branch}"])
-            ahead, behind = 0, 0
-            if res and res.returncode == 0:
-                parts = res.stdout.strip().split()
-                if len(parts) == 2:
-                    ahead, behind = int(parts[0]), int(parts[1])
+            is_dirty = len(changes) > 0
 
             # Get commit history
             commits = self._get_commit_history(repo_path, limit=10)
@@ -162,134 +2538,516 @@ class GHEngine:
                 "success": True,
                 "exists": True,
                 "branch": branch,
+                "upstream": info["upstream"],
                 "is_dirty": is_dirty,
                 "changes": changes,
                 "ahead": ahead,
                 "behind": behind,
                 "risk": risk,
                 "commits": commits,
-                "human_status": self._humanize_status(is_dirty, ahead, behind)
+                "human_status": self._humanize_status(is_dirty, ahead, behind),
+                "fetched_at": fetched_at
+            }
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    def _get_commit_history(self, repo_path, limit=10):
+        """Get commit history for visualization"""
+        return [{
+            "hash": commit["sha"][:7],
+            "author": commit["author"],
+            "email": commit["email"],
+            "timestamp": str(commit["timestamp"]),
+            "message": commit["subject"]
+        } for commit in self.git_backend.log(repo_path, limit)]
+
+    GRAPH_CHUNK = 500
+    GRAPH_CACHE_SIZE = 8
+
+    def _graph_layout(self, repo_path, tips):
+        """The cached lane layout for repo_path, reset whenever its tips move"""
+        with self._graph_lock:
+            layout = self._graph_layouts.pop(repo_path, None)
+            if layout is None or layout["tips"] != tips:
+                layout = {"tips": tips, "rows": [], "index": {}, "lanes": [], "complete": False, "lock": threading.Lock()}
+            self._graph_layouts[repo_path] = layout
+            while len(self._graph_layouts) > self.GRAPH_CACHE_SIZE:
+                self._graph_layouts.popitem(last=False)
+            return layout
+
+    def _extend_graph(self, repo_path, layout, count):
+        rows = layout["rows"]
+        commits = self.git_backend.log(repo_path, count, revs=layout["tips"], skip=len(rows), topo=True)
+        for row in assign_lanes(commits, layout["lanes"]):
+            layout["index"][row["id"]] = len(rows)
+            rows.append(row)
+        layout["complete"] = len(commits) < count
+
+    def get_git_graph(self, repo_path, limit=20, after=None):
+        """A page of the commit graph with lane layout, starting after the `after` cursor.
+
+        Rows are computed GRAPH_CHUNK commits at a time (doubling while
+        searching for a cursor) and cached per repo until HEAD moves, so
+        scrolling doesn't re-run `git log` for every page.
+        """
+        if not os.path.exists(os.path.join(repo_path, ".git")):
+            return {"success": False, "message": "Not a git repository"}
+
+        tips = tuple(self.git_backend.resolve(repo_path, ["HEAD"]))
+        if not tips:
+            return {"success": True, "results": [], "cursor": None, "has_more": False}
+
+        layout = self._graph_layout(repo_path, tips)
+        with layout["lock"]:
+            rows, index = layout["rows"], layout["index"]
+            start = 0
+            if after:
+                while after not in index and not layout["complete"]:
+                    self._extend_graph(repo_path, layout, max(self.GRAPH_CHUNK, len(rows)))
+                if after not in index:
+                    return {"success": False, "message": f"Unknown cursor: {after}"}
+                start = index[after] + 1
+            # One row past the page tells us whether there's more
+            missing = start + limit + 1 - len(rows)
+            if missing > 0 and not layout["complete"]:
+                self._extend_graph(repo_path, layout, max(self.GRAPH_CHUNK, missing))
+            page = rows[start:start + limit]
+            has_more = len(rows) > start + limit
+
+        return {
+            "success": True,
+            "results": page,
+            "cursor": page[-1]["id"] if page else after,
+            "has_more": has_more
+        }
+
+    DIFF_PAGE_HUNKS = 100
+    DIFF_MAX_BYTES = 8 * 1024 * 1024
+    DIFF_MODES = {"patch": [], "word": ["--word-diff=plain"]}
+
+    def _diff_target(self, repo_path, file_path):
+        """(diff args, size in bytes, untracked) for one file against HEAD"""
+        pathspec = f":(literal){file_path}"
+        head = self.git_backend.resolve(repo_path, ["HEAD"])
+        head_size = None
+        if head:
+            res = self.run_git(repo_path, ["ls-tree", "-l", "-z", head[0], "--", pathspec])
+            if res and res.returncode == 0 and res.stdout:
+                size = res.stdout.split("\t", 1)[0].split()[-1]
+                head_size = int(size) if size.isdigit() else 0
+        untracked = False
+        if head_size is None:
+            res = self.run_git(repo_path, ["ls-files", "-z", "--", pathspec])
+            untracked = not (res and res.stdout)
+
+        full_path = os.path.join(repo_path, file_path)
+        size = max(head_size or 0, os.path.getsize(full_path) if os.path.isfile(full_path) else 0)
+        if untracked:
+            args = ["diff", "--no-index", "--", os.devnull, file_path]
+        else:
+            args = ["diff", head[0] if head else EMPTY_TREE_SHA, "--", pathspec]
+        return args, size, untracked
+
+    @staticmethod
+    def _looks_binary(path):
+        """git's own heuristic: a NUL in the first 8000 bytes"""
+        try:
+            with open(path, "rb") as f:
+                return b"\0" in f.read(8000)
+        except OSError:
+            return False
+
+    def get_file_diff(self, repo_path, file_path, offset=0, limit=DIFF_PAGE_HUNKS, mode="patch", max_bytes=DIFF_MAX_BYTES):
+        """Diff one file against HEAD, `limit` hunks at a time starting at hunk `offset`.
+
+        Untracked files are diffed with --no-index. Binary files and files over
+        `max_bytes` only get a summary, without running the diff. mode is
+        "patch", "word" (--word-diff=plain) or "stat" (line counts only).
+        Hunks are read off git's stdout as it streams; once the page is full
+        git is stopped.
+        """
+        if not os.path.exists(os.path.join(repo_path, ".git")):
+            return {"success": False, "message": "Not a git repository"}
+        if mode != "stat" and mode not in self.DIFF_MODES:
+            return {"success": False, "message": f"Unknown diff mode: {mode}"}
+
+        try:
+            args, size, untracked = self._diff_target(repo_path, file_path)
+            if untracked and not os.path.lexists(os.path.join(repo_path, file_path)):
+                return {"success": False, "message": f"No such file: {file_path}"}
+            result = {
+                "success": True,
+                "file": file_path,
+                "untracked": untracked,
+                "size": size,
+                "binary": False,
+                "too_large": False,
+                "diff": "",
+                "offset": offset,
+                "next_offset": None,
+                "has_more": False
             }
+            if self._looks_binary(os.path.join(repo_path, file_path)):
+                result["binary"] = True
+                return result
+            if max_bytes is not None and size > max_bytes:
+                result["too_large"] = True
+                return result
+
+            if mode == "stat":
+                with self.popen_git(repo_path, args[:1] + ["--numstat", "-z"] + args[1:]) as proc:
+                    stats = parse_numstat_z(_iter_nul_records(proc.stdout))
+                additions, deletions, binary = next(iter(stats.values()), (0, 0, False))
+                result.update(additions=additions, deletions=deletions, binary=binary)
+                return result
+
+            header, hunks, hunk = [], [], None
+            stop = offset + limit if limit is not None else None
+            diff_args = args[:1] + ["--no-color", "--no-ext-diff"] + self.DIFF_MODES[mode] + args[1:]
+            with self.popen_git(repo_path, diff_args) as proc:
+                seen = 0
+                for raw in proc.stdout:
+                    line = raw.decode("utf-8", "replace")
+                    if line.startswith("@@"):
+                        if stop is not None and seen >= stop:
+                            result["has_more"] = True
+                            break
+                        seen += 1
+                        hunk = [] if seen > offset else None
+                        if hunk is not None:
+                            hunks.append(hunk)
+                    elif seen == 0:
+                        header.append(line)
+                        if line.startswith("Binary files "):
+                            result["binary"] = True
+                        continue
+                    if hunk is not None:
+                        hunk.append(line)
+
+            result["diff"] = "".join(header) + "".join("".join(hunk) for hunk in hunks)
+            result["hunks"] = len(hunks)
+            if result["has_more"]:
+                result["next_offset"] = offset + len(hunks)
+            return result
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def _get_commit_history(self, repo_path, limit=10):
-        """Get commit history for visualization"""
-        res = self.run_git(repo_path, [
-            "log",
-            f"-{limit}",
-            "--pretty=format:%H|%an|%ae|%at|%s"
-        ])
-        
-        commits = []
-        if res and res.stdout.strip():
-            for line in res.stdout.strip().split("\n"):
-                parts = line.split('|')
-                if len(parts) >= 5:
-                    commits.append({
-                        "hash": parts[0][:7],
-                        "author": parts[1],
-                        "email": parts[2],
-                        "timestamp": parts[3],
-                        "message": parts[4]
-                    })
-        return commits
+    SNAPSHOT_PREFIX = "refs/syncstack/snapshots/"
+    LEGACY_SNAPSHOT_PREFIX = "refs/heads/syncstack-backup-"
+    # Snapshot commits are engine-authored, whatever the repo's user config says
+    SNAPSHOT_IDENTITY = {
+        "GIT_AUTHOR_NAME": "SyncStack", "GIT_AUTHOR_EMAIL": "snapshots@syncstack.local",
+        "GIT_COMMITTER_NAME": "SyncStack", "GIT_COMMITTER_EMAIL": "snapshots@syncstack.local",
+    }
 
-    def get_git_graph(self, repo_path, limit=20):
-        """Get git graph data for visualization"""
-        res = self.run_git(repo_path, [
-            "log",
-            f"-{limit}",
-            "--graph",
-            "--pretty=format:%H|%p|%an|%s|%at"
-        ])
-        
-        graph_data = []
-        if res and res.stdout.strip():
-            for line in res.stdout.strip().split("\n"):
-                # Handle graph characters
-                parts = line.split('|')
-                if len(parts) >= 5:
-                    graph_data.append({
-                        "id": parts[0].strip().split()[-1], # Hash might have graph prefix
-                        "parents": parts[1].split(),
-                        "author": parts[2],
-                        "message": parts[3],
-                        "timestamp": parts[4],
-                        "raw_line": line
-                    })
-                else:
-                    graph_data.append({"raw_line": line})
-        return graph_data
+    def _worktree_tree(self, repo_path):
+        """Tree of the whole working tree (tracked + untracked, minus ignored), via a throwaway index"""
+        git_dir = _git_dir(repo_path)
+        temp_index = os.path.join(git_dir, f"syncstack-snapshot-index.{os.getpid()}.{threading.get_ident()}")
+        try:
+            # Start from the real index so `add -A` can reuse its stat cache
+            if os.path.exists(os.path.join(git_dir, "index")):
+                shutil.copyfile(os.path.join(git_dir, "index"), temp_index)
+            env = {"GIT_INDEX_FILE": temp_index}
+            res = self.run_git(repo_path, ["add", "-A"], env=env)
+            if not res or res.returncode != 0:
+                return None
+            res = self.run_git(repo_path, ["write-tree"], env=env)
+            return res.stdout.strip() if res and res.returncode == 0 else None
+        finally:
+            if os.path.exists(temp_index):
+                os.remove(temp_index)
+
+    def create_snapshot(self, repo_path, repo_name, reason="sync", force=False):
+        """Record HEAD plus working-tree state under refs/syncstack/snapshots/.
+
+        Returns the snapshot id, or None when nothing could be lost (clean tree
+        and no unpushed commits). Returns the latest snapshot's id when the
+        state matches it. Raises SnapshotError when a snapshot was called for
+        but couldn't be written, so callers never go on to reset without one.
+        """
+        info, changes = self._read_status(repo_path)
+        if info is None or not info["oid"]:
+            return None
+        if not force and not changes and info["ahead"] == 0:
+            return None
+
+        if changes:
+            # HEAD's tree would silently drop the very edits the snapshot is for
+            tree = self._worktree_tree(repo_path)
+            if tree is None:
+                raise SnapshotError("Could not record uncommitted changes in a snapshot")
+        else:
+            res = self.run_git(repo_path, ["rev-parse", "HEAD^{tree}"])
+            if not res or res.returncode != 0:
+                raise SnapshotError(f"Could not read HEAD's tree: {res.stderr.strip() if res else ''}")
+            tree = res.stdout.strip()
+
+        latest = next(iter(self._snapshot_refs(repo_path)), None)
+        if not force and latest and latest["tree"] == tree and latest["head"] == info["oid"]:
+            return latest["id"]
+
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        message = f"SyncStack snapshot ({reason}) of {repo_name} on {info['head']} at {timestamp}"
+        res = self.run_git(repo_path, ["commit-tree", tree, "-p", info["oid"], "-m", message], env=self.SNAPSHOT_IDENTITY)
+        if not res or res.returncode != 0:
+            raise SnapshotError(f"Could not write the snapshot commit: {res.stderr.strip() if res else ''}")
+        commit = res.stdout.strip()
+        snapshot_id = f"{timestamp}-{commit[:7]}"
+        res = self.run_git(repo_path, ["update-ref", self.SNAPSHOT_PREFIX + snapshot_id, commit])
+        if not res or res.returncode != 0:
+            raise SnapshotError(f"Could not write the snapshot ref: {res.stderr.strip() if res else ''}")
+
+        # Ref packing is left to explicit prunes and the maintenance pack-refs task
+        self.prune_snapshots(repo_path, pack_refs=False)
+        return snapshot_id
+
+    LEGACY_SNAPSHOT_TIME = re.compile(r"^syncstack-backup-(\d{8}_\d{6})")
+
+    def _legacy_snapshot_time(self, snapshot_id, fallback):
+        """When a legacy backup was taken, from its name: its commit's date is just when that commit was made"""
+        match = self.LEGACY_SNAPSHOT_TIME.match(snapshot_id)
+        if match:
+            try:
+                return int(datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp())
+            except ValueError:
+                pass
+        return fallback
 
-    def get_file_diff(self, repo_path, file_path):
-        """Get diff for a specific file"""
+    def _snapshot_refs(self, repo_path):
+        """Snapshots (plus legacy syncstack-backup-* branches), newest first"""
+        fmt = "%(refname)%00%(objectname)%00%(tree)%00%(parent)%00%(creatordate:unix)%00%(contents:subject)"
+        res = self.run_git(repo_path, ["for-each-ref", "--sort=-creatordate", f"--format={fmt}",
+                                       self.SNAPSHOT_PREFIX, self.LEGACY_SNAPSHOT_PREFIX + "*"])
+        snapshots = []
+        if not res or res.returncode != 0:
+            return snapshots
+        for line in res.stdout.splitlines():
+            ref, sha, tree, parent, created, subject = line.split("\0", 5)
+            if ref.startswith(self.SNAPSHOT_PREFIX):
+                # A snapshot commit's parent is the HEAD it was taken on
+                snapshot_id = ref[len(self.SNAPSHOT_PREFIX):]
+                # Migrated legacy branches keep their name, and still point at an ordinary commit
+                migrated = self.LEGACY_SNAPSHOT_TIME.match(snapshot_id)
+                snapshots.append({"id": snapshot_id, "ref": ref, "sha": sha, "tree": tree,
+                                  "head": sha if migrated else (parent.split()[0] if parent else None),
+                                  "created_at": self._legacy_snapshot_time(snapshot_id, int(created or 0)),
+                                  "message": subject, "legacy": False})
+            elif ref.startswith(self.LEGACY_SNAPSHOT_PREFIX):
+                # Old backup branches point straight at the HEAD they saved
+                snapshot_id = ref[len("refs/heads/"):]
+                snapshots.append({"id": snapshot_id, "ref": ref, "sha": sha, "tree": tree, "head": sha,
+                                  "created_at": self._legacy_snapshot_time(snapshot_id, int(created or 0)),
+                                  "message": subject, "legacy": True})
+        snapshots.sort(key=lambda snapshot: snapshot["created_at"], reverse=True)
+        return snapshots
+
+    def list_snapshots(self, repo_path):
         if not os.path.exists(os.path.join(repo_path, ".git")):
             return {"success": False, "message": "Not a git repository"}
+        snapshots = self._snapshot_refs(repo_path)
+        for snapshot in snapshots:
+            del snapshot["tree"]
+        return {"success": True, "snapshots": snapshots}
+
+    def prune_snapshots(self, repo_path, keep=20, max_age_days=30, pack_refs=True):
+        """Apply retention (newest `keep`, none older than max_age_days) and optionally pack the refs.
+
+        Legacy syncstack-backup-* branches are moved into the snapshot
+        namespace first, so they fall under the same policy.
+        """
+        snapshots = self._snapshot_refs(repo_path)
+        commands = []
+        migrated = []
+        for snapshot in snapshots:
+            if snapshot["legacy"]:
+                new_ref = self.SNAPSHOT_PREFIX + snapshot["id"]
+                commands.append(f"create {new_ref} {snapshot['sha']}")
+                commands.append(f"delete {snapshot['ref']} {snapshot['sha']}")
+                snapshot["ref"] = new_ref
+                migrated.append(snapshot["id"])
+
+        cutoff = time.time() - max_age_days * 86400
+        pruned = []
+        for index, snapshot in enumerate(snapshots):
+            if index >= keep or snapshot["created_at"] < cutoff:
+                pruned.append(snapshot["id"])
+                if snapshot["legacy"]:
+                    # Never created in the new namespace: drop the create, keep the branch delete
+                    commands.remove(f"create {snapshot['ref']} {snapshot['sha']}")
+                else:
+                    commands.append(f"delete {snapshot['ref']} {snapshot['sha']}")
+
+        if commands:
+            res = self.run_git(repo_path, ["update-ref", "--stdin"], input="\n".join(commands) + "\n")
+            if not res or res.returncode != 0:
+                return {"success": False, "message": f"Snapshot pruning failed: {res.stderr if res else ''}"}
+        if pack_refs:
+            # Keep snapshot refs out of the loose-ref directory scan every git command pays for
+            self.run_git(repo_path, ["pack-refs", "--all"])
+        return {"success": True, "pruned": pruned, "migrated": migrated, "kept": len(snapshots) - len(pruned)}
+
+    def restore_snapshot(self, repo_path, snapshot_id, mode="worktree"):
+        """Restore a snapshot.
+
+        mode="branch" only creates a syncstack-restore-<id> branch at the
+        snapshot. mode="worktree" first snapshots the current state, resets the
+        branch to the snapshot's HEAD and lays its files down as unstaged changes.
+        """
+        snapshot = next((snap for snap in self._snapshot_refs(repo_path) if snap["id"] == snapshot_id), None)
+        if snapshot is None:
+            return {"success": False, "message": f"Unknown snapshot: {snapshot_id}"}
 
+        if mode == "branch":
+            branch = f"syncstack-restore-{snapshot_id}"
+            res = self.run_git(repo_path, ["branch", branch, snapshot["sha"]])
+            if not res or res.returncode != 0:
+                return {"success": False, "message": f"Restore failed: {res.stderr if res else ''}"}
+            return {"success": True, "branch": branch}
+
+        # Legacy backup branches carry no separate HEAD; restore them as-is
+        head = snapshot["head"] or snapshot["sha"]
         try:
-            res = self.run_git(repo_path, ["diff", "HEAD", file_path])
-            if res and res.returncode == 0:
-                return {"success": True, "diff": res.stdout}
-            else:
-                # Try untracked file
-                res = self.run_git(repo_path, ["diff", "/dev/null", file_path])
-                if res:
-                    return {"success": True, "diff": res.stdout}
-                return {"success": False, "message": "No diff available"}
-        except Exception as e:
-            return {"success": False, "message": str(e)}
+            safety_id = self.create_snapshot(repo_path, os.path.basename(repo_path), reason="pre-restore", force=True)
+        except SnapshotError as e:
+            return {"success": False, "message": f"Restore aborted, nothing was changed: {e}"}
+        if safety_id is None:
+            return {"success": False, "message": "Restore aborted, nothing was changed: no safety snapshot of the current state"}
+        steps = [
+            ["reset", "--hard", "--quiet", head],
+            ["read-tree", "-u", "--reset", snapshot["sha"]],
+            # Leave the restored files as working-tree changes on top of HEAD
+            ["reset", "--quiet", head],
+        ]
+        for args in steps:
+            res = self.run_git(repo_path, args)
+            if not res or res.returncode != 0:
+                return {"success": False, "message": f"Restore failed: {res.stderr if res else ''}", "snapshot": safety_id}
+        return {"success": True, "restored": snapshot_id, "snapshot": safety_id}
 
-    def create_snapshot(self, repo_path, repo_name):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        snapshot_branch = f"syncstack-backup-{timestamp}"
-        
-        # We create a new branch from current HEAD as a safety backup
-        res = self.run_git(repo_path, ["branch", snapshot_branch])
-        if res and res.returncode == 0:
-            return snapshot_branch
-        return None
+    URL_CREDENTIALS = re.compile(r"(\w+://)[^/@\s]+@")
 
-    def sync_repo(self, repo_path, repo_name, remote_url, token, strategy="pull"):
-        status = self.get_repo_status(repo_path)
-        
-        # 1. Handle non-existent repo (Clone)
+    def _auth_url(self, remote_url, repo_name, token):
+        if not token or self.URL_CREDENTIALS.match(remote_url):
+            return remote_url  # No token, or the URL already carries credentials
+        if "huggingface.co" in remote_url:
+            # HF usually needs user:token
+            user = repo_name.split('/')[0]
+            return remote_url.replace("https://", f"https://{user}:{token}@")
+        # GitHub works with just token
+        return remote_url.replace("https://", f"https://{token}@")
+
+    CLONE_STRATEGIES = ("full", "blobless", "treeless", "shallow", "sparse")
+
+    def _clone_args(self, clone):
+        """`git clone` flags for a clone-options dict (strategy, depth, sparse_paths)"""
+        strategy = clone.get("strategy", "full")
+        if strategy not in self.CLONE_STRATEGIES:
+            raise ValueError(f"Unknown clone strategy: {strategy}")
+        if clone.get("shared_objects") and strategy != "full":
+            # Alternates need complete history: partial and shallow clones would
+            # borrow objects the cache may not have, or lose shallow boundaries
+            raise ValueError(f"sharedObjects needs the full clone strategy, not {strategy}")
+        if strategy == "blobless":
+            return ["--filter=blob:none"]
+        if strategy == "treeless":
+            return ["--filter=tree:0"]
+        if strategy == "shallow":
+            return ["--depth", str(int(clone.get("depth") or 1))]
+        if strategy == "sparse":
+            # Sparse checkouts only ever need the blobs inside the cone
+            return ["--filter=blob:none", "--sparse"]
+        return []
+
+    def _object_cache(self, auth_url, repo_name, on_progress=None):
+        """Fetch a remote into the workspace's shared bare repo and return its path (None on failure).
+
+        Clones then borrow objects from it via --reference (alternates), so
+        forks and related repos store shared history once. Refs are namespaced
+        per repo and never pruned, and unreachable objects never expire, since
+        clones may still point at them.
+        """
+        cache_path = os.path.join(self.workspace_root, "object-cache.git")
+        with self._object_cache_lock:
+            if not os.path.exists(os.path.join(cache_path, "HEAD")):
+                res = self.run_git(self.workspace_root, ["init", "--bare", "--quiet", cache_path])
+                if not res or res.returncode != 0:
+                    return None
+                self.run_git(cache_path, ["config", "gc.pruneExpire", "never"])
+                self.run_git(cache_path, ["config", "gc.reflogExpireUnreachable", "never"])
+        # Fetches of different remotes run side by side; only the same remote is serialized
+        namespace = re.sub(r"[^A-Za-z0-9._-]", "_", repo_name)
+        cmd = ["git", "-C", cache_path, "fetch", "--progress", "--no-tags"]
+        if self.maintenance.git_version() >= (2, 29):
+            cmd.append("--no-write-fetch-head")  # Shared by every fetch into the cache
+        with self.repo_lock(os.path.join(cache_path, "refs", "cache", namespace)):
+            res = self.run_git_progress(cmd + [auth_url, f"+refs/heads/*:refs/cache/{namespace}/*"], on_progress)
+        return cache_path if res.returncode == 0 else None
+
+    def _sync_network(self, repo_path, repo_name, remote_url, token, status, on_progress=None, clone=None):
+        """Network half of a sync: clone without checkout, or fetch the branch. Returns a failure dict or None"""
         if not status["exists"]:
-            # Handle auth URL
-            if "huggingface.co" in remote_url:
-                # HF usually needs user:token
-                user = repo_name.split('/')[0]
-                auth_url = remote_url.replace("https://", f"https://{user}:{token}@")
-            else:
-                # GitHub works with just token
-                auth_url = remote_url.replace("https://", f"https://{token}@")
-                
+            clone = clone or {}
             os.makedirs(os.path.dirname(repo_path), exist_ok=True)
-            res = subprocess.run(["git", "clone", auth_url, repo_path], capture_output=True, text=True)
-            if res.returncode == 0:
-                return {"success": True, "operation": "clone", "message": "Repository cloned successfully"}
-            else:
+            auth_url = self._auth_url(remote_url, repo_name, token)
+            cmd = ["git", "clone", "--no-checkout", "--progress"] + self._clone_args(clone)
+            if clone.get("shared_objects"):
+                cache_path = self._object_cache(auth_url, repo_name, on_progress)
+                if cache_path:
+                    cmd += ["--reference", cache_path]
+            res = self.run_git_progress(cmd + [auth_url, repo_path], on_progress)
+            if res.returncode != 0:
                 return {"success": False, "message": f"Clone failed: {res.stderr}"}
+            return None
+
+        res = self.run_git_progress(["git", "-C", repo_path, "fetch", "--progress", "origin", status["branch"]], on_progress)
+        if res.returncode != 0:
+            return {"success": False, "message": f"Sync failed: {res.stderr}"}
+        return None
+
+    def _sync_disk(self, repo_path, repo_name, status, strategy, on_progress=None, clone=None):
+        """Disk half of a sync: check out a fresh clone, or snapshot and integrate the fetched branch"""
+        # 1. Fresh clone: populate the working tree (an empty remote has nothing to check out)
+        if not status["exists"]:
+            clone = clone or {}
+            if clone.get("strategy") == "sparse" and clone.get("sparse_paths"):
+                res = self.run_git(repo_path, ["sparse-checkout", "set"] + list(clone["sparse_paths"]))
+                if not res or res.returncode != 0:
+                    return {"success": False, "message": f"Sparse checkout failed: {res.stderr if res else ''}"}
+            head = self.run_git(repo_path, ["rev-parse", "--verify", "--quiet", "HEAD"])
+            if head and head.returncode == 0:
+                res = self.run_git_progress(["git", "-C", repo_path, "checkout", "--progress", "-f", "HEAD"], on_progress)
+                if res.returncode != 0:
+                    return {"success": False, "message": f"Clone failed: {res.stderr}"}
+            return {
+                "success": True,
+                "operation": "clone",
+                "message": "Repository cloned successfully",
+                "clone_strategy": clone.get("strategy", "full")
+            }
 
-        # 2. Safety Snapshot
-        snapshot_id = self.create_snapshot(repo_path, repo_name)
+        # 2. Safety Snapshot (no snapshot, no sync: the strategies below can discard work)
+        try:
+            snapshot_id = self.create_snapshot(repo_path, repo_name)
+        except SnapshotError as e:
+            return {"success": False, "message": f"Sync aborted before touching the working tree: {e}"}
 
-        # 3. Execute Sync Strategy
+        # 3. Execute Sync Strategy against the freshly fetched tracking branch
+        upstream = f"origin/{status['branch']}"
         try:
             if strategy == "reset":
                 # Hard reset to remote
-                self.run_git(repo_path, ["fetch", "origin"])
-                res = self.run_git(repo_path, ["reset", "--hard", f"origin/{status['branch']}"])
+                res = self.run_git(repo_path, ["reset", "--hard", upstream])
                 if res.returncode != 0: raise Exception(res.stderr)
             
             elif strategy == "rebase":
                 # Rebase local on top of remote
-                res = self.run_git(repo_path, ["pull", "--rebase", "origin", status["branch"]])
+                res = self.run_git(repo_path, ["rebase", upstream])
                 if res.returncode != 0: raise Exception(res.stderr)
             
             else: # default pull
                 # Standard merge pull
-                res = self.run_git(repo_path, ["pull", "origin", status["branch"]])
+                res = self.run_git(repo_path, ["merge", "--no-edit", upstream])
                 if res.returncode != 0: raise Exception(res.stderr)
 
             return {
@@ -300,91 +3058,364 @@ class GHEngine:
             }
 
         except Exception as e:
-            return {
+            failure = {
                 "success": False,
                 "message": f"Sync failed: {str(e)}",
-                "snapshot": snapshot_id,
-                "suggestion": "A backup branch was created. You can restore your work if needed."
+                "snapshot": snapshot_id
             }
+            if snapshot_id:
+                failure["suggestion"] = "A snapshot of your work was saved. Use restore_snapshot to get it back if needed."
+            return failure
+
+    def sync_repo(self, repo_path, repo_name, remote_url, token, strategy="pull", on_progress=None, clone=None):
+        """Clone (per the `clone` options) or pull a repo; see _clone_args for clone strategies"""
+        with self.repo_lock(repo_path):
+            status = self.get_repo_status(repo_path)
+            try:
+                failure = self._sync_network(repo_path, repo_name, remote_url, token, status, on_progress, clone)
+            except ValueError as e:
+                return {"success": False, "message": str(e)}
+            if failure:
+                return failure
+            return self._sync_disk(repo_path, repo_name, status, strategy, on_progress, clone)
+
+    def _mirror_targets(self, repo_path, remotes, token):
+        """Normalize mirror entries (remote name, URL, or {url, name, repo, token}) to dicts with a URL"""
+        if not remotes:
+            # Declared with `git config --add syncstack.mirror <remote name or URL>`
+            res = self.run_git(repo_path, ["config", "--get-all", "syncstack.mirror"])
+            remotes = res.stdout.split() if res and res.returncode == 0 else []
+        targets = []
+        for entry in remotes:
+            entry = dict(entry) if isinstance(entry, dict) else {"url": entry}
+            url = entry.get("url") or entry.get("name")
+            if url and "://" not in url and ":" not in url and not os.path.isabs(url):
+                # A configured remote's name
+                res = self.run_git(repo_path, ["remote", "get-url", url])
+                if not res or res.returncode != 0:
+                    targets.append({"remote": url, "error": f"No such remote: {url}"})
+                    continue
+                entry.setdefault("name", url)
+                url = res.stdout.strip()
+            # The owner/name _auth_url expects, e.g. user/model from huggingface.co/spaces/user/model
+            path = urlparse(url).path if "://" in url else ""
+            repo = entry.get("repo") or re.sub(r"^(spaces|datasets)/|\.git$", "", path.strip("/"))
+            token_for = entry.get("token", token)
+            targets.append({"remote": self._redact(entry.get("name") or url, token_for), "url": url, "repo": repo,
+                            "token": token_for})
+        return targets
+
+    @classmethod
+    def _redact(cls, text, token):
+        """Mask `token` and any user:password@ embedded in a URL"""
+        text = cls.URL_CREDENTIALS.sub(r"\1***@", text)
+        return text.replace(token, "***") if token else text
+
+    def _push_mirror(self, repo_path, target, local_refs, force=False, timeout=None):
+        """ls-remote the target, then push only the refs it doesn't already have at our SHAs"""
+        if target.get("error"):
+            return {"remote": target["remote"], "status": "failed", "message": target["error"]}
+        started = time.perf_counter()
+        auth_url = self._auth_url(target["url"], target["repo"], target["token"])
+        result = {"remote": target["remote"]}
+        # A missing or rejected token must fail the call, not wait on a credential prompt
+        env = {"GIT_TERMINAL_PROMPT": "0"}
+        with self._host_slot(_remote_host(target["url"])):
+            res = self.run_git(repo_path, ["ls-remote", auth_url] + list(local_refs), timeout=timeout, env=env)
+            remote_refs = {}
+            if res and res.returncode == 0:
+                for line in res.stdout.splitlines():
+                    sha, _, ref = line.partition("\t")
+                    remote_refs[ref] = sha
+            stale = [ref for ref, sha in local_refs.items() if remote_refs.get(ref) != sha]
+            if not stale:
+                result.update(status="up to date", refs=[])
+            else:
+                refspecs = [f"{'+' if force else ''}{local_refs[ref]}:{ref}" for ref in stale]
+                res = self.run_git(repo_path, ["push", "--porcelain", auth_url] + refspecs, timeout=timeout, env=env)
+                if res and res.returncode == 0:
+                    result.update(status="pushed", refs=stale)
+                else:
+                    message = (res.stderr or res.stdout).strip() if res else "git push did not run"
+                    result.update(status="failed", refs=stale, message=self._redact(message, target["token"])[-1000:])
+        result["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def mirror_repo(self, repo_path, remotes=None, token=None, refs=None, force=False, timeout=None, on_event=None):
+        """Push the same refs to several remotes at once (e.g. GitHub and huggingface.co).
+
+        `remotes` are remote names, URLs or {url, name, repo, token} dicts;
+        without them the repo's `syncstack.mirror` config entries are used.
+        Refs default to the current branch. Each target is checked with one
+        ls-remote first and skipped when it already has every ref at our SHA.
+        """
+        if remotes is not None and not isinstance(remotes, list):
+            remotes = [remotes]
+        if isinstance(refs, str):
+            refs = [refs]
+        if refs is None:
+            res = self.run_git(repo_path, ["symbolic-ref", "-q", "HEAD"])
+            if not res or res.returncode != 0:
+                return {"success": False, "message": "Detached HEAD: pass the refs to mirror"}
+            refs = [res.stdout.strip()]
+        refs = [ref if ref.startswith("refs/") else f"refs/heads/{ref}" for ref in refs]
+        res = self.run_git(repo_path, ["rev-parse"] + refs + ["--"])
+        shas = [line for line in res.stdout.split() if line != "--"] if res and res.returncode == 0 else []
+        if len(shas) != len(refs):
+            return {"success": False, "message": f"Unknown ref in {', '.join(refs)}"}
+        local_refs = dict(zip(refs, shas))
+
+        targets = self._mirror_targets(repo_path, remotes, token)
+        if not targets:
+            return {"success": False, "message": "No mirror remotes given or declared (git config syncstack.mirror)"}
+
+        def on_result(index, result):
+            if on_event:
+                on_event(dict(result, event="mirror"))
+
+        results = self._run_parallel(targets, lambda target: self._push_mirror(repo_path, target, local_refs, force, timeout),
+                                     on_result=on_result)
+        for target, result in zip(targets, results):
+            if "error" in result:  # Raised inside the worker
+                result.update(remote=target["remote"], status="failed", message=self._redact(result.pop("error"), target.get("token")))
+        counts = {status: sum(result["status"] == status for result in results) for status in ("pushed", "up to date", "failed")}
+        return {
+            "success": counts["failed"] == 0,
+            "refs": local_refs,
+            "remotes": results,
+            "pushed": counts["pushed"],
+            "skipped": counts["up to date"],
+            "failed": counts["failed"],
+        }
+
+    @staticmethod
+    def _clone_options(repo):
+        """Clone options from a batch entry's camelCase keys"""
+        return {
+            "strategy": repo.get('cloneStrategy', "full"),
+            "depth": repo.get('depth'),
+            "sparse_paths": repo.get('sparsePaths'),
+            "shared_objects": repo.get('sharedObjects', False),
+        }
+
+    def _estimate_repo_size(self, repo_path, repo):
+        """Rough size in KB used to schedule small repos first"""
+        if repo.get('size') is not None:
+            return repo['size']  # GitHub's repo `size` field is in KB
+        try:
+            with os.scandir(os.path.join(_git_dir(repo_path), "objects", "pack")) as entries:
+                return sum(entry.stat().st_size for entry in entries) // 1024
+        except OSError:
+            return float("inf")
 
     # API Wrappers (Moved from gh_api.py)
-    def validate_token(self, username, token):
+    def get_stats(self, reset=False, recent=50):
+        """Tracing histograms per git subcommand, API endpoint and RPC, plus recent and slow spans"""
+        stats = dict(self.tracer.snapshot(recent), success=True)
+        if reset:
+            self.tracer.reset()
+        return stats
+
+    def set_tracing(self, enabled=True, slow_ms=None):
+        self.tracer.configure(enabled, slow_ms)
+        return {"success": True, "enabled": self.tracer.enabled, "slow_ms": self.tracer.slow_ms}
+
+    # (fresh, stale) seconds per cached command: fresh answers skip the network,
+    # stale ones are returned at once while the daemon refreshes them
+    API_CACHE_TTLS = {
+        "validate": (600, 7 * 86400),
+        "get_repos": (300, 86400),
+        "get_workflows": (600, 86400),
+    }
+
+    def _cached(self, endpoint, token, args, compute, refresh=False, refresher=None, on_event=None):
+        """Answer through the response cache, tagging the result with where it came from"""
+        ttl, stale_ttl = self.API_CACHE_TTLS[endpoint]
+        on_refresh = None
+        if on_event:
+            on_refresh = lambda value: on_event({"event": "refreshed", "command": endpoint, "result": value})
+        value, meta = self.response_cache.get(endpoint, token, args, compute, ttl, stale_ttl, refresh,
+                                              refresher=refresher, on_refresh=on_refresh)
+        return dict(value, cache=meta)
+
+    def clear_api_cache(self, endpoint=None, token=None):
+        return {"success": True, "removed": self.response_cache.invalidate(endpoint, token)}
+
+    def validate_token(self, username, token, refresh=False, on_event=None):
+        return self._cached("validate", token, [username.lower()], lambda: self._validate_token(username, token),
+                            refresh, on_event=on_event)
+
+    def _validate_token(self, username, token):
         try:
-            response = requests.get(
-                'https://api.github.com/user',
-                headers={'Authorization': f'token {token}', 'Accept': 'application/vnd.github.v3+json'},
-                timeout=10
-            )
+            response = self.api.get('/user', token)
             if response.status_code == 200:
                 user_data = response.json()
                 if user_data['login'].lower() == username.lower():
                     return {"success": True, "user": user_data}
-            return {"success": False, "message": "Invalid token or username mismatch"}
+            return {"success": False, "message": "Invalid token or username mismatch", "status": response.status_code}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def get_user_repos(self, token):
+    def _page_event(self, on_event, kind):
+        if not on_event:
+            return None
+        return lambda items: on_event({"event": "page", "kind": kind, "items": items})
+
+    def get_user_repos(self, token, max_repos=None, on_event=None, refresh=False):
+        # Pages are only streamed for a live fetch; background refreshes report once, when done
+        return self._cached("get_repos", token, [max_repos], lambda: self._get_user_repos(token, max_repos, on_event),
+                            refresh, refresher=lambda: self._get_user_repos(token, max_repos), on_event=on_event)
+
+    def _get_user_repos(self, token, max_repos=None, on_event=None):
         try:
-            response = requests.get(
-                'https://api.github.com/user/repos?per_page=100&sort=updated',
-                headers={'Authorization': f'token {token}', 'Accept': 'application/vnd.github.v3+json'},
-                timeout=10
-            )
-            if response.status_code == 200:
-                return {"success": True, "repos": response.json()}
-            return {"success": False, "message": f"GitHub API Error {response.status_code}: {response.text}"}
+            repos = self.api.get_all('/user/repos', token, params={'sort': 'updated'}, max_items=max_repos,
+                                     on_page=self._page_event(on_event, "repos"))
+            return {"success": True, "repos": repos}
+        except ApiError as e:
+            return {"success": False, "message": f"GitHub API Error {e.status_code}: {e.text}", "status": e.status_code}
         except Exception as e:
             return {"success": False, "message": f"Connection Error: {str(e)}"}
 
-    def search_repos(self, token, query):
+    def search_repos(self, token, query, limit=100, on_event=None):
         try:
-            response = requests.get(
-                f'https://api.github.com/search/repositories?q={query}',
-                headers={'Authorization': f'token {token}', 'Accept': 'application/vnd.github.v3+json'},
-                timeout=10
-            )
-            if response.status_code == 200:
-                return {"success": True, "repos": response.json().get('items', [])}
-            return {"success": False, "message": f"Search Error {response.status_code}"}
+            repos = self.api.get_all('/search/repositories', token, params={'q': query}, item_key='items',
+                                     max_items=limit, on_page=self._page_event(on_event, "repos"))
+            return {"success": True, "repos": repos}
+        except ApiError as e:
+            return {"success": False, "message": f"Search Error {e.status_code}"}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def get_workflows(self, token, repo_full_name):
+    def get_workflows(self, token, repo_full_name, refresh=False, on_event=None):
+        return self._cached("get_workflows", token, [repo_full_name], lambda: self._get_workflows(token, repo_full_name),
+                            refresh, on_event=on_event)
+
+    def _get_workflows(self, token, repo_full_name):
         try:
-            response = requests.get(
-                f'https://api.github.com/repos/{repo_full_name}/actions/workflows',
-                headers={'Authorization': f'token {token}', 'Accept': 'application/vnd.github.v3+json'},
-                timeout=10
-            )
+            response = self.api.get(f'/repos/{repo_full_name}/actions/workflows', token)
             if response.status_code == 200:
                 return {"success": True, "workflows": response.json().get('workflows', [])}
-            return {"success": False, "message": f"Actions Error {response.status_code}"}
+            return {"success": False, "message": f"Actions Error {response.status_code}", "status": response.status_code}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def get_workflow_runs(self, token, repo_full_name):
+    def get_workflow_runs(self, token, repo_full_name, limit=10, on_event=None):
         try:
-            response = requests.get(
-                f'https://api.github.com/repos/{repo_full_name}/actions/runs?per_page=10',
-                headers={'Authorization': f'token {token}', 'Accept': 'application/vnd.github.v3+json'},
-                timeout=10
-            )
-            if response.status_code == 200:
-                return {"success": True, "runs": response.json().get('workflow_runs', [])}
-            return {"success": False, "message": f"Actions Error {response.status_code}"}
+            runs = self.api.get_all(f'/repos/{repo_full_name}/actions/runs', token, item_key='workflow_runs',
+                                    max_items=limit, on_page=self._page_event(on_event, "runs"))
+            return {"success": True, "runs": runs}
+        except ApiError as e:
+            return {"success": False, "message": f"Actions Error {e.status_code}"}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    REPO_OVERVIEW_FRAGMENT = """
+fragment RepoOverview on Repository {
+  nameWithOwner
+  pushedAt
+  isArchived
+  defaultBranchRef {
+    name
+    target {
+      ... on Commit {
+        oid
+        committedDate
+        statusCheckRollup { state }
+        checkSuites(last: 1) {
+          nodes { status conclusion workflowRun { databaseId url workflow { name } } }
+        }
+      }
+    }
+  }
+  pullRequests(states: OPEN) { totalCount }
+}"""
+
+    def _overview_query(self, chunk):
+        """One aliased `repository` field per repo, plus the rateLimit cost"""
+        declarations, fields, variables = [], [], {}
+        for index, full_name in enumerate(chunk):
+            owner, _, name = full_name.partition('/')
+            declarations.append(f"$o{index}: String!, $n{index}: String!")
+            fields.append(f"  r{index}: repository(owner: $o{index}, name: $n{index}) {{ ...RepoOverview }}")
+            variables[f"o{index}"], variables[f"n{index}"] = owner, name
+        query = "query(" + ", ".join(declarations) + ") {\n  rateLimit { cost remaining resetAt }\n"
+        query += "\n".join(fields) + "\n}\n" + self.REPO_OVERVIEW_FRAGMENT
+        return query, variables
+
+    def _overview_entry(self, full_name, node, error=None):
+        if node is None:
+            return {"repo": full_name, "error": error or "Repository not found"}
+        branch = node.get('defaultBranchRef') or {}
+        commit = branch.get('target') or {}
+        rollup = commit.get('statusCheckRollup') or {}
+        suites = (commit.get('checkSuites') or {}).get('nodes') or []
+        suite = suites[-1] if suites else {}
+        run = suite.get('workflowRun') or {}
+        return {
+            "repo": node.get('nameWithOwner', full_name),
+            "default_branch": branch.get('name'),
+            "head_sha": commit.get('oid'),
+            "last_push": node.get('pushedAt'),
+            "archived": node.get('isArchived', False),
+            "open_prs": (node.get('pullRequests') or {}).get('totalCount', 0),
+            "ci_status": rollup.get('state', '').lower() or None,
+            "latest_check": {
+                "status": suite.get('status'),
+                "conclusion": suite.get('conclusion'),
+                "workflow": (run.get('workflow') or {}).get('name'),
+                "run_id": run.get('databaseId'),
+                "url": run.get('url'),
+            } if suite else None,
+        }
+
+    def get_repos_overview(self, token, repo_full_names, chunk_size=100):
+        """Default branch, last push, CI state and open PR count for many repos via batched GraphQL"""
+        try:
+            results = {}
+            cost = {"total": 0, "queries": 0, "remaining": None, "reset_at": None}
+            pending = [repo_full_names[i:i + chunk_size] for i in range(0, len(repo_full_names), chunk_size)]
+            while pending:
+                chunk = pending.pop(0)
+                query, variables = self._overview_query(chunk)
+                try:
+                    body = self.api.graphql(query, variables, token)
+                except (ApiError, requests.Timeout) as e:
+                    # Big queries can time out server-side; retry as two halves
+                    if len(chunk) > 1 and (isinstance(e, requests.Timeout) or e.status_code in (502, 504)):
+                        middle = len(chunk) // 2
+                        pending[:0] = [chunk[:middle], chunk[middle:]]
+                        continue
+                    raise
+
+                data = body.get('data') or {}
+                errors = {}
+                for error in body.get('errors') or []:
+                    if error.get('path'):
+                        errors[error['path'][0]] = error.get('message')
+                if not data and body.get('errors'):
+                    return {"success": False, "message": body['errors'][0].get('message', 'GraphQL error')}
+
+                rate = data.get('rateLimit') or {}
+                cost["total"] += rate.get('cost', 0)
+                cost["queries"] += 1
+                cost["remaining"] = rate.get('remaining', cost["remaining"])
+                cost["reset_at"] = rate.get('resetAt', cost["reset_at"])
+                for index, full_name in enumerate(chunk):
+                    alias = f"r{index}"
+                    results[full_name] = self._overview_entry(full_name, data.get(alias), errors.get(alias))
+
+            return {"success": True, "repos": [results[name] for name in repo_full_names], "cost": cost}
+        except ApiError as e:
+            return {"success": False, "message": f"GraphQL Error {e.status_code}: {e.text}"}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
     def trigger_workflow(self, token, repo_full_name, workflow_id, ref='main'):
         try:
-            response = requests.post(
-                f'https://api.github.com/repos/{repo_full_name}/actions/workflows/{workflow_id}/dispatches',
-                headers={
-                    'Authorization': f'token {token}',
-                    'Accept': 'application/vnd.github.v3+json'
-                },
-                json={'ref': ref},
-                timeout=10
+            response = self.api.post(
+                f'/repos/{repo_full_name}/actions/workflows/{workflow_id}/dispatches',
+                token,
+                json_body={'ref': ref}
             )
             if response.status_code == 204:
                 return {"success": True, "message": "Workflow triggered"}
@@ -392,53 +3423,318 @@ class GHEngine:
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def get_run_jobs(self, token, repo_full_name, run_id):
+    def poll_runs(self, token, repo_full_name, state=None):
+        """One incremental Actions poll; pass the returned state back in next time"""
+        state = state or self.run_watcher.new_state()
         try:
-            response = requests.get(
-                f'https://api.github.com/repos/{repo_full_name}/actions/runs/{run_id}/jobs',
-                headers={'Authorization': f'token {token}', 'Accept': 'application/vnd.github.v3+json'},
-                timeout=10
-            )
-            if response.status_code == 200:
-                return {"success": True, "jobs": response.json().get('jobs', [])}
-            return {"success": False, "message": f"Jobs Error {response.status_code}"}
+            events = self.run_watcher.poll(token, repo_full_name, state)
+        except ApiError as e:
+            return {"success": False, "message": f"Actions Error {e.status_code}"}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+        return {"success": True, "runs": self.run_watcher.runs_of(state), "events": events,
+                "state": state, "next_poll_in": state["interval"]}
+
+    def watch_runs(self, token, repos, on_event):
+        """Push run_changed/job_changed events for these repos until unwatch_runs"""
+        if not self.run_watcher.running:
+            return {"success": False, "message": "Run watching needs the serve daemon"}
+        repos = repos if isinstance(repos, list) else [repos]
+        return {"success": True, "watch": self.run_watcher.watch(token, repos, on_event)}
+
+    def unwatch_runs(self, watch):
+        return {"success": self.run_watcher.unwatch(watch)}
+
+    def get_run_jobs(self, token, repo_full_name, run_id, limit=None, on_event=None):
+        try:
+            jobs = self.api.get_all(f'/repos/{repo_full_name}/actions/runs/{run_id}/jobs', token, item_key='jobs',
+                                    max_items=limit, on_page=self._page_event(on_event, "jobs"))
+            return {"success": True, "jobs": jobs}
+        except ApiError as e:
+            return {"success": False, "message": f"Jobs Error {e.status_code}"}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    LOG_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+    def _log_cache_dir(self, repo_full_name):
+        return os.path.join(self.workspace_root, "logs", re.sub(r"[^\w.-]+", "_", repo_full_name))
+
+    def _prune_log_cache(self, keep=None):
+        """Drop the least recently read logs until the cache fits LOG_CACHE_MAX_BYTES"""
+        files = []
+        for dirpath, _, filenames in os.walk(os.path.join(self.workspace_root, "logs")):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.LOG_CACHE_MAX_BYTES:
+                break
+            if path == keep or path.endswith(".part"):
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def _read_log(self, path, tail, before, search, max_matches):
+        os.utime(path)  # Marks it recently used for _prune_log_cache
+        result = {"size": os.path.getsize(path)}
+        if search:
+            result.update(search_lines(path, search, max_matches))
+        else:
+            result.update(tail_lines(path, tail, before))
+        return result
+
+    @staticmethod
+    def _log_name(name):
+        # Archive entries drop the characters file names can't hold
+        return re.sub(r'[\\/:*?"<>|]', "", name or "").strip()
+
+    def get_run_logs(self, token, repo_full_name, run_id, job=None, step=None, tail=200, before=None, search=None,
+                     max_matches=200, refresh=False):
+        """A run's logs, downloaded once as the zip archive into the workspace log cache.
+
+        Without `job` this lists the archive's jobs and steps. With `job` (and
+        optionally a `step` number) only that member is extracted, and the
+        result holds its last `tail` lines before byte offset `before`, or the
+        lines containing `search`.
+        """
+        archive_path = os.path.join(self._log_cache_dir(repo_full_name), f"run-{run_id}.zip")
+        try:
+            # Finished runs' logs never change, so the archive is fetched once
+            cached = os.path.exists(archive_path) and not refresh
+            if not cached:
+                self.api.download(f"/repos/{repo_full_name}/actions/runs/{run_id}/logs", archive_path, token)
+                self._prune_log_cache(keep=archive_path)
+
+            with zipfile.ZipFile(archive_path) as archive:
+                jobs = _log_entries(archive)
+                result = {"success": True, "run_id": int(run_id), "cached": cached}
+                if job is None:
+                    result["jobs"] = [{
+                        "name": entry["name"],
+                        "size": entry["size"],
+                        "has_log": entry["log"] is not None,
+                        "steps": [{key: s[key] for key in ("number", "name", "size")} for s in entry["steps"]]
+                    } for entry in jobs]
+                    return result
+
+                entry = next((e for e in jobs if e["name"] == job or e["name"] == self._log_name(job)), None)
+                if entry is None:
+                    return {"success": False, "message": f"No logs for job: {job}"}
+                if step is None:
+                    member = entry["log"]
+                else:
+                    member = next((s["member"] for s in entry["steps"] if s["number"] == step), None)
+                if member is None:
+                    return {"success": False, "message": f"No logs for step {step} of {job}"}
+
+                # Extract just this member, once per download
+                extracted = os.path.join(os.path.dirname(archive_path), f"run-{run_id}", re.sub(r"[^\w.-]+", "_", member))
+                if not cached or not os.path.exists(extracted):
+                    os.makedirs(os.path.dirname(extracted), exist_ok=True)
+                    tmp_path = f"{extracted}.{os.getpid()}.{threading.get_ident()}.part"
+                    with archive.open(member) as src, open(tmp_path, "wb") as dst:
+                        shutil.copyfileobj(src, dst, 1 << 20)
+                    os.replace(tmp_path, extracted)
+
+            result.update(job=entry["name"], step=step)
+            result.update(self._read_log(extracted, tail, before, search, max_matches))
+            return result
+        except ApiError as e:
+            return {"success": False, "message": f"Logs Error {e.status_code}"}
+        except zipfile.BadZipFile:
+            os.remove(archive_path)
+            return {"success": False, "message": "Downloaded log archive was corrupt; try again"}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
+    def get_job_log(self, token, repo_full_name, job_id, tail=200, before=None, search=None, max_matches=200, refresh=False):
+        """One job's plain-text log through the same cache (re-downloaded while the job is running)"""
+        path = os.path.join(self._log_cache_dir(repo_full_name), f"job-{job_id}.log")
+        try:
+            cached = os.path.exists(path) and not refresh
+            complete = True
+            if not cached:
+                response = self.api.get(f"/repos/{repo_full_name}/actions/jobs/{job_id}", token)
+                if response.status_code != 200:
+                    raise ApiError(response)
+                complete = response.json().get("status") == "completed"
+                if not complete:
+                    path += ".running"
+                self.api.download(f"/repos/{repo_full_name}/actions/jobs/{job_id}/logs", path, token)
+                self._prune_log_cache(keep=path)
+            result = {"success": True, "job_id": int(job_id), "cached": cached, "complete": complete}
+            result.update(self._read_log(path, tail, before, search, max_matches))
+            return result
+        except ApiError as e:
+            return {"success": False, "message": f"Logs Error {e.status_code}"}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    # File contents per scaffold template
+    SCAFFOLD_TEMPLATES = {
+        "Pure HTML": {
+            "index.html": "<!DOCTYPE html>\n<html lang='en'>\n<head>\n    <meta charset='UTF-8'>\n    <title>HTML Project</title>\n</head>\n<body>\n    <h1>New HTML Project</h1>\n</body>\n</html>",
+        },
+        "Pure CSS": {
+            "index.html": "<!DOCTYPE html>\n<html>\n<head>\n    <link rel='stylesheet' href='style.css'>\n</head>\n<body>\n    <h1>CSS Focused Project</h1>\n</body>\n</html>",
+            "style.css": "body { \n    background: #0d1117; \n    color: #58a6ff; \n    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Helvetica, Arial, sans-serif; \n    display: flex; \n    justify-content: center; \n    align-items: center; \n    height: 100vh; \n    margin: 0; \n}",
+        },
+        "Pure JS": {
+            "index.html": "<!DOCTYPE html>\n<html>\n<body>\n    <h1>JS Logic Project</h1>\n    <p>Check the console.</p>\n    <script src='app.js'></script>\n</body>\n</html>",
+            "app.js": "console.log('Quantum JS Initialized');\n// Logic here",
+        },
+        "Quantum Combined (Recommended)": {
+            "index.html": "<!DOCTYPE html>\n<html>\n<head>\n    <link rel='stylesheet' href='style.css'>\n</head>\n<body>\n    <div id='app'>\n        <h1>Quantum Workspace</h1>\n        <p>HTML+CSS+JS Stack ready.</p>\n    </div>\n    <script src='app.js'></script>\n</body>\n</html>",
+            "style.css": "body { background: #000; color: #00ff41; font-family: monospace; padding: 20px; }",
+            "app.js": "console.log('Quantum Combined Stack Active');",
+        },
+    }
+
+    @staticmethod
+    def _blob_sha(data):
+        """What `git hash-object` gives unfiltered content in a SHA-1 repo"""
+        return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+    def _plumbing(self, repo_path, args, env=None, input=None):
+        res = self.run_git(repo_path, args, env=env, input=input)
+        if not res or res.returncode != 0:
+            raise Exception(f"git {args[0]} failed: {res.stderr.strip() if res else 'did not run'}")
+        return res.stdout.strip()
+
+    def _edit_tree(self, repo_path, base, edits, root=False):
+        """Write `base` with edits ({path: (mode, type, sha) or None}) applied; returns the new tree's SHA.
+
+        Only directories on an edited path are read (ls-tree) and rewritten
+        (mktree), so the cost follows path depth, not repo size. Directories
+        left empty are dropped, except the root.
+        """
+        entries = {}
+        if base:
+            for record in self._plumbing(repo_path, ["ls-tree", "-z", base]).split("\0"):
+                if record:
+                    info, name = record.split("\t", 1)
+                    entries[name] = tuple(info.split())
+        nested = {}
+        for path, entry in edits.items():
+            name, sep, rest = path.partition("/")
+            if sep:
+                nested.setdefault(name, {})[rest] = entry
+            elif entry is None:
+                entries.pop(name, None)
+            else:
+                entries[name] = entry
+        for name, sub_edits in nested.items():
+            current = entries.get(name)
+            sha = self._edit_tree(repo_path, current[2] if current and current[1] == "tree" else None, sub_edits)
+            if sha:
+                entries[name] = ("040000", "tree", sha)
+            else:
+                entries.pop(name, None)
+        if not entries and not root:
+            return None
+        listing = "".join(f"{mode} {kind} {sha}\t{name}\0" for name, (mode, kind, sha) in entries.items())
+        return self._plumbing(repo_path, ["mktree", "-z"], input=listing)
+
+    def commit_files(self, repo_path, files, message):
+        """Write and commit just `files` ({path: text, or None to delete}) on HEAD, without `git add .`.
+
+        Only the given paths are hashed (one `hash-object --stdin-paths`),
+        and only the trees on their paths are rewritten (see _edit_tree);
+        then commit-tree and a compare-and-swap update-ref. Nothing else in the working tree is statted or committed.
+        Files whose content matches HEAD aren't rewritten, and when nothing
+        changed no commit is made. Commit hooks don't run on this path.
+        """
+        files = {path.replace(os.sep, "/").strip("/"): content for path, content in files.items()}
+        for path in files:
+            if not path or any(part in ("", ".", "..", ".git") for part in path.split("/")) or "\n" in path:
+                return {"success": False, "message": f"Invalid path: {path!r}"}
+
+        with self.repo_lock(repo_path):
+            res = self.run_git(repo_path, ["rev-parse", "-q", "--verify", "HEAD^{commit}"])
+            parent = res.stdout.strip() if res and res.returncode == 0 else None
+            current = {}
+            if parent:
+                listing = self._plumbing(repo_path, ["ls-tree", "-r", "-z", "--full-tree", parent, "--"] + list(files))
+                for record in listing.split("\0"):
+                    if record:
+                        info, path = record.split("\t", 1)
+                        mode, _, sha = info.split()
+                        current[path] = (mode, sha)
+
+            changed, removed = [], []
+            for path, content in files.items():
+                full_path = os.path.join(repo_path, *path.split("/"))
+                if content is None:
+                    if os.path.lexists(full_path):
+                        os.remove(full_path)
+                    if path in current:
+                        removed.append(path)
+                    continue
+                data = content.encode() if isinstance(content, str) else content
+                try:
+                    with open(full_path, "rb") as f:
+                        on_disk = f.read() == data
+                except OSError:
+                    on_disk = False
+                if not on_disk:
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    with open(full_path, "wb") as f:
+                        f.write(data)
+                if path not in current or current[path][1] != self._blob_sha(data):
+                    changed.append(path)
+
+            if not changed and not removed:
+                return {"success": True, "committed": False, "commit": parent, "changed": [],
+                        "message": "Nothing to commit"}
+
+            # --stdin-paths applies the same clean filters (eol, attributes) `git add` would
+            shas = []
+            if changed:
+                shas = self._plumbing(repo_path, ["hash-object", "-w", "--stdin-paths"], input="\n".join(changed) + "\n").split()
+            edits = {path: (current.get(path, ("100644",))[0], "blob", sha) for path, sha in zip(changed, shas)}
+            edits.update((path, None) for path in removed)
+            tree = self._edit_tree(repo_path, f"{parent}^{{tree}}" if parent else None, edits, root=True)
+
+            if parent and tree == self._plumbing(repo_path, ["rev-parse", f"{parent}^{{tree}}"]):
+                # Only filters (e.g. eol conversion) told the contents apart
+                return {"success": True, "committed": False, "commit": parent, "changed": [],
+                        "message": "Nothing to commit"}
+            commit = self._plumbing(repo_path, ["commit-tree", tree] + (["-p", parent] if parent else []) + ["-F", "-"],
+                                    input=message if message.endswith("\n") else message + "\n")
+            subject = message.strip().splitlines()[0] if message.strip() else ""
+            # The old value makes this a compare-and-swap: a commit that landed meanwhile fails it
+            self._plumbing(repo_path, ["update-ref", "-m", f"commit: {subject}", "HEAD", commit, parent or ""])
+            # Bring the real index in line for just these paths, so status shows them clean
+            self._plumbing(repo_path, ["update-index", "--add", "--remove", "--"] + changed + removed)
+
+        return {"success": True, "committed": True, "commit": commit, "changed": changed + removed,
+                "message": "Changes committed successfully"}
+
     def scaffold_repo(self, repo_path, template_name):
         """Generate boilerplate files for various templates"""
         try:
             os.makedirs(repo_path, exist_ok=True)
-            
-            if template_name == "Pure HTML":
-                with open(os.path.join(repo_path, "index.html"), "w") as f:
-                    f.write("<!DOCTYPE html>\n<html lang='en'>\n<head>\n    <meta charset='UTF-8'>\n    <title>HTML Project</title>\n</head>\n<body>\n    <h1>New HTML Project</h1>\n</body>\n</html>")
-            
-            elif template_name == "Pure CSS":
-                with open(os.path.join(repo_path, "index.html"), "w") as f:
-                    f.write("<!DOCTYPE html>\n<html>\n<head>\n    <link rel='stylesheet' href='style.css'>\n</head>\n<body>\n    <h1>CSS Focused Project</h1>\n</body>\n</html>")
-                with open(os.path.join(repo_path, "style.css"), "w") as f:
-                    f.write("body { \n    background: #0d1117; \n    color: #58a6ff; \n    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Helvetica, Arial, sans-serif; \n    display: flex; \n    justify-content: center; \n    align-items: center; \n    height: 100vh; \n    margin: 0; \n}")
-            
-            elif template_name == "Pure JS":
-                with open(os.path.join(repo_path, "index.html"), "w") as f:
-                    f.write("<!DOCTYPE html>\n<html>\n<body>\n    <h1>JS Logic Project</h1>\n    <p>Check the console.</p>\n    <script src='app.js'></script>\n</body>\n</html>")
-                with open(os.path.join(repo_path, "app.js"), "w") as f:
-                    f.write("console.log('Quantum JS Initialized');\n// Logic here")
-            
-            elif template_name == "Quantum Combined (Recommended)":
-                with open(os.path.join(repo_path, "index.html"), "w") as f:
-                    f.write("<!DOCTYPE html>\n<html>\n<head>\n    <link rel='stylesheet' href='style.css'>\n</head>\n<body>\n    <div id='app'>\n        <h1>Quantum Workspace</h1>\n        <p>HTML+CSS+JS Stack ready.</p>\n    </div>\n    <script src='app.js'></script>\n</body>\n</html>")
-                with open(os.path.join(repo_path, "style.css"), "w") as f:
-                    f.write("body { background: #000; color: #00ff41; font-family: monospace; padding: 20px; }")
-                with open(os.path.join(repo_path, "app.js"), "w") as f:
-                    f.write("console.log('Quantum Combined Stack Active');")
+            files = self.SCAFFOLD_TEMPLATES.get(template_name, {})
 
             # Finalize git
             if os.path.exists(os.path.join(repo_path, ".git")):
-                self.run_git(repo_path, ["add", "."])
-                self.run_git(repo_path, ["commit", "-m", f"Initialize with {template_name} template"])
-            
+                result = self.commit_files(repo_path, files, f"Initialize with {template_name} template")
+                if not result["success"]:
+                    return result
+            else:
+                for name, content in files.items():
+                    with open(os.path.join(repo_path, name), "w") as f:
+                        f.write(content)
+
             return {"success": True, "message": f"Scaffolded {template_name} successfully"}
         except Exception as e:
             return {"success": False, "message": str(e)}
@@ -462,152 +3758,591 @@ class GHEngine:
         try:
             if not os.path.exists(os.path.join(repo_path, ".git")):
                 return {"success": False, "message": "Target path is not a git repository"}
-            
-            with open(os.path.join(repo_path, "index.html"), "w") as f: f.write(html)
-            with open(os.path.join(repo_path, "style.css"), "w") as f: f.write(css)
-            with open(os.path.join(repo_path, "app.js"), "w") as f: f.write(js)
-            
-            self.run_git(repo_path, ["add", "."])
-            self.run_git(repo_path, ["commit", "-m", commit_msg])
-            
-            return {"success": True, "message": "Changes committed successfully"}
+
+            return self.commit_files(repo_path, {"index.html": html, "style.css": css, "app.js": js}, commit_msg)
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def scan_local_repos(self, search_path, depth=3):
-        """Recursively scan for git repositories"""
+    def scan_local_repos(self, search_path, depth=3, timeout=None, on_event=None, cancel_event=None, fetch=False,
+                         ignore=None, rescan=False):
+        """Recursively scan for git repositories.
+
+        search_path is one root or a list of roots, each a path or a
+        {"path", "depth", "ignore"} dict overriding the call's defaults.
+        Discovery is incremental via RepoIndex; rescan=True rebuilds it.
+        """
+        roots = search_path if isinstance(search_path, list) else [search_path]
+        repo_paths = []
+        index_stats = {"dirs_listed": 0, "dirs_reused": 0}
+        for root in roots:
+            if not isinstance(root, dict):
+                root = {"path": root}
+            root_path = os.path.abspath(os.path.expanduser(root["path"]))
+            found, stats = self.repo_index.scan(
+                root_path,
+                depth=int(root.get("depth", depth)),
+                ignore=root.get("ignore", ignore),
+                rescan=rescan
+            )
+            repo_paths.extend(path for path in found if path not in repo_paths)
+            for key in index_stats:
+                index_stats[key] += stats[key]
+
+        def on_result(index, status):
+            if on_event and status.get('exists'):
+                on_event({"event": "repo", "index": index, "path": repo_paths[index], "status": status})
+
+        statuses = self._run_parallel(
+            repo_paths,
+            lambda path: self.get_cached_status(path, timeout=timeout, fetch=fetch),
+            on_result=on_result,
+            cancel_event=cancel_event
+        )
+
         repos = []
-        search_path = os.path.expanduser(search_path)
-        
-        for root, dirs, files in os.walk(search_path):
-            # Control depth
-            if root.count(os.sep) - search_path.count(os.sep) >= depth:
-                del dirs[:]
-                continue
-                
-            if ".git" in dirs:
-                repo_path = root
-                res = self.get_repo_status(repo_path)
-                if res.get('exists'):
-                    repos.append({
-                        "name": os.path.basename(repo_path),
-                        "path": repo_path,
-                        "status": res
-                    })
-                # Don't recurse into subdirectories of a repo
-                dirs.remove(".git")
+        for repo_path, res in zip(repo_paths, statuses):
+            if res.get('exists'):
+                repos.append({
+                    "name": os.path.basename(repo_path),
+                    "path": repo_path,
+                    "status": res
+                })
         
-        return {"success": True, "repos": repos}
+        return {
+            "success": True,
+            "repos": repos,
+            "index": index_stats,
+            "cancelled": bool(cancel_event and cancel_event.is_set())
+        }
 
-    def batch_sync(self, token, repos_list, strategy="pull"):
-        results = []
+    def _local_tip(self, repo_path, strategy):
+        """(branch, origin/<branch> SHA) when a sync could only be a no-op given that tracking ref, else None"""
+        res = self.run_git(repo_path, ["symbolic-ref", "-q", "--short", "HEAD"])
+        if not res or res.returncode != 0:
+            return None  # Detached or unborn: leave it to the full sync
+        branch = res.stdout.strip()
+        upstream = f"refs/remotes/origin/{branch}"
+        tip = self.git_backend.resolve(repo_path, [upstream])
+        counts = self.git_backend.ahead_behind(repo_path, "HEAD", upstream) if tip else None
+        if not counts or counts[1] or (strategy == "reset" and counts[0]):
+            return None  # Already-fetched commits still need merging (or resetting to)
+        return branch, tip[0]
+
+    def _remote_tips_graphql(self, token, wanted, chunk_size=100):
+        """{full_name: oid} for refs/heads/<branch> of GitHub repos, in one query per chunk.
+
+        Repos GraphQL can't answer (missing, no access, errors) are left out.
+        """
+        tips = {}
+        items = list(wanted.items())
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            declarations, fields, variables = [], [], {}
+            for index, (full_name, branch) in enumerate(chunk):
+                owner, _, name = full_name.partition('/')
+                declarations.append(f"$o{index}: String!, $n{index}: String!, $b{index}: String!")
+                fields.append(f"  r{index}: repository(owner: $o{index}, name: $n{index}) "
+                              f"{{ ref(qualifiedName: $b{index}) {{ target {{ oid }} }} }}")
+                variables[f"o{index}"], variables[f"n{index}"] = owner, name
+                variables[f"b{index}"] = f"refs/heads/{branch}"
+            query = "query(" + ", ".join(declarations) + ") {\n" + "\n".join(fields) + "\n}"
+            try:
+                data = self.api.graphql(query, variables, token).get('data') or {}
+            except Exception:
+                continue  # ls-remote picks these up
+            for index, (full_name, _) in enumerate(chunk):
+                target = ((data.get(f"r{index}") or {}).get('ref') or {}).get('target') or {}
+                if target.get('oid'):
+                    tips[full_name] = target['oid']
+        return tips
+
+    def _remote_tip_ls_remote(self, job, branch, token):
+        auth_url = self._auth_url(job["url"], job["name"], token)
+        with self._host_slot(_remote_host(job["url"])):
+            res = self.run_git(job["path"], ["ls-remote", auth_url, f"refs/heads/{branch}"], timeout=60,
+                               env={"GIT_TERMINAL_PROMPT": "0"})
+        if not res or res.returncode != 0:
+            return None
+        sha, _, ref = res.stdout.partition("\n")[0].partition("\t")
+        return sha if ref == f"refs/heads/{branch}" else None
+
+    def _preflight(self, token, jobs, strategy):
+        """Indices of jobs whose remote branch tip is already what the clone has.
+
+        The tracking refs are read locally; remote tips come from one batched
+        GraphQL query for github.com repos (with a token) and from parallel
+        `ls-remote` calls for the rest and for anything GraphQL missed.
+        Anything uncertain is left for the full sync.
+        """
+        started = time.perf_counter()
+        candidates = [index for index, job in enumerate(jobs) if os.path.isdir(os.path.join(job["path"], ".git"))]
+        local = dict(zip(candidates, self._run_parallel(candidates, lambda index: self._local_tip(jobs[index]["path"], strategy))))
+        local = {index: tip for index, tip in local.items() if isinstance(tip, tuple)}
+
+        remote = {}
+        github = {jobs[index]["name"]: branch for index, (branch, _) in local.items()
+                  if token and _remote_host(jobs[index]["url"]) == "github.com"}
+        if github:
+            by_name = self._remote_tips_graphql(token, github)
+            remote.update((index, by_name[jobs[index]["name"]]) for index in local if jobs[index]["name"] in by_name)
+        rest = [index for index in local if index not in remote]
+        via_graphql = len(remote)
+        for index, sha in zip(rest, self._run_parallel(rest, lambda index: self._remote_tip_ls_remote(jobs[index], local[index][0], token))):
+            if isinstance(sha, str):
+                remote[index] = sha
+
+        up_to_date = {index for index, sha in remote.items() if sha == local[index][1]}
+        stats = {"checked": len(local), "graphql": via_graphql, "ls_remote": len(rest), "up_to_date": len(up_to_date),
+                 "ms": round((time.perf_counter() - started) * 1000, 1)}
+        return up_to_date, stats
+
+    def batch_sync(self, token, repos_list, strategy="pull", on_event=None, cancel_event=None, max_network=4, max_disk=2,
+                   preflight=True):
+        """Sync many repos in parallel, smallest first.
+
+        Network work (clone/fetch) and disk work (checkout/merge) have separate
+        limits, so one repo's checkout overlaps other repos' downloads. Emits
+        queued/started/progress/done/failed events per repo. With preflight,
+        clones whose remote hasn't moved (see _preflight) are reported as
+        skipped without a fetch, snapshot or merge.
+        """
+        emit = on_event or (lambda event: None)
+        jobs = []
         for repo in repos_list:
-            # repo is dict with fullName, cloneUrl
-            name = repo['fullName']
-            url = repo['cloneUrl']
-            path = os.path.join(self.workspace_root, name)
-            res = self.sync_repo(path, name, url, token, strategy)
-            results.append({"repo": name, "result": res})
-        return {"success": True, "results": results}
+            # repo is dict with fullName, cloneUrl (and optionally GitHub's size in KB)
+            path = os.path.join(self.workspace_root, repo['fullName'])
+            jobs.append({"name": repo['fullName'], "url": repo['cloneUrl'], "path": path,
+                         "size": self._estimate_repo_size(path, repo), "clone": self._clone_options(repo)})
+        network_slots = threading.BoundedSemaphore(max_network)
+        disk_slots = threading.BoundedSemaphore(max_disk)
+
+        def progress_reporter(name):
+            last = {"percent": -1}
+
+            def report(phase, percent):
+                start, end = PROGRESS_PHASES.get(phase, (0, 100))
+                overall = start + (end - start) * percent // 100
+                if overall != last["percent"]:
+                    last["percent"] = overall
+                    emit({"event": "progress", "repo": name, "phase": phase, "phase_percent": percent, "percent": overall})
+            return report
+
+        def run(job):
+            name = job["name"]
+            if cancel_event is not None and cancel_event.is_set():
+                result = {"success": False, "message": "Cancelled"}
+                emit({"event": "failed", "repo": name, "message": result["message"]})
+                return result
+            emit({"event": "started", "repo": name})
+            report = progress_reporter(name)
+            with self.repo_lock(job["path"]):
+                status = self.get_repo_status(job["path"])
+                with network_slots:
+                    try:
+                        result = self._sync_network(job["path"], name, job["url"], token, status, report, job["clone"])
+                    except ValueError as e:
+                        result = {"success": False, "message": str(e)}
+                if result is None:
+                    with disk_slots:
+                        result = self._sync_disk(job["path"], name, status, strategy, report, job["clone"])
+            if result.get("success"):
+                emit({"event": "done", "repo": name, "operation": result.get("operation")})
+            else:
+                emit({"event": "failed", "repo": name, "message": result.get("message")})
+            return result
+
+        results = [None] * len(jobs)
+        skipped, preflight_stats = set(), None
+        if preflight and jobs:
+            skipped, preflight_stats = self._preflight(token, jobs, strategy)
+        for index, job in enumerate(jobs):
+            if index in skipped:
+                results[index] = {"success": True, "operation": "skipped", "message": "skipped (up to date)"}
+                emit({"event": "skipped", "repo": job["name"], "message": results[index]["message"]})
+            else:
+                emit({"event": "queued", "repo": job["name"]})
+        if len(skipped) < len(jobs):
+            order = sorted((index for index in range(len(jobs)) if index not in skipped), key=lambda index: jobs[index]["size"])
+            with ThreadPoolExecutor(max_workers=max_network + max_disk) as pool:
+                futures = {pool.submit(run, jobs[index]): index for index in order}
+                for future in as_completed(futures):
+                    try:
+                        results[futures[future]] = future.result()
+                    except Exception as e:
+                        results[futures[future]] = {"success": False, "message": f"Sync failed: {str(e)}"}
+        response = {"success": True, "results": [{"repo": job["name"], "result": result} for job, result in zip(jobs, results)]}
+        if preflight_stats:
+            response["preflight"] = preflight_stats
+        return response
 
     def create_repo(self, token, name, description, private=False):
         try:
-            response = requests.post(
-                'https://api.github.com/user/repos',
-                headers={'Authorization': f'token {token}', 'Accept': 'application/vnd.github.v3+json'},
-                json={
+            response = self.api.post(
+                '/user/repos',
+                token,
+                json_body={
                     'name': name,
                     'description': description,
                     'private': private,
                     'auto_init': True
-                },
-                timeout=10
+                }
             )
             if response.status_code == 201:
+                self.response_cache.invalidate("get_repos", token)
                 return {"success": True, "repo": response.json()}
             return {"success": False, "message": f"Create Error {response.status_code}: {response.text}"}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def get_bulk_status(self, repos_list):
+    def get_bulk_status(self, repos_list, timeout=None, on_event=None, cancel_event=None, fetch=False):
         """Get status for multiple local repositories"""
+        repos = [repo for repo in repos_list if repo.get('path') and os.path.exists(repo['path'])]
+
+        def on_result(index, status):
+            if on_event:
+                repo = repos[index]
+                on_event({"event": "repo", "index": index, "name": repo.get('name'), "path": repo['path'], "status": status})
+
+        statuses = self._run_parallel(
+            repos,
+            lambda repo: self.get_cached_status(repo['path'], timeout=timeout, fetch=fetch),
+            on_result=on_result,
+            cancel_event=cancel_event
+        )
+
         results = []
-        for repo in repos_list:
-            path = repo.get('path')
-            if path and os.path.exists(path):
-                results.append({
-                    "name": repo.get('name'),
-                    "path": path,
-                    "status": self.get_repo_status(path)
-                })
-        return {"success": True, "results": results}
+        for repo, status in zip(repos, statuses):
+            results.append({
+                "name": repo.get('name'),
+                "path": repo['path'],
+                "status": status
+            })
+        return {"success": True, "results": results, "cancelled": bool(cancel_event and cancel_event.is_set())}
 
-if __name__ == "__main__":
+
+def _json_arg(value):
+    """Accept JSON either pre-decoded (daemon) or as a string (CLI)"""
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+def _bool_arg(value):
+    if isinstance(value, str):
+        return value.lower() == 'true'
+    return bool(value)
+
+def _float_arg(value):
+    if value is None or value == "":
+        return None
+    return float(value)
+
+def _int_arg(value):
+    """Optional integer; None/""/"all" mean no limit"""
+    if value is None or value == "" or value == "all":
+        return None
+    return int(value)
+
+def _list_arg(value):
+    """A JSON list, or one plain value"""
+    if isinstance(value, str) and value.lstrip().startswith("["):
+        return json.loads(value)
+    return value
+
+def _roots_arg(value):
+    """scan_local roots: a plain path, or a JSON list of roots"""
+    if isinstance(value, str) and value.lstrip().startswith("["):
+        return json.loads(value)
+    return value
+
+def _fetch_arg(value):
+    """Status fetch mode: False, "auto" or "now" (CLI passes strings)"""
+    if isinstance(value, str):
+        value = value.lower()
+        if value in ("auto", "now"):
+            return value
+        value = value == "true"
+    return "now" if value is True else False
+
+# Keyword-only arguments the server injects into handlers that accept them;
+# clients can't pass these directly, by name or by position.
+_CONTEXT_PARAMS = ("on_event", "cancel_event")
+
+# Command table shared by the one-shot CLI and the `serve` daemon.
+# CLI arguments arrive as strings, JSON-RPC params may be typed; handlers coerce.
+COMMANDS = {
+    # validate <username> <token> [refresh]
+    "validate": lambda engine, username, token, refresh=False, *, on_event=None: engine.validate_token(
+        username, token, _bool_arg(refresh), on_event=on_event),
+    # get_repos <token> [max_repos] [refresh]
+    "get_repos": lambda engine, token, max_repos=None, refresh=False, *, on_event=None: engine.get_user_repos(
+        token, _int_arg(max_repos), on_event=on_event, refresh=_bool_arg(refresh)),
+    # search_repos <token> <query> [limit]
+    "search_repos": lambda engine, token, query, limit=100, *, on_event=None: engine.search_repos(
+        token, query, _int_arg(limit), on_event=on_event),
+    # get_status <path> [fetch: false|auto|now]
+    "get_status": lambda engine, path, fetch=False: engine.get_cached_status(path, fetch=_fetch_arg(fetch)),
+    "fetch": lambda engine, path: engine.fetch_now(path),
+    # schedule_fetch <path> <ttl_seconds>
+    "schedule_fetch": lambda engine, path, ttl: engine.schedule_fetch(path, float(ttl)),
+    # sync <path> <name> <url> <token> <strategy> [clone_options_json]
+    "sync": lambda engine, path, name, url, token, strategy="pull", clone=None: engine.sync_repo(
+        path, name, url, token, strategy, clone=_json_arg(clone) if clone else None),
+    # batch_sync <token> <repos_json> <strategy> [max_network] [max_disk] [preflight] [--progress]
+    "batch_sync": lambda engine, token, repos, strategy="pull", max_network=4, max_disk=2, preflight=True, *, on_event=None, cancel_event=None: engine.batch_sync(
+        token, _json_arg(repos), strategy, on_event=on_event, cancel_event=cancel_event,
+        max_network=int(max_network), max_disk=int(max_disk), preflight=_bool_arg(preflight)),
+    "get_detailed_status": lambda engine, path, fetch=False: engine.get_cached_status(path, fetch=_fetch_arg(fetch), detailed=True),
+    # get_file_diff <path> <file> [offset] [limit|all] [patch|word|stat]
+    "get_file_diff": lambda engine, path, file, offset=0, limit=GHEngine.DIFF_PAGE_HUNKS, mode="patch":
+        engine.get_file_diff(path, file, int(offset), _int_arg(limit), mode),
+    "get_git_graph": lambda engine, path, limit=20, after=None: engine.get_git_graph(path, int(limit), after or None),
+    "get_bulk_status": lambda engine, repos, timeout=None, fetch=False, *, on_event=None, cancel_event=None: engine.get_bulk_status(
+        _json_arg(repos), _float_arg(timeout), on_event=on_event, cancel_event=cancel_event, fetch=_fetch_arg(fetch)),
+    # export_sandbox <html> <css> <js>
+    "export_sandbox": lambda engine, html, css, js: engine.export_sandbox(html, css, js),
+    # deploy_sandbox <path> <html> <css> <js> <msg>
+    "deploy_sandbox": lambda engine, path, html, css, js, message: engine.deploy_sandbox(path, html, css, js, message),
+    # get_workflows <token> <repo> [refresh]
+    "get_workflows": lambda engine, token, repo, refresh=False, *, on_event=None: engine.get_workflows(
+        token, repo, _bool_arg(refresh), on_event=on_event),
+    # get_workflow_runs <token> <repo> [limit]
+    "get_workflow_runs": lambda engine, token, repo, limit=10, *, on_event=None: engine.get_workflow_runs(
+        token, repo, _int_arg(limit), on_event=on_event),
+    "list_snapshots": lambda engine, path: engine.list_snapshots(path),
+    # restore_snapshot <path> <id> [worktree|branch]
+    "restore_snapshot": lambda engine, path, snapshot_id, mode="worktree": engine.restore_snapshot(path, snapshot_id, mode),
+    # prune_snapshots <path> [keep] [max_age_days]
+    "prune_snapshots": lambda engine, path, keep=20, max_age_days=30: engine.prune_snapshots(path, int(keep), float(max_age_days)),
+    # get_repos_overview <token> <repo_full_names_json>
+    "get_repos_overview": lambda engine, token, repos: engine.get_repos_overview(token, _json_arg(repos)),
+    # trigger_workflow <token> <repo> <id> <ref>
+    "trigger_workflow": lambda engine, token, repo, workflow_id, ref="main": engine.trigger_workflow(token, repo, workflow_id, ref),
+    # poll_runs <token> <owner/repo> [state from the previous call]
+    "poll_runs": lambda engine, token, repo, state=None: engine.poll_runs(token, repo, _json_arg(state) if state else None),
+    # watch_runs <token> <owner/repo | JSON list> (daemon only)
+    "watch_runs": lambda engine, token, repos, *, on_event=None: engine.watch_runs(token, _list_arg(repos), on_event),
+    "unwatch_runs": lambda engine, watch: engine.unwatch_runs(int(watch)),
+    # get_run_logs <token> <repo> <run_id> [job] [step] [tail] [before] [search]
+    "get_run_logs": lambda engine, token, repo, run_id, job=None, step=None, tail=200, before=None, search=None, refresh=False:
+        engine.get_run_logs(token, repo, run_id, job or None, _int_arg(step), int(tail), _int_arg(before), search or None,
+                            refresh=_bool_arg(refresh)),
+    # get_job_log <token> <repo> <job_id> [tail] [before] [search]
+    "get_job_log": lambda engine, token, repo, job_id, tail=200, before=None, search=None, refresh=False:
+        engine.get_job_log(token, repo, job_id, int(tail), _int_arg(before), search or None, refresh=_bool_arg(refresh)),
+    # get_run_jobs <token> <repo> <run_id> [limit]
+    "get_run_jobs": lambda engine, token, repo, run_id, limit=None, *, on_event=None: engine.get_run_jobs(
+        token, repo, run_id, _int_arg(limit), on_event=on_event),
+    # create_repo <token> <name> <desc> <private>
+    "create_repo": lambda engine, token, name, description, private=False: engine.create_repo(token, name, description, _bool_arg(private)),
+    # scan_local <path|roots_json> <depth> [ignore_json] [rescan]
+    "scan_local": lambda engine, path, depth=3, ignore=None, rescan=False, timeout=None, fetch=False, *, on_event=None, cancel_event=None: engine.scan_local_repos(
+        _roots_arg(path), int(depth), _float_arg(timeout), on_event=on_event, cancel_event=cancel_event, fetch=_fetch_arg(fetch),
+        ignore=_json_arg(ignore) if ignore else None, rescan=_bool_arg(rescan)),
+    # scaffold_repo <path> <template>
+    "scaffold_repo": lambda engine, path, template: engine.scaffold_repo(path, template),
+    "subscribe_status": lambda engine, repos, *, on_event=None: engine.subscribe_status(_json_arg(repos), on_event),
+    "unsubscribe_status": lambda engine, subscription: engine.unsubscribe_status(int(subscription)),
+    # clear_cache [command] [token]: drop cached API responses
+    "clear_cache": lambda engine, endpoint=None, token=None: engine.clear_api_cache(endpoint or None, token or None),
+    # maintain [path|all] [tasks_json] [force]
+    "maintain": lambda engine, path=None, tasks=None, force=False: engine.maintain_repo(
+        None if path in (None, "", "all") else path, _list_arg(tasks) if tasks else None, _bool_arg(force)),
+    "maintenance_status": lambda engine: engine.get_maintenance_status(),
+    # mirror <path> [remotes_json|remote] [token] [refs_json|ref] [force]
+    "mirror": lambda engine, path, remotes=None, token=None, refs=None, force=False, *, on_event=None: engine.mirror_repo(
+        path, _list_arg(remotes) if remotes else None, token or None, _list_arg(refs) if refs else None,
+        _bool_arg(force), on_event=on_event),
+    "rate_limits": lambda engine, token: {"success": True, "limits": engine.api.rate_limits(token)},
+    # stats [reset] [recent] / trace [enabled] [slow_ms]
+    "stats": lambda engine, reset=False, recent=50: engine.get_stats(_bool_arg(reset), int(recent)),
+    "trace": lambda engine, enabled=True, slow_ms=None: engine.set_tracing(_bool_arg(enabled), _float_arg(slow_ms)),
+    "ping": lambda engine: {"success": True, "message": "pong"},
+}
+
+def _context_kwargs(handler, **context):
+    """Subset of server-provided context the handler actually accepts"""
+    accepted = inspect.signature(handler).parameters
+    return {key: value for key, value in context.items() if key in accepted and value is not None}
+
+def _run_handler(engine, method, handler, args, kwargs):
+    """Call a command handler, recording an rpc span when tracing is on"""
+    started = time.perf_counter() if engine.tracer.enabled else None
+    # Background maintenance waits for the engine to go quiet
+    engine.maintenance.begin_request()
+    try:
+        result = handler(engine, *args, **kwargs)
+    except Exception as e:
+        if started is not None:
+            engine.tracer.record("rpc", method, started, error=e)
+        raise
+    finally:
+        engine.maintenance.end_request()
+    if started is not None:
+        engine.tracer.record("rpc", method, started, failed=isinstance(result, dict) and result.get("success") is False)
+    return result
+
+class EngineServer:
+    """Newline-delimited JSON-RPC 2.0 over stdin/stdout, keeping one GHEngine warm.
+
+    Requests are dispatched onto a thread pool so slow calls (fetches, API
+    requests) don't block fast ones; responses are matched by `id` and may
+    arrive out of order. Requests without an `id` are notifications and get
+    no response. Long-running handlers stream `event` notifications tagged
+    with their request id and can be stopped with the `cancel` method.
+    """
+
+    def __init__(self, engine, stdin=None, stdout=None, max_workers=8):
+        self.engine = engine
+        self.stdin = stdin or sys.stdin
+        self.stdout = stdout or sys.stdout
+        self._write_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rpc")
+        self._cancel_events = {}
+        self._cancel_lock = threading.Lock()
+
+    def _write(self, message):
+        line = json.dumps(message)
+        with self._write_lock:
+            self.stdout.write(line + "\n")
+            self.stdout.flush()
+
+    def notify(self, method, params):
+        self._write({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def _error(self, req_id, code, message):
+        return {"jsonrpc": "2.0", "id": req_id, "error": {"code": code, "message": message}}
+
+    def serve(self):
+        for line in self.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                self._write(self._error(None, -32700, "Parse error"))
+                continue
+            if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+                self._write(self._error(request.get("id") if isinstance(request, dict) else None, -32600, "Invalid request"))
+                continue
+
+            if request["method"] == "shutdown":
+                shutdown_request = request
+                break
+            if request["method"] == "cancel":
+                self._cancel(request)
+                continue
+            self._pool.submit(self._handle, request)
+        else:
+            shutdown_request = None
+
+        # Drain in-flight requests before acknowledging shutdown
+        self._pool.shutdown(wait=True)
+        if shutdown_request is not None and "id" in shutdown_request:
+            self._write({"jsonrpc": "2.0", "id": shutdown_request["id"], "result": {"success": True}})
+
+    def _cancel(self, request):
+        params = request.get("params")
+        target = params.get("id") if isinstance(params, dict) else (params[0] if params else None)
+        with self._cancel_lock:
+            event = self._cancel_events.get(target)
+        if event is not None:
+            event.set()
+        if "id" in request:
+            self._write({"jsonrpc": "2.0", "id": request["id"], "result": {"success": event is not None}})
+
+    def _handle(self, request):
+        req_id = request.get("id")
+        cancel_event = threading.Event()
+        if req_id is not None:
+            with self._cancel_lock:
+                self._cancel_events[req_id] = cancel_event
+        try:
+            response = self.dispatch(request["method"], request.get("params"), req_id, cancel_event)
+        finally:
+            with self._cancel_lock:
+                self._cancel_events.pop(req_id, None)
+        if "id" in request:
+            self._write(response)
+
+    def dispatch(self, method, params, req_id=None, cancel_event=None):
+        handler = COMMANDS.get(method)
+        if handler is None:
+            return self._error(req_id, -32601, f"Unknown command: {method}")
+
+        args, kwargs = [], {}
+        if isinstance(params, dict):
+            kwargs = {key: value for key, value in params.items() if key not in _CONTEXT_PARAMS}
+        elif isinstance(params, list):
+            args = params
+        elif params is not None:
+            return self._error(req_id, -32602, "params must be an array or object")
+
+        try:
+            inspect.signature(handler).bind(self.engine, *args, **kwargs)
+        except TypeError as e:
+            return self._error(req_id, -32602, f"Invalid params for {method}: {e}")
+
+        on_event = None
+        if req_id is not None:
+            on_event = lambda event: self.notify("event", dict(event, id=req_id))
+        kwargs.update(_context_kwargs(handler, on_event=on_event, cancel_event=cancel_event))
+
+        try:
+            result = _run_handler(self.engine, method, handler, args, kwargs)
+        except Exception as e:
+            return self._error(req_id, -32000, f"Engine runtime error: {str(e)}")
+        return {"jsonrpc": "2.0", "id": req_id, "result": result}
+
+def main(argv):
     engine = GHEngine()
-    
-    if len(sys.argv) < 2:
+
+    if len(argv) < 2:
         print(json.dumps({"success": False, "message": "Missing command"}))
-        sys.exit(1)
+        return 1
+
+    cmd = argv[1]
+    if cmd == "serve":
+        # Only the long-lived daemon refreshes remotes and watches repos in the background
+        engine.fetch_scheduler.start()
+        engine.status_cache.start()
+        engine.run_watcher.start()
+        engine.response_cache.background = True
+        engine.maintenance.start()
+        EngineServer(engine).serve()
+        engine.maintenance.stop()
+        engine.run_watcher.stop()
+        engine.status_cache.stop()
+        engine.fetch_scheduler.stop()
+        return 0
+
+    handler = COMMANDS.get(cmd)
+    if handler is None:
+        print(json.dumps({"success": False, "message": f"Unknown command: {cmd}"}))
+        return 0
+
+    # --progress: stream the handler's events as NDJSON; the final line is the result
+    args = [arg for arg in argv[2:] if arg != "--progress"]
+    kwargs = {}
+    if len(args) != len(argv) - 2:
+        print_lock = threading.Lock()
+
+        def print_event(event):
+            with print_lock:
+                print(json.dumps(event), flush=True)
+        kwargs = _context_kwargs(handler, on_event=print_event)
 
-    cmd = sys.argv[1]
-    
     try:
-        if cmd == "validate":
-            print(json.dumps(engine.validate_token(sys.argv[2], sys.argv[3])))
-        elif cmd == "get_repos":
-            print(json.dumps(engine.get_user_repos(sys.argv[2])))
-        elif cmd == "search_repos":
-            print(json.dumps(engine.search_repos(sys.argv[2], sys.argv[3])))
-        elif cmd == "get_status":
-            print(json.dumps(engine.get_repo_status(sys.argv[2])))
-        elif cmd == "sync":
-            # sync <path> <name> <url> <token> <strategy>
-            if len(sys.argv) < 6:
-                print(json.dumps({"success": False, "message": "Missing arguments for sync"}))
-            else:
-                path, name, url, token = sys.argv[2:6]
-                strategy = sys.argv[6] if len(sys.argv) > 6 else "pull"
-                print(json.dumps(engine.sync_repo(path, name, url, token, strategy)))
-        elif cmd == "batch_sync":
-            # batch_sync <token> <repos_json> <strategy>
-            token = sys.argv[2]
-            repos_list = json.loads(sys.argv[3])
-            strategy = sys.argv[4] if len(sys.argv) > 4 else "pull"
-            print(json.dumps(engine.batch_sync(token, repos_list, strategy)))
-        elif cmd == "get_detailed_status":
-            print(json.dumps(engine.get_detailed_status(sys.argv[2])))
-        elif cmd == "get_file_diff":
-            print(json.dumps(engine.get_file_diff(sys.argv[2], sys.argv[3])))
-        elif cmd == "export_sandbox":
-            # export_sandbox <html> <css> <js>
-            print(json.dumps(engine.export_sandbox(sys.argv[2], sys.argv[3], sys.argv[4])))
-        elif cmd == "deploy_sandbox":
-            # deploy_sandbox <path> <html> <css> <js> <msg>
-            print(json.dumps(engine.deploy_sandbox(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6])))
-        elif cmd == "get_workflows":
-            print(json.dumps(engine.get_workflows(sys.argv[2], sys.argv[3])))
-        elif cmd == "get_workflow_runs":
-            print(json.dumps(engine.get_workflow_runs(sys.argv[2], sys.argv[3])))
-        elif cmd == "trigger_workflow":
-            # trigger_workflow <token> <repo> <id> <ref>
-            ref = sys.argv[5] if len(sys.argv) > 5 else "main"
-            print(json.dumps(engine.trigger_workflow(sys.argv[2], sys.argv[3], sys.argv[4], ref)))
-        elif cmd == "get_run_jobs":
-            print(json.dumps(engine.get_run_jobs(sys.argv[2], sys.argv[3], sys.argv[4])))
-        elif cmd == "get_remote_diff":
-            print(json.dumps(engine.get_remote_diff(sys.argv[2], sys.argv[3])))
-        elif cmd == "create_repo":
-            # create_repo <token> <name> <desc> <private>
-            private = sys.argv[5].lower() == 'true' if len(sys.argv) > 5 else False
-            print(json.dumps(engine.create_repo(sys.argv[2], sys.argv[3], sys.argv[4], private)))
-        elif cmd == "scan_local":
-            # scan_local <path> <depth>
-            depth = int(sys.argv[3]) if len(sys.argv) > 3 else 3
-            print(json.dumps(engine.scan_local_repos(sys.argv[2], depth)))
-        elif cmd == "scaffold_repo":
-            # scaffold_repo <path> <template>
-            print(json.dumps(engine.scaffold_repo(sys.argv[2], sys.argv[3])))
-        else:
-            print(json.dumps({"success": False, "message": f"Unknown command: {cmd}"}))
+        inspect.signature(handler).bind(engine, *args, **kwargs)
+    except TypeError:
+        print(json.dumps({"success": False, "message": f"Missing arguments for {cmd}"}))
+        return 0
+
+    try:
+        print(json.dumps(_run_handler(engine, cmd, handler, args, kwargs)))
     except Exception as e:
         print(json.dumps({"success": False, "message": f"Engine runtime error: {str(e)}"}))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,9 +1,111 @@
+import 'dart:async';
 import 'dart:convert';
 import 'dart:io';
 import 'package:flutter/services.dart';
 import 'package:path/path.dart' as p;
 
+/// The request never reached the daemon, so running it elsewhere can't repeat it.
+class _DaemonUnavailable implements Exception {
+  final String message;
+  const _DaemonUnavailable(this.message);
+
+  @override
+  String toString() => message;
+}
+
+/// Long-lived `gh_engine.py serve` process speaking newline-delimited JSON-RPC.
+/// Keeps the interpreter and engine state warm across calls.
+class _EngineDaemon {
+  final Process _process;
+  final Map<int, Completer<Map<String, dynamic>>> _pending = {};
+  int _nextId = 1;
+  bool _closed = false;
+
+  _EngineDaemon._(this._process) {
+    _process.stdout
+        .transform(utf8.decoder)
+        .transform(const LineSplitter())
+        .listen(_onLine, onDone: _onClosed);
+    // Drain stderr so the pipe never fills up and blocks the engine
+    _process.stderr.drain();
+    _process.exitCode.then((_) => _onClosed());
+  }
+
+  static Future<_EngineDaemon> start(String scriptPath) async {
+    final process = await Process.start('python3', [scriptPath, 'serve']);
+    return _EngineDaemon._(process);
+  }
+
+  bool get isAlive => !_closed;
+
+  Future<Map<String, dynamic>> call(String method, List<String> params) {
+    if (_closed) {
+      return Future.error(const _DaemonUnavailable('Engine daemon is not running'));
+    }
+    final id = _nextId++;
+    final completer = Completer<Map<String, dynamic>>();
+    _pending[id] = completer;
+    try {
+      _process.stdin.writeln(jsonEncode({
+        'jsonrpc': '2.0',
+        'id': id,
+        'method': method,
+        'params': params,
+      }));
+    } catch (e) {
+      _pending.remove(id);
+      return Future.error(_DaemonUnavailable('Could not send to engine daemon: $e'));
+    }
+    return completer.future;
+  }
+
+  void _onLine(String line) {
+    if (line.trim().isEmpty) return;
+    Map<String, dynamic> message;
+    try {
+      message = jsonDecode(line);
+    } catch (e) {
+      return;
+    }
+
+    final id = message['id'];
+    if (id is! int) return; // Notifications are not consumed yet
+    final completer = _pending.remove(id);
+    if (completer == null) return;
+
+    if (message.containsKey('error')) {
+      final error = message['error'];
+      completer.complete({'success': false, 'message': error is Map ? error['message'] : error.toString()});
+    } else {
+      final result = message['result'];
+      completer.complete(result is Map<String, dynamic> ? result : {'success': true, 'result': result});
+    }
+  }
+
+  void _onClosed() {
+    if (_closed) return;
+    _closed = true;
+    for (final completer in _pending.values) {
+      completer.completeError(StateError('Engine daemon exited'));
+    }
+    _pending.clear();
+  }
+}
+
 class GHService {
+  // Shared by every GHService instance so the whole app talks to one engine
+  static Future<_EngineDaemon?>? _daemon;
+
+  // Safe to run again when the daemon dies mid-call; anything else (sync,
+  // create_repo, trigger_workflow, deploy_sandbox, mirror, ...) may already
+  // have happened, so its failure is reported instead of retried
+  static const _readOnlyCommands = {
+    'validate', 'get_repos', 'get_status', 'get_detailed_status', 'get_file_diff',
+    'get_workflows', 'get_workflow_runs', 'poll_runs', 'get_git_graph',
+    'maintenance_status', 'get_bulk_status', 'get_run_jobs', 'get_run_logs',
+    'get_job_log', 'scan_local',
+  };
+
   // Locate the python script
   Future<String> _getScriptPath() async {
     // 1. Check if we are running in a SNAP environment
@@ -25,7 +127,36 @@ class GHService {
     return p.join(home, 'syncstack/opendev-labs/syncstack/assets/scripts/gh_engine.py');
   }
 
+  Future<_EngineDaemon?> _getDaemon() async {
+    final current = await _daemon;
+    if (current != null && current.isAlive) return current;
+
+    _daemon = _getScriptPath()
+        .then<_EngineDaemon?>((scriptPath) => _EngineDaemon.start(scriptPath))
+        .catchError((_) => null);
+    return _daemon;
+  }
+
   Future<Map<String, dynamic>> _runPython(List<String> args) async {
+    final daemon = await _getDaemon();
+    if (daemon != null) {
+      try {
+        return await daemon.call(args.first, args.sublist(1));
+      } on _DaemonUnavailable {
+        // Never sent; run it as a one-shot process below
+      } catch (e) {
+        if (!_readOnlyCommands.contains(args.first)) {
+          return {
+            'success': false,
+            'message': 'Engine exited during ${args.first}; it may or may not have completed: $e'
+          };
+        }
+      }
+    }
+    return _runOneShot(args);
+  }
+
+  Future<Map<String, dynamic>> _runOneShot(List<String> args) async {
     try {
       final scriptPath = await _getScriptPath();
       final result = await Process.run('python3', [scriptPath, ...args]);
@@ -52,14 +183,21 @@ class GHService {
     }
   }
 
-  // Auth
-  Future<Map<String, dynamic>> validateToken(String username, String token) async {
-    return _runPython(['validate', username, token]);
+  // Auth, repos and workflows are answered from the engine's response cache;
+  // results carry 'cache' (cached/stale/age) and refresh: true bypasses it
+  Future<Map<String, dynamic>> validateToken(String username, String token, {bool refresh = false}) async {
+    return _runPython(['validate', username, token, if (refresh) 'true']);
   }
 
   // Repos
-  Future<Map<String, dynamic>> getUserRepos(String token) async {
-    return _runPython(['get_repos', token]);
+  // Mirrors: remote names, URLs or {url, token, repo} maps; null uses the repo's syncstack.mirror config
+  Future<Map<String, dynamic>> mirrorRepo(String path, {List<dynamic>? remotes, String? token, List<String>? refs, bool force = false}) async {
+    return _runPython(['mirror', path, remotes != null ? jsonEncode(remotes) : '', token ?? '',
+        refs != null ? jsonEncode(refs) : '', force.toString()]);
+  }
+
+  Future<Map<String, dynamic>> getUserRepos(String token, {bool refresh = false}) async {
+    return _runPython(['get_repos', token, if (refresh) ...['', 'true']]);
   }
 
   Future<Map<String, dynamic>> getRepoStatus(String path) async {
@@ -75,19 +213,24 @@ class GHService {
     return _runPython(['get_detailed_status', path]);
   }
 
-  Future<Map<String, dynamic>> getFileDiff(String path, String file) async {
-    return _runPython(['get_file_diff', path, file]);
+  Future<Map<String, dynamic>> getFileDiff(String path, String file, {int offset = 0, int? limit, String mode = 'patch'}) async {
+    return _runPython(['get_file_diff', path, file, offset.toString(), limit?.toString() ?? '100', mode]);
   }
 
   // GitHub Actions
-  Future<Map<String, dynamic>> getWorkflows(String token, String repo) async {
-    return _runPython(['get_workflows', token, repo]);
+  Future<Map<String, dynamic>> getWorkflows(String token, String repo, {bool refresh = false}) async {
+    return _runPython(['get_workflows', token, repo, if (refresh) 'true']);
   }
 
   Future<Map<String, dynamic>> getWorkflowRuns(String token, String repo) async {
     return _runPython(['get_workflow_runs', token, repo]);
   }
 
+  // Incremental Actions poll: pass back the returned 'state', wait 'next_poll_in' seconds
+  Future<Map<String, dynamic>> pollRuns(String token, String repo, {Map<String, dynamic>? state}) async {
+    return _runPython(['poll_runs', token, repo, if (state != null) jsonEncode(state)]);
+  }
+
   Future<Map<String, dynamic>> triggerWorkflow(String token, String repo, String workflowId, {String ref = 'main'}) async {
     return _runPython(['trigger_workflow', token, repo, workflowId, ref]);
   }
@@ -96,8 +239,17 @@ class GHService {
     return _runPython(['create_repo', token, name, description, private.toString()]);
   }
 
-  Future<Map<String, dynamic>> getGitGraph(String path) async {
-    return _runPython(['get_git_graph', path]);
+  Future<Map<String, dynamic>> getGitGraph(String path, {int limit = 20, String? after}) async {
+    return _runPython(['get_git_graph', path, limit.toString(), if (after != null) after]);
+  }
+
+  // Maintenance: path null maintains every managed repo; reports carry before/after timings
+  Future<Map<String, dynamic>> maintainRepo({String? path, List<String>? tasks, bool force = false}) async {
+    return _runPython(['maintain', path ?? 'all', tasks != null ? jsonEncode(tasks) : '', force.toString()]);
+  }
+
+  Future<Map<String, dynamic>> getMaintenanceStatus() async {
+    return _runPython(['maintenance_status']);
   }
 
   Future<Map<String, dynamic>> getBulkStatus(List<Map<String, String>> repos) async {
@@ -112,12 +264,26 @@ class GHService {
     return _runPython(['get_run_jobs', token, repoFullName, runId]);
   }
 
-  Future<Map<String, dynamic>> scanLocal(String path, {int depth = 3}) async {
-    return _runPython(['scan_local', path, depth.toString()]);
+  // Logs: without job lists jobs/steps; with job (and step) returns the tail, or matches for search
+  Future<Map<String, dynamic>> getRunLogs(String token, String repoFullName, String runId,
+      {String? job, int? step, int tail = 200, int? before, String? search}) async {
+    return _runPython(['get_run_logs', token, repoFullName, runId, job ?? '', step?.toString() ?? '',
+        tail.toString(), before?.toString() ?? '', search ?? '']);
+  }
+
+  Future<Map<String, dynamic>> getJobLog(String token, String repoFullName, String jobId,
+      {int tail = 200, int? before, String? search}) async {
+    return _runPython(['get_job_log', token, repoFullName, jobId, tail.toString(), before?.toString() ?? '', search ?? '']);
+  }
+
+  // ignore: directory names to skip (null keeps the engine's dependency/build defaults, [] skips nothing)
+  Future<Map<String, dynamic>> scanLocal(String path, {int depth = 3, List<String>? ignore, bool rescan = false}) async {
+    return _runPython(['scan_local', path, depth.toString(), ignore != null ? jsonEncode(ignore) : '', rescan.toString()]);
   }
 
+  // The engine has no get_remote_diff command yet; answer without a round trip
   Future<Map<String, dynamic>> getRemoteDiff(String path, String branch) async {
-    return _runPython(['get_remote_diff', path, branch]);
+    return {'success': false, 'unsupported': true, 'message': 'Comparing with origin/$branch is not supported yet'};
   }
 
   Future<Map<String, dynamic>> exportSandbox(String html, String css, String js) async {
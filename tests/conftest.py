@@ -0,0 +1,94 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assets", "scripts"))
+
+
+def git(cwd, *args, env=None, check=True):
+    """Run git in cwd with a fixed identity; returns stdout"""
+    full_env = dict(os.environ, GIT_AUTHOR_NAME="Test", GIT_AUTHOR_EMAIL="test@example.com",
+                    GIT_COMMITTER_NAME="Test", GIT_COMMITTER_EMAIL="test@example.com", **(env or {}))
+    return subprocess.run(["git", "-C", str(cwd)] + list(args), check=check, capture_output=True,
+                          text=True, env=full_env).stdout
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(str(path)), exist_ok=True)
+    with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+        f.write(data)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    import gh_engine
+    return gh_engine.GHEngine(workspace_root=str(tmp_path / "workspace"), git_backend="subprocess")
+
+
+class StubRequest:
+    def __init__(self, method, path, query, headers, body):
+        self.method, self.path, self.query, self.headers, self.body = method, path, query, headers, body
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+
+class StubServer(ThreadingHTTPServer):
+    """Local HTTP server answering from `routes`: (method, path) -> fn(request) -> (status, body, headers)"""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.routes = {}
+        self.requests = []
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def route(self, method, path):
+        def register(fn):
+            self.routes[(method, path)] = fn
+            return fn
+        return register
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _serve(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        request = StubRequest(self.command, url.path, {key: values[0] for key, values in parse_qs(url.query).items()},
+                              self.headers, self.rfile.read(length) if length else b"")
+        with self.server._lock:
+            self.server.requests.append(request)
+        handler = self.server.routes.get((self.command, url.path))
+        status, body, headers = handler(request) if handler else (404, {"message": "Not Found"}, {})
+        payload = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = _serve
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,30 @@
+"""The COMMANDS table as the CLI and the serve daemon bind it"""
+import inspect
+import io
+import json
+
+import pytest
+
+import gh_engine
+
+
+@pytest.mark.parametrize("name", sorted(gh_engine.COMMANDS))
+def test_context_params_are_keyword_only(name):
+    parameters = inspect.signature(gh_engine.COMMANDS[name]).parameters
+    for context in gh_engine._CONTEXT_PARAMS:
+        if context in parameters:
+            assert parameters[context].kind is inspect.Parameter.KEYWORD_ONLY
+
+
+def test_cli_rejects_surplus_positional(engine, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(gh_engine, "GHEngine", lambda: engine)
+    gh_engine.main(["gh_engine.py", "get_bulk_status", json.dumps([{"path": str(tmp_path)}]), "", "false", "x"])
+    assert json.loads(capsys.readouterr().out) == {"success": False, "message": "Missing arguments for get_bulk_status"}
+
+
+def test_server_rejects_surplus_positional(engine):
+    server = gh_engine.EngineServer(engine, stdin=io.StringIO(), stdout=io.StringIO())
+    response = server.dispatch("get_bulk_status", ["[]", "", False, "x"], req_id=1)
+    assert response["error"]["code"] == -32602
+    response = server.dispatch("get_bulk_status", {"repos": "[]", "on_event": "x"}, req_id=2)
+    assert response["result"]["success"]
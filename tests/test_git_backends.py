@@ -0,0 +1,188 @@
+"""SubprocessBackend and Pygit2Backend must return identical results"""
+import os
+
+import pytest
+
+from conftest import git, write
+
+pygit2 = pytest.importorskip("pygit2")
+
+import gh_engine  # noqa: E402
+
+
+def commit(repo, message, when):
+    # Fixed dates, some shared, so log order has to break ties the way git does
+    stamp = f"{1700000000 + when} +0000"
+    git(repo, "commit", "-q", "-m", message, env={"GIT_AUTHOR_DATE": stamp, "GIT_COMMITTER_DATE": stamp})
+
+
+@pytest.fixture
+def history_repo(tmp_path):
+    """A repo with merge history, an origin to be ahead/behind of, and every kind of working-tree change"""
+    remote, repo = tmp_path / "remote.git", tmp_path / "repo"
+    git(tmp_path, "init", "-q", "--bare", "--initial-branch=main", str(remote))
+    git(tmp_path, "init", "-q", "--initial-branch=main", str(repo))
+    write(repo / "notes.txt", "a\nb\nc\n")
+    write(repo / "numbers.txt", "".join(f"{n}\n" for n in range(100)))
+    write(repo / "gone.txt", "x\n")
+    write(repo / "dir" / "nested.txt", "1\n")
+    write(repo / "image.bin", bytes(range(256)) * 4)
+    git(repo, "add", "-A")
+    commit(repo, "Initial commit\n\nWith a body", 0)
+    git(repo, "remote", "add", "origin", str(remote))
+    git(repo, "push", "-q", "-u", "origin", "main")
+
+    git(repo, "checkout", "-q", "-b", "feature")
+    write(repo / "feature.txt", "feature\n")
+    git(repo, "add", "feature.txt")
+    commit(repo, "Feature work", 10)
+    git(repo, "checkout", "-q", "main")
+    write(repo / "notes.txt", "a\nb\nc\nd\n")
+    commit_all(repo, "Main work", 10)
+    git(repo, "merge", "-q", "--no-ff", "feature", "-m", "Merge feature",
+        env={"GIT_AUTHOR_DATE": "1700000020 +0000", "GIT_COMMITTER_DATE": "1700000020 +0000"})
+    write(repo / "numbers.txt", "".join(f"{n}\n" for n in range(90)))
+    commit_all(repo, "Trim numbers", 20)
+
+    # Working tree: staged rename, staged + unstaged edit, deletion, binary edit, untracked, mode change
+    git(repo, "mv", "numbers.txt", "renamed.txt")
+    write(repo / "notes.txt", "a\nb\nc\nd\nstaged\n")
+    git(repo, "add", "notes.txt")
+    write(repo / "notes.txt", "a\nb\nc\nd\nstaged\nunstaged\n")
+    os.remove(repo / "gone.txt")
+    write(repo / "image.bin", bytes(reversed(range(256))) * 4)
+    write(repo / "untracked" / "deep" / "file.txt", "u\n")
+    write(repo / "top.txt", "t\n")
+    os.chmod(repo / "dir" / "nested.txt", 0o755)
+    return str(repo)
+
+
+def commit_all(repo, message, when):
+    git(repo, "add", "-A")
+    commit(repo, message, when)
+
+
+@pytest.fixture
+def conflict_repo(tmp_path):
+    """A merge stopped on conflicts: both-modified, deleted-by-them and added-by-both paths"""
+    repo = tmp_path / "conflict"
+    git(tmp_path, "init", "-q", "--initial-branch=main", str(repo))
+    write(repo / "shared.txt", "base\n")
+    write(repo / "removed.txt", "base\n")
+    commit_all(repo, "Base", 0)
+    git(repo, "checkout", "-q", "-b", "other")
+    write(repo / "shared.txt", "other\n")
+    os.remove(repo / "removed.txt")
+    write(repo / "added.txt", "other\n")
+    commit_all(repo, "Other side", 5)
+    git(repo, "checkout", "-q", "main")
+    write(repo / "shared.txt", "main\n")
+    write(repo / "removed.txt", "main\n")
+    write(repo / "added.txt", "main\n")
+    commit_all(repo, "Main side", 5)
+    git(repo, "merge", "-q", "other", check=False)
+    return str(repo)
+
+
+@pytest.fixture
+def unborn_repo(tmp_path):
+    """No commits yet: one staged file and one untracked"""
+    repo = tmp_path / "unborn"
+    git(tmp_path, "init", "-q", "--initial-branch=main", str(repo))
+    write(repo / "staged.txt", "s\n")
+    git(repo, "add", "staged.txt")
+    write(repo / "loose.txt", "l\n")
+    return str(repo)
+
+
+class _NoFallback(gh_engine.SubprocessBackend):
+    """Sits between Pygit2Backend and SubprocessBackend so a silent fallback fails the test"""
+
+    def _fell_back(self, *args, **kwargs):
+        raise AssertionError("Pygit2Backend fell back to git")
+
+    read_status = ahead_behind = numstat = resolve = log = _fell_back
+
+
+class StrictPygit2Backend(gh_engine.Pygit2Backend, _NoFallback):
+    pass
+
+
+@pytest.fixture
+def backends(engine):
+    return gh_engine.SubprocessBackend(engine), StrictPygit2Backend(engine)
+
+
+def assert_same(backends, method, *args, **kwargs):
+    subprocess_backend, pygit2_backend = backends
+    expected = getattr(subprocess_backend, method)(*args, **kwargs)
+    assert getattr(pygit2_backend, method)(*args, **kwargs) == expected
+    return expected
+
+
+@pytest.mark.parametrize("repo_fixture", ["history_repo", "conflict_repo", "unborn_repo"])
+def test_read_status(request, backends, repo_fixture):
+    branch, entries = assert_same(backends, "read_status", request.getfixturevalue(repo_fixture))
+    assert branch is not None and entries
+
+
+def test_status_covers_every_change_kind(backends, history_repo, conflict_repo):
+    _, entries = assert_same(backends, "read_status", history_repo)
+    files = {entry["file"]: entry for entry in entries}
+    assert files["renamed.txt"].get("orig_file") == "numbers.txt"
+    assert {"image.bin", "gone.txt", "top.txt", "dir/nested.txt"} <= set(files)
+    _, entries = assert_same(backends, "read_status", conflict_repo)
+    conflicts = {entry["file"]: entry["index_status"] + entry["worktree_status"] for entry in entries}
+    assert conflicts == {"shared.txt": "UU", "removed.txt": "UD", "added.txt": "AA"}
+
+
+def test_ahead_behind(backends, history_repo):
+    assert assert_same(backends, "ahead_behind", history_repo, "HEAD", "origin/main") == (4, 0)
+    assert assert_same(backends, "ahead_behind", history_repo, "origin/main", "HEAD") == (0, 4)
+    assert assert_same(backends, "ahead_behind", history_repo, "feature", "main") == (0, 3)
+    assert assert_same(backends, "ahead_behind", history_repo, "HEAD", "origin/missing") is None
+
+
+def test_ahead_behind_unborn(backends, unborn_repo):
+    assert assert_same(backends, "ahead_behind", unborn_repo, "HEAD", "origin/main") is None
+
+
+@pytest.mark.parametrize("base", ["HEAD", "HEAD~2"])
+def test_numstat(backends, history_repo, base):
+    stats = assert_same(backends, "numstat", history_repo, base)
+    assert stats["image.bin"][2]  # binary
+
+
+@pytest.mark.parametrize("repo_fixture", ["history_repo", "unborn_repo"])
+def test_numstat_empty_tree(request, engine, repo_fixture):
+    # The empty-tree base (an unborn HEAD) is documented to fall back to git
+    repo = request.getfixturevalue(repo_fixture)
+    assert_same((gh_engine.SubprocessBackend(engine), gh_engine.Pygit2Backend(engine)),
+                "numstat", repo, gh_engine.EMPTY_TREE_SHA)
+
+
+def test_resolve(backends, history_repo, unborn_repo):
+    assert len(assert_same(backends, "resolve", history_repo, ["HEAD", "origin/main", "feature"])) == 3
+    assert assert_same(backends, "resolve", unborn_repo, ["HEAD"]) == []
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"limit": 50},
+    {"limit": 2, "skip": 1},
+    {"limit": 50, "topo": True},
+    {"limit": 50, "revs": ("main", "feature", "origin/main")},
+    {"limit": 3, "revs": ("feature",), "topo": True},
+])
+def test_log(backends, history_repo, kwargs):
+    limit = kwargs.pop("limit")
+    commits = assert_same(backends, "log", history_repo, limit, **kwargs)
+    assert commits
+
+
+def test_log_walks_merges(backends, history_repo):
+    commits = assert_same(backends, "log", history_repo, 50)
+    assert len(commits) == 5
+
+
+def test_log_unborn(backends, unborn_repo):
+    assert assert_same(backends, "log", unborn_repo, 10) == []
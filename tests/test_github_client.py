@@ -0,0 +1,128 @@
+"""GitHubClient against a local stub: ETag reuse, rate-limit pacing, retries and pagination"""
+import threading
+import time
+
+import pytest
+
+import gh_engine
+
+
+@pytest.fixture
+def client(stub):
+    return gh_engine.GitHubClient(api_url=stub.url, max_wait=5)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record time.sleep calls in the engine instead of sleeping"""
+    calls = []
+    monkeypatch.setattr(gh_engine.time, "sleep", calls.append)
+    return calls
+
+
+def limit_headers(resource, limit, remaining, reset_in=60):
+    return {"X-RateLimit-Resource": resource, "X-RateLimit-Limit": limit,
+            "X-RateLimit-Remaining": remaining, "X-RateLimit-Reset": int(time.time() + reset_in)}
+
+
+def test_304_is_served_from_cache(client, stub):
+    @stub.route("GET", "/user")
+    def user(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return 304, None, {"ETag": '"v1"'}
+        return 200, {"login": "octo"}, {"ETag": '"v1"'}
+
+    first = client.get("/user", "token")
+    second = client.get("/user", "token")
+    assert not first.from_cache and second.from_cache
+    assert second.status_code == 200 and second.json() == {"login": "octo"}
+    assert [request.headers.get("If-None-Match") for request in stub.requests] == [None, '"v1"']
+
+
+def test_etags_are_per_token(client, stub):
+    stub.route("GET", "/user")(lambda request: (200, {"login": "octo"}, {"ETag": '"v1"'}))
+    client.get("/user", "one")
+    client.get("/user", "two")
+    assert [request.headers.get("If-None-Match") for request in stub.requests] == [None, None]
+
+
+def test_secondary_limit_is_retried(client, stub, sleeps):
+    answers = iter([
+        (403, {"message": "You have exceeded a secondary rate limit."}, {"Retry-After": "2"}),
+        (200, {"ok": True}, {}),
+    ])
+    stub.route("GET", "/repos/octo/app")(lambda request: next(answers))
+    response = client.get("/repos/octo/app", "token")
+    assert response.status_code == 200 and response.json() == {"ok": True}
+    assert len(stub.requests) == 2 and sleeps == [2.0]
+
+
+def test_plain_403_is_not_retried(client, stub, sleeps):
+    stub.route("GET", "/repos/octo/private")(lambda request: (403, {"message": "Resource not accessible"}, {}))
+    assert client.get("/repos/octo/private", "token").status_code == 403
+    assert len(stub.requests) == 1 and sleeps == []
+
+
+def test_long_retry_after_raises(client, stub, sleeps):
+    stub.route("GET", "/user")(lambda request: (429, {"message": "slow down"}, {"Retry-After": "600"}))
+    with pytest.raises(gh_engine.RateLimitError):
+        client.get("/user", "token")
+    assert sleeps == []
+
+
+def test_reserve_is_sized_to_the_bucket(client, stub, sleeps):
+    # 25 of search's 30/min left is plenty; 40 of core's 5000/h is under the reserve of 50
+    stub.route("GET", "/search/repositories")(lambda request: (200, {"items": []}, limit_headers("search", 30, 25)))
+    stub.route("GET", "/user")(lambda request: (200, {}, limit_headers("core", 5000, 40)))
+    for _ in range(3):
+        client.get("/search/repositories", "token")
+    assert sleeps == []
+    assert client._budget("token", "search") == 22
+
+    client.get("/user", "token")
+    client.get("/user", "token")
+    assert len(sleeps) == 1 and 0 < sleeps[0] <= 60 / 40 + 1
+    assert client._budget("token", "core") == 1
+
+
+def test_exhausted_bucket_waits_for_reset(client, stub, sleeps):
+    stub.route("GET", "/user")(lambda request: (200, {}, limit_headers("core", 5000, 0, reset_in=3)))
+    client.get("/user", "token")
+    client.get("/user", "token")
+    assert len(sleeps) == 1 and 0 < sleeps[0] <= 3
+
+
+def paged(stub, items, per_page, request):
+    """One page of `items`, with a rel="last" Link like GitHub's REST lists"""
+    page = int(request.query.get("page", 1))
+    last = -(-len(items) // per_page)
+    headers = {"Link": f'<{stub.url}{request.path}?page={last}>; rel="last"'} if page < last else {}
+    return 200, items[(page - 1) * per_page:page * per_page], headers
+
+
+def test_pages_arrive_in_order(client, stub):
+    items = list(range(1, 10))
+    page_two = threading.Event()  # Page 2 answers only after page 3 has been requested
+
+    @stub.route("GET", "/user/repos")
+    def repos(request):
+        if request.query.get("page") == "3":
+            page_two.set()
+        elif request.query.get("page") == "2":
+            page_two.wait(5)
+        return paged(stub, items, 2, request)
+
+    pages = list(client.pages("/user/repos", "token", per_page=2))
+    assert pages == [[1, 2], [3, 4], [5, 6], [7, 8], [9]]
+    assert sorted(int(request.query.get("page", 1)) for request in stub.requests) == [1, 2, 3, 4, 5]
+    assert client.get_all("/user/repos", "token", per_page=2, max_items=5) == [1, 2, 3, 4, 5]
+
+
+def test_next_links_are_followed(client, stub):
+    @stub.route("GET", "/cursor")
+    def cursor(request):
+        after = int(request.query.get("after", 0))
+        headers = {"Link": f'<{stub.url}/cursor?after={after + 2}>; rel="next"'} if after + 2 < 5 else {}
+        return 200, list(range(after, min(after + 2, 5))), headers
+
+    assert client.get_all("/cursor", "token", per_page=2) == [0, 1, 2, 3, 4]
@@ -0,0 +1,92 @@
+"""get_repos_overview against a local GraphQL stub replaying a recorded response"""
+import json
+import os
+
+import pytest
+
+import gh_engine
+
+with open(os.path.join(os.path.dirname(__file__), "fixtures", "graphql_overview.json")) as f:
+    RECORDED = json.load(f)
+
+
+@pytest.fixture
+def graphql(stub):
+    """Answers each aliased `repository` field from RECORDED; queries over `fail_above` repos get a 502"""
+    stub.queries = []
+    stub.fail_above = None
+
+    @stub.route("POST", "/graphql")
+    def answer(request):
+        variables = request.json()["variables"]
+        names = [f"{variables[f'o{i}']}/{variables[f'n{i}']}" for i in range(len(variables) // 2)]
+        stub.queries.append(names)
+        if stub.fail_above is not None and len(names) > stub.fail_above:
+            return 502, {"message": "Server Error"}, {"Retry-After": "0"}
+
+        data, errors = {"rateLimit": RECORDED["rateLimit"]}, []
+        for index, name in enumerate(names):
+            data[f"r{index}"] = RECORDED["repositories"].get(name)
+            if data[f"r{index}"] is None:
+                error = dict(RECORDED["not_found"], path=[f"r{index}"])
+                error["message"] = error["message"].replace("{name}", name)
+                errors.append(error)
+        return 200, dict({"data": data}, **({"errors": errors} if errors else {})), {}
+
+    return stub
+
+
+@pytest.fixture
+def overview_engine(tmp_path, graphql):
+    return gh_engine.GHEngine(workspace_root=str(tmp_path / "workspace"), api_url=graphql.url)
+
+
+REPOS = ["octo/app", "octo/docs", "octo/api", "octo/empty"]
+
+
+def test_entries_from_recorded_response(overview_engine, stub):
+    result = overview_engine.get_repos_overview("token", REPOS)
+    assert result["success"] and stub.queries == [REPOS]
+    app, docs, api, empty = result["repos"]
+    assert app == {
+        "repo": "octo/app", "default_branch": "main", "head_sha": "3f786850e387550fdab836ed7e6dc881de23001b",
+        "last_push": "2026-09-30T12:04:11Z", "archived": False, "open_prs": 3, "ci_status": "success",
+        "latest_check": {"status": "COMPLETED", "conclusion": "SUCCESS", "workflow": "CI", "run_id": 11223344,
+                         "url": "https://github.com/octo/app/actions/runs/11223344"},
+    }
+    assert docs["archived"] and docs["ci_status"] is None and docs["latest_check"] is None
+    assert api["ci_status"] == "pending" and api["latest_check"]["conclusion"] is None
+    assert empty["default_branch"] is None and empty["head_sha"] is None
+    assert result["cost"] == {"total": 1, "queries": 1, "remaining": 4987, "reset_at": "2026-10-17T13:00:00Z"}
+
+
+def test_chunks_and_keeps_input_order(overview_engine, stub):
+    result = overview_engine.get_repos_overview("token", REPOS + ["octo/app"], chunk_size=2)
+    assert stub.queries == [REPOS[:2], REPOS[2:], ["octo/app"]]
+    assert [entry["repo"] for entry in result["repos"]] == REPOS + ["octo/app"]
+    assert result["cost"]["total"] == 3 and result["cost"]["queries"] == 3
+
+
+def test_splits_and_retries_on_502(overview_engine, stub):
+    stub.fail_above = 1
+    result = overview_engine.get_repos_overview("token", REPOS[:3])
+    assert result["success"]
+    assert [entry["repo"] for entry in result["repos"]] == REPOS[:3]
+    answered = [names for names in stub.queries if len(names) <= 1]
+    assert answered == [["octo/app"], ["octo/docs"], ["octo/api"]]
+    assert ["octo/app", "octo/docs", "octo/api"] in stub.queries and ["octo/docs", "octo/api"] in stub.queries
+
+
+def test_single_repo_502_is_an_error(overview_engine, stub):
+    stub.fail_above = 0
+    result = overview_engine.get_repos_overview("token", ["octo/app"])
+    assert not result["success"] and "502" in result["message"]
+
+
+def test_null_repository_keeps_the_rest(overview_engine, stub):
+    result = overview_engine.get_repos_overview("token", ["octo/app", "octo/missing", "octo/api"])
+    assert result["success"]
+    app, missing, api = result["repos"]
+    assert missing == {"repo": "octo/missing",
+                       "error": "Could not resolve to a Repository with the name 'octo/missing'."}
+    assert app["default_branch"] == "main" and api["default_branch"] == "develop"
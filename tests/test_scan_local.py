@@ -0,0 +1,32 @@
+"""scan_local's default and explicit ignore lists"""
+import os
+
+import pytest
+
+import gh_engine
+from conftest import git
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "home"
+    for path in ("code/app", "snap/tool", ".cache/vendored", "code/web/node_modules/dep"):
+        os.makedirs(root / path)
+        git(root, "init", "-q", str(root / path))
+    return str(root)
+
+
+def found(result, root):
+    return sorted(os.path.relpath(repo["path"], root) for repo in result["repos"])
+
+
+def test_defaults_skip_only_dependency_trees(engine, root):
+    result = gh_engine.COMMANDS["scan_local"](engine, root, "5")
+    assert found(result, root) == [".cache/vendored", "code/app", "snap/tool"]
+
+
+def test_explicit_ignore_list(engine, root):
+    result = gh_engine.COMMANDS["scan_local"](engine, root, "5", '["snap", ".cache"]')
+    assert found(result, root) == ["code/app", "code/web/node_modules/dep"]
+    result = gh_engine.COMMANDS["scan_local"](engine, root, "5", "[]", "true")
+    assert found(result, root) == [".cache/vendored", "code/app", "code/web/node_modules/dep", "snap/tool"]
@@ -0,0 +1,52 @@
+"""Snapshot refs: lookup, legacy backup branches and ref packing"""
+import os
+import time
+
+import pytest
+
+from conftest import git, write
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / "repo"
+    git(tmp_path, "init", "-q", "--initial-branch=main", str(path))
+    write(path / "a.txt", "a\n")
+    git(path, "add", "-A")
+    git(path, "commit", "-q", "-m", "Initial commit")
+    return str(path)
+
+
+def loose(repo, ref):
+    return os.path.exists(os.path.join(repo, ".git", ref))
+
+
+def test_only_backup_branches_are_listed(engine, repo):
+    yesterday = time.time() - 86400
+    legacy = "syncstack-backup-" + time.strftime("%Y%m%d_%H%M%S", time.localtime(yesterday))
+    git(repo, "branch", "feature")
+    git(repo, "branch", "syncstack-backup")
+    git(repo, "branch", legacy)
+    write(f"{repo}/a.txt", "dirty\n")
+    snapshot_id = engine.create_snapshot(repo, "octo/app")
+    snapshots = engine.list_snapshots(repo)["snapshots"]
+    # create_snapshot's prune has moved the legacy branch into the snapshot namespace
+    assert [snapshot["id"] for snapshot in snapshots] == [snapshot_id, legacy]
+    assert snapshots[1]["created_at"] == pytest.approx(yesterday, abs=1)
+
+
+def test_create_leaves_packing_to_prune(engine, repo):
+    write(f"{repo}/a.txt", "dirty\n")
+    snapshot_id = engine.create_snapshot(repo, "octo/app")
+    ref = engine.SNAPSHOT_PREFIX + snapshot_id
+    assert loose(repo, ref)
+    assert engine.prune_snapshots(repo)["success"]
+    assert not loose(repo, ref)
+    assert ref in git(repo, "for-each-ref", "--format=%(refname)")
+
+
+def test_legacy_branches_before_migration(engine, repo):
+    git(repo, "branch", "feature")
+    git(repo, "branch", "syncstack-backup-20240102_030405")
+    snapshots = engine._snapshot_refs(repo)
+    assert [(snapshot["id"], snapshot["legacy"]) for snapshot in snapshots] == [("syncstack-backup-20240102_030405", True)]
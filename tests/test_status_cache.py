@@ -0,0 +1,77 @@
+"""get_status and get_detailed_status answered from the StatusCache"""
+import time
+
+import pytest
+
+import gh_engine
+from conftest import git, write
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / "repo"
+    git(tmp_path, "init", "-q", "--initial-branch=main", str(path))
+    write(path / "a.txt", "a\n")
+    git(path, "add", "-A")
+    git(path, "commit", "-q", "-m", "Initial commit")
+    return str(path)
+
+
+@pytest.fixture
+def cache(engine):
+    engine.status_cache.debounce, engine.status_cache.max_delay = 0.05, 0.2
+    engine.status_cache.start()
+    if engine.status_cache._inotify is None:
+        pytest.skip("needs inotify")
+    yield engine.status_cache
+    engine.status_cache.stop()
+
+
+def counted(monkeypatch, engine, name):
+    calls = []
+    original = getattr(engine, name)
+    monkeypatch.setattr(engine, name, lambda *args, **kwargs: calls.append(args) or original(*args, **kwargs))
+    return calls
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+@pytest.mark.parametrize("command, method", [("get_status", "get_repo_status"),
+                                             ("get_detailed_status", "get_detailed_status")])
+def test_cached_until_the_repo_changes(engine, cache, repo, monkeypatch, command, method):
+    calls = counted(monkeypatch, engine, method)
+    handler = gh_engine.COMMANDS[command]
+    first = handler(engine, repo)
+    assert handler(engine, repo) == first and len(calls) == 1
+    assert not first["is_dirty"]
+
+    write(f"{repo}/a.txt", "changed\n")
+    wait_for(lambda: repo not in cache._entries)
+    assert handler(engine, repo)["is_dirty"] and len(calls) == 2
+
+
+def test_kinds_are_cached_separately(engine, cache, repo):
+    plain = engine.get_cached_status(repo)
+    detailed = engine.get_cached_status(repo, detailed=True)
+    assert "changes" in detailed and "changes" not in plain
+    assert engine.get_cached_status(repo) == plain
+
+
+def test_fetch_recomputes(engine, cache, repo, monkeypatch):
+    calls = counted(monkeypatch, engine, "get_repo_status")
+    engine.get_cached_status(repo)
+    gh_engine.COMMANDS["get_status"](engine, repo, "now")
+    assert len(calls) == 2
+
+
+def test_pending_events_bypass_the_cache(engine, cache, repo):
+    engine.status_cache.debounce = engine.status_cache.max_delay = 30
+    assert not engine.get_cached_status(repo)["is_dirty"]
+    write(f"{repo}/a.txt", "changed\n")
+    wait_for(lambda: repo in cache._pending)
+    assert engine.get_cached_status(repo)["is_dirty"]
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Benchmark GHEngine hot paths against a synthetic local workspace.
+
+Generates N repos (with deep history, M dirty files and some commits
+behind) next to bare local "remotes", then times each engine entry point
+and prints p50/p95 latency, git subprocesses per call and peak RSS as JSON.
+
+    python3 tool/bench_gh_engine.py --repos 50 --history 2000 --output bench_output.txt
+    python3 tool/bench_gh_engine.py --baseline old.json   # adds p50/p95 ratios vs an earlier run
+
+Nothing touches the network: batch_sync clones and pulls from the bare remotes.
+The maintenance entry runs last and reports git status/log latency before and
+after maintaining every clone (use a large --history to see the commit-graph pay off).
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assets", "scripts"))
+import gh_engine  # noqa: E402
+
+ENTRY_POINTS = ("get_repo_status", "get_detailed_status", "scan_local_repos", "get_bulk_status", "batch_sync", "maintenance")
+
+
+class _CountingPopen(subprocess.Popen):
+    """subprocess.Popen that counts every process started (subprocess.run goes through it too)"""
+    count = 0
+    lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        with _CountingPopen.lock:
+            _CountingPopen.count += 1
+        super().__init__(*args, **kwargs)
+
+
+def git(cwd, *args, input=None):
+    subprocess.run(["git", "-C", cwd] + list(args), check=True, capture_output=True, input=input)
+
+
+def fast_import(history, files, start=0, parent=None, branch="main"):
+    """A fast-import stream: `history` commits, each touching one of `files` files"""
+    out = []
+
+    def data(text):
+        raw = text.encode()
+        out.append(b"data %d\n" % len(raw) + raw + b"\n")
+
+    for i in range(start, start + history):
+        out.append(f"commit refs/heads/{branch}\nmark :{i + 1}\n".encode())
+        out.append(f"committer Bench <bench@example.com> {1700000000 + i * 60} +0000\n".encode())
+        data(f"Commit {i}\n")
+        if i == start and parent:
+            out.append(f"from {parent}\n".encode())
+        elif i > start:
+            out.append(f"from :{i}\n".encode())
+        touched = range(files) if i == 0 else [i % files]
+        for n in touched:
+            out.append(f"M 100644 inline src/module_{n // 20}/file_{n}.txt\n".encode())
+            data("".join(f"line {line} of file {n} rev {i}\n" for line in range(40)))
+    return b"".join(out)
+
+
+def generate_workspace(root, repos, files, history, dirty, behind):
+    """Bare remotes under root/remotes, working clones under root/repos/<group>/repo_<n>"""
+    remotes, clones = os.path.join(root, "remotes"), os.path.join(root, "repos")
+    entries = []
+    for n in range(repos):
+        name = f"repo_{n:03d}"
+        remote = os.path.join(remotes, f"{name}.git")
+        clone = os.path.join(clones, f"group_{n % 5}", name)
+        subprocess.run(["git", "init", "-q", "--bare", "--initial-branch=main", remote], check=True)
+        git(remote, "fast-import", "--quiet", input=fast_import(history, files))
+        subprocess.run(["git", "clone", "-q", remote, clone], check=True, capture_output=True)
+        git(clone, "config", "user.email", "bench@example.com")
+        git(clone, "config", "user.name", "Bench")
+
+        # Every other repo falls behind its remote
+        if n % 2 and behind:
+            tip = subprocess.run(["git", "-C", remote, "rev-parse", "main"], capture_output=True, text=True).stdout.strip()
+            git(remote, "fast-import", "--quiet", "--force", input=fast_import(behind, files, start=history, parent=tip))
+            git(clone, "fetch", "-q", "origin")
+
+        for f in range(min(dirty, files)):
+            path = os.path.join(clone, "src", f"module_{f // 20}", f"file_{f}.txt")
+            with open(path, "a") as handle:
+                handle.write("local edit\n")
+        with open(os.path.join(clone, "notes.txt"), "w") as handle:
+            handle.write("untracked\n")
+        entries.append({"name": name, "path": clone, "remote": remote})
+    return entries
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    # Nearest-rank percentile
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def measure(calls, iterations, warmup):
+    """Time each call `iterations` times after `warmup` untimed rounds"""
+    for _ in range(warmup):
+        for call in calls:
+            call()
+    samples, processes = [], 0
+    for _ in range(iterations):
+        for call in calls:
+            before = _CountingPopen.count
+            started = time.perf_counter()
+            call()
+            samples.append((time.perf_counter() - started) * 1000)
+            processes += _CountingPopen.count - before
+    return summarize(samples, processes)
+
+
+def summarize(samples, processes):
+    return {
+        "samples": len(samples),
+        "p50_ms": round(percentile(samples, 50), 2),
+        "p95_ms": round(percentile(samples, 95), 2),
+        "mean_ms": round(sum(samples) / len(samples), 2),
+        "subprocesses_per_call": round(processes / len(samples), 2),
+        # ru_maxrss is a high-water mark (KB on Linux), so these only grow through the run
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_child_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def measure_maintenance(engine, repos, iterations):
+    """git status / log latency before and after a forced maintain_repo on every clone"""
+    def probes():
+        samples = {"status_ms": [], "log_ms": []}
+        for _ in range(iterations):
+            for repo in repos:
+                for key, value in engine.maintenance.probe(repo["path"]).items():
+                    samples[key].append(value)
+        return samples
+
+    before = probes()
+    durations, processes = [], _CountingPopen.count
+    for repo in repos:
+        begin = time.perf_counter()
+        engine.maintain_repo(repo["path"], force=True)
+        durations.append((time.perf_counter() - begin) * 1000)
+    run = summarize(durations, _CountingPopen.count - processes)
+    after = probes()
+    result = {"maintain_repo": run}
+    for key in before:
+        result[key.replace("_ms", "_before")] = summarize(before[key], 0)
+        result[key.replace("_ms", "_after")] = summarize(after[key], 0)
+    return result
+
+
+def run_benchmarks(args, workspace):
+    repos = generate_workspace(workspace, args.repos, args.files, args.history, args.dirty, args.behind)
+    engine = gh_engine.GHEngine(workspace_root=os.path.join(workspace, "engine"), git_backend=args.backend)
+    repos_list = [{"name": repo["name"], "path": repo["path"]} for repo in repos]
+    selected = args.only or ENTRY_POINTS
+    results = {}
+
+    if "get_repo_status" in selected:
+        results["get_repo_status"] = measure(
+            [lambda p=repo["path"]: engine.get_repo_status(p) for repo in repos],
+            args.iterations, args.warmup)
+    if "get_detailed_status" in selected:
+        results["get_detailed_status"] = measure(
+            [lambda p=repo["path"]: engine.get_detailed_status(p) for repo in repos],
+            args.iterations, args.warmup)
+    if "scan_local_repos" in selected:
+        root = os.path.join(workspace, "repos")
+        results["scan_local_repos"] = measure(
+            [lambda: engine.scan_local_repos(root, depth=3)], args.iterations, args.warmup)
+    if "get_bulk_status" in selected:
+        results["get_bulk_status"] = measure(
+            [lambda: engine.get_bulk_status(repos_list)], args.iterations, args.warmup)
+    if "batch_sync" in selected:
+        sync_engine = gh_engine.GHEngine(workspace_root=os.path.join(workspace, "sync"), git_backend=args.backend)
+        sync_list = [{"fullName": f"bench/{repo['name']}", "cloneUrl": repo["remote"]} for repo in repos]
+        # The first pass clones everything; later passes find every repo up to date
+        results["batch_sync_clone"] = measure(
+            [lambda: sync_engine.batch_sync("", sync_list)], 1, 0)
+        results["batch_sync"] = measure(
+            [lambda: sync_engine.batch_sync("", sync_list)], args.iterations, args.warmup)
+    if "maintenance" in selected:
+        # Last: it rewrites packs, index and config that every other entry point reads
+        results["maintenance"] = measure_maintenance(engine, repos, args.iterations)
+    return engine.git_backend.name, results
+
+
+def compare(results, baseline):
+    """Attach current/baseline latency ratios (>1 means slower than the baseline)"""
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old:
+            result["vs_baseline"] = {
+                key: round(result[key] / old[key], 3) if old.get(key) else None
+                for key in ("p50_ms", "p95_ms", "subprocesses_per_call")
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repos", type=int, default=20, help="repos in the workspace")
+    parser.add_argument("--files", type=int, default=100, help="tracked files per repo")
+    parser.add_argument("--history", type=int, default=500, help="commits per repo")
+    parser.add_argument("--dirty", type=int, default=5, help="modified files per clone")
+    parser.add_argument("--behind", type=int, default=3, help="remote-only commits on every other repo")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--backend", default=None, help="git read backend: auto, pygit2 or subprocess")
+    parser.add_argument("--only", action="append", choices=ENTRY_POINTS, help="benchmark only these (repeatable)")
+    parser.add_argument("--workspace", help="generate here and keep it (default: a temp dir, removed afterwards)")
+    parser.add_argument("--baseline", help="earlier JSON output to compare against")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    subprocess.Popen = _CountingPopen
+    workspace = args.workspace or tempfile.mkdtemp(prefix="syncstack-bench-")
+    try:
+        backend, results = run_benchmarks(args, workspace)
+    finally:
+        if not args.workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    head = subprocess.run(["git", "-C", os.path.dirname(os.path.abspath(__file__)), "rev-parse", "--short", "HEAD"],
+                          capture_output=True, text=True).stdout.strip()
+    report = {
+        "meta": {
+            "commit": head or None,
+            "git": subprocess.run(["git", "--version"], capture_output=True, text=True).stdout.strip(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "backend": backend,
+            "params": {key: getattr(args, key) for key in ("repos", "files", "history", "dirty", "behind", "iterations", "warmup")},
+        },
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())